@@ -0,0 +1,253 @@
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the bulk API falls back to the scalar methods
+    np = None
+
+from banking_cashback import payment_name
+
+
+# Largest value of the int64 arrays the bulk engine computes in
+INT64_MAX = 2 ** 63 - 1
+
+
+def _group_entries(system, account_ids: list[str]) -> tuple[list[int], list[int], list[str]]:
+    """
+    Resolve every entry of a bulk call to the account it would hit.
+    Returns (positions, groups, accounts):
+    - positions: input positions of entries that hit an existing account
+    - groups: group index of each of those entries
+    - accounts: resolved account_id per group index
+    Entries for missing or merged accounts are left out, their result stays None.
+    """
+    positions = []
+    groups = []
+    accounts = []
+    group_of = {}  # resolved account_id -> group index
+    resolved = {}  # raw account_id -> resolved account_id (or None)
+
+    for position, account_id in enumerate(account_ids):
+        if account_id not in resolved:
+            # Same checks as the scalar methods (level 4 merged accounts)
+            if system._is_merged_account(account_id):
+                resolved[account_id] = None
+            else:
+                current_id = system._resolve(account_id)
+                resolved[account_id] = current_id if current_id in system.accounts_dict else None
+
+        current_id = resolved[account_id]
+        if current_id is None:
+            continue
+
+        if current_id not in group_of:
+            group_of[current_id] = len(accounts)
+            accounts.append(current_id)
+        positions.append(position)
+        groups.append(group_of[current_id])
+
+    return positions, groups, accounts
+
+
+def _sort_by_group(groups):
+    """
+    Stable sort of entries by group, so entries of one account stay in input order.
+    Returns (order, sorted_groups, starts, counts) where starts/counts describe
+    the run of every group inside the sorted arrays.
+    """
+    group_arr = np.asarray(groups, dtype=np.int64)
+    order = np.argsort(group_arr, kind="stable")
+    sorted_groups = group_arr[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    counts = np.diff(np.r_[starts, len(sorted_groups)])
+    return order, sorted_groups, starts, counts
+
+
+def _fits_int64(system, accounts: list[str], amounts: list[int], factor: int = 1) -> bool:
+    """
+    True if every running balance and every amount times `factor` stays
+    within int64: the largest opening balance plus all amounts bounds both.
+    NumPy wraps around silently beyond it, such batches take the scalar path.
+    """
+    largest = max(abs(system.accounts_dict[account_id]["account balance"]) for account_id in accounts)
+    return (largest + sum(map(abs, amounts))) * max(1, factor) <= INT64_MAX
+
+
+def _check_lengths(account_ids: list[str], amounts: list[int]):
+    if len(account_ids) != len(amounts):
+        raise ValueError("account_ids and amounts must have the same length")
+
+
+def deposit_many(system, timestamp: int, account_ids, amounts) -> list[int | None]:
+    """
+    Deposit amounts[i] to account_ids[i] for every entry, all at `timestamp`.
+    Returns one result per entry, equal to what `deposit` would return if the
+    entries were deposited one by one in input order.
+    """
+    account_ids = list(account_ids)
+    amounts = list(amounts)
+    _check_lengths(account_ids, amounts)
+    if not account_ids:
+        # Like no scalar call at all, due cashback waits for the next call
+        return []
+
+    if np is None:
+        return [system.deposit(timestamp, account_id, amount) for account_id, amount in zip(account_ids, amounts)]
+
+    # Give cashback once (level 3), nothing new becomes due inside the batch
+    system._process_cashback(timestamp)
+
+    results = [None] * len(account_ids)
+    positions, groups, accounts = _group_entries(system, account_ids)
+    if not positions:
+        return results
+    if system._settlement is not None:
+        for account_id in accounts:
+            system._settlement.settle(account_id)
+    if not _fits_int64(system, accounts, amounts):
+        return [system.deposit(timestamp, account_id, amount) for account_id, amount in zip(account_ids, amounts)]
+
+    order, sorted_groups, starts, counts = _sort_by_group(groups)
+    sorted_amounts = np.asarray([amounts[p] for p in positions], dtype=np.int64)[order]
+
+    # Running balance per account: opening balance + cumulative sum inside its group
+    opening = np.asarray([system.accounts_dict[a]["account balance"] for a in accounts], dtype=np.int64)
+    running = np.cumsum(sorted_amounts)
+    before_group = np.repeat(running[starts] - sorted_amounts[starts], counts)
+    balances = opening[sorted_groups] + running - before_group
+
+    # Write back one account at a time, history entries in input order
+    balance_list = balances.tolist()
+    for group, (start, count) in enumerate(zip(starts.tolist(), counts.tolist())):
+        account_id = accounts[group]
+        group_balances = balance_list[start:start + count]
+        if system._cow is not None:
+            system._cow.value("accounts_dict", account_id)
+            system._cow.value("record", account_id)
+        if system._undo is not None:
+            system._undo.balance(account_id)
+            system._undo.tail(system.record[account_id])
+        system.accounts_dict[account_id]["account balance"] = group_balances[-1]
+        if system._dirty is not None:
+            system._dirty.account(account_id)
+            system._dirty.history(account_id, len(system.record[account_id]))
+        system.record[account_id].extend((timestamp, balance) for balance in group_balances)
+
+    for position, balance in zip(np.asarray(positions)[order].tolist(), balance_list):
+        results[position] = balance
+
+    # Change events in input order, like the scalar method would publish them
+    if system._events is not None:
+        for position, group in zip(positions, groups):
+            system._events.balance_changed(timestamp, accounts[group], results[position])
+
+    return results
+
+
+def pay_many(system, timestamp: int, account_ids, amounts) -> list[str | None]:
+    """
+    Pay amounts[i] from account_ids[i] for every entry, all at `timestamp`.
+    Returns one result per entry, equal to what `pay` would return if the
+    entries were paid one by one in input order: payment ids are assigned to
+    successful entries in input order, None for missing accounts or
+    insufficient funds.
+    """
+    account_ids = list(account_ids)
+    amounts = list(amounts)
+    _check_lengths(account_ids, amounts)
+    if not account_ids:
+        # Like no scalar call at all, due cashback waits for the next call
+        return []
+
+    if np is None:
+        return [system.pay(timestamp, account_id, amount) for account_id, amount in zip(account_ids, amounts)]
+
+    # Return cashbacks first from previous withdrawal (level 3)
+    system._process_cashback(timestamp)
+
+    results = [None] * len(account_ids)
+    positions, groups, accounts = _group_entries(system, account_ids)
+    if not positions:
+        return results
+    if system._settlement is not None:
+        for account_id in accounts:
+            system._settlement.settle(account_id)
+    policies = [system._cashback_policy(a) for a in accounts]
+    if (not _fits_int64(system, accounts, amounts, max(policy.rate_bps for policy in policies))
+            or max(abs(policy.due(timestamp)) for policy in policies) > INT64_MAX):
+        return [system.pay(timestamp, account_id, amount) for account_id, amount in zip(account_ids, amounts)]
+
+    order, sorted_groups, starts, counts = _sort_by_group(groups)
+    sorted_amounts = np.asarray([amounts[p] for p in positions], dtype=np.int64)[order]
+
+    # Insufficient funds depends on earlier payments of the same account, so
+    # entries are checked in rounds: round r holds the r-th payment of every account
+    balance = np.asarray([system.accounts_dict[a]["account balance"] for a in accounts], dtype=np.int64)
+    accepted = np.zeros(len(sorted_groups), dtype=bool)
+    balances = np.zeros(len(sorted_groups), dtype=np.int64)
+    for r in range(int(counts.max())):
+        idx = starts[counts > r] + r
+        group = sorted_groups[idx]
+        amount = sorted_amounts[idx]
+        ok = balance[group] >= amount
+        balance[group] -= np.where(ok, amount, 0)
+        accepted[idx] = ok
+        balances[idx] = balance[group]
+
+    # Outgoing totals (level 2) only count successful payments
+    spent = np.zeros(len(accounts), dtype=np.int64)
+    np.add.at(spent, sorted_groups, np.where(accepted, sorted_amounts, 0))
+    paid = np.zeros(len(accounts), dtype=bool)
+    paid[sorted_groups[accepted]] = True
+
+    # Payment numbers follow input order of successful entries
+    input_accepted = np.zeros(len(positions), dtype=bool)
+    input_accepted[order] = accepted
+    numbers = system.payment_counter + np.cumsum(input_accepted) - 1
+    system.payment_counter += int(input_accepted.sum())
+
+    # Cashback for every payment from its account's policy (default 2% round down, refunded 24 hours later)
+    rates = np.asarray([policy.rate_bps for policy in policies], dtype=np.int64)
+    due = np.asarray([policy.due(timestamp) for policy in policies], dtype=np.int64)
+    group_arr = np.asarray(groups, dtype=np.int64)
+    input_amounts = np.empty_like(sorted_amounts)
+    input_amounts[order] = sorted_amounts
+    cashbacks = input_amounts * rates[group_arr] // 10000
+    cashback_timestamps = due[group_arr]
+
+    # Write back balances, history and outgoing one account at a time
+    balance_list = balances.tolist()
+    accepted_list = accepted.tolist()
+    for group, (start, count) in enumerate(zip(starts.tolist(), counts.tolist())):
+        if not paid[group]:
+            continue
+        account_id = accounts[group]
+        group_balances = [b for b, ok in zip(balance_list[start:start + count], accepted_list[start:start + count]) if ok]
+        if system._cow is not None:
+            system._cow.value("accounts_dict", account_id)
+            system._cow.value("record", account_id)
+        if system._undo is not None:
+            system._undo.balance(account_id)
+            system._undo.tail(system.record[account_id])
+        system.accounts_dict[account_id]["account balance"] = group_balances[-1]
+        if system._dirty is not None:
+            system._dirty.account(account_id)
+            system._dirty.history(account_id, len(system.record[account_id]))
+        system.record[account_id].extend((timestamp, b) for b in group_balances)
+        system._add_outgoing(account_id, timestamp, int(spent[group]))
+
+    # Track payments in input order
+    input_balances = np.empty_like(balances)
+    input_balances[order] = balances
+    for position, group, ok, number, cashback, cashback_timestamp, amount, balance in zip(
+            positions, groups, input_accepted.tolist(), numbers.tolist(), cashbacks.tolist(),
+            cashback_timestamps.tolist(), input_amounts.tolist(), input_balances.tolist()):
+        if not ok:
+            continue
+        account_id = accounts[group]
+        system._schedule_cashback(account_id, number, cashback, cashback_timestamp)
+        payment = payment_name(number)
+        if system._events is not None:
+            system._events.balance_changed(timestamp, account_id, balance)
+            system._events.payment_made(timestamp, account_id, payment, amount, cashback, cashback_timestamp)
+        results[position] = payment
+
+    return results
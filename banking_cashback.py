@@ -0,0 +1,291 @@
+import heapq
+from array import array
+
+
+class CashbackPolicy:
+    """
+    Cashback rule of one account class, immutable.
+    - rate_bps: cashback in basis points of the payment (200 = 2%), rounded down
+    - delay: ms between the payment and the refund
+    A plain slotted class rather than a dataclass: importing dataclasses
+    would triple the import time of banking_system_impl.
+    """
+
+    __slots__ = ("rate_bps", "delay")
+
+    def __init__(self, rate_bps: int = 200, delay: int = 86400000):
+        if rate_bps < 0:
+            raise ValueError("rate_bps must not be negative")
+        if delay <= 0:
+            raise ValueError("delay must be positive")
+        object.__setattr__(self, "rate_bps", rate_bps)
+        object.__setattr__(self, "delay", delay)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"CashbackPolicy is immutable, cannot set {name!r}")
+
+    def __reduce__(self):
+        return CashbackPolicy, (self.rate_bps, self.delay)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CashbackPolicy):
+            return NotImplemented
+        return (self.rate_bps, self.delay) == (other.rate_bps, other.delay)
+
+    def __hash__(self) -> int:
+        return hash((self.rate_bps, self.delay))
+
+    def __repr__(self) -> str:
+        return f"CashbackPolicy(rate_bps={self.rate_bps!r}, delay={self.delay!r})"
+
+    def cashback(self, amount: int) -> int:
+        return amount * self.rate_bps // 10000
+
+    def due(self, timestamp: int) -> int:
+        return timestamp + self.delay
+
+
+# Level 3 rule: 2% cashback refunded 24 hours after the payment
+DEFAULT_POLICY = CashbackPolicy()
+DEFAULT_CLASS = "default"
+
+
+PAYMENT_PREFIX = "payment"
+
+
+def payment_name(payment_id: int) -> str:
+    """Public id of a payment, e.g. 12 -> 'payment12'"""
+    return PAYMENT_PREFIX + str(payment_id)
+
+
+def parse_payment(payment: str) -> int | None:
+    """Integer id of a public payment id, None if it isn't of the form 'paymentN'"""
+    digits = payment[len(PAYMENT_PREFIX):]
+    if not payment.startswith(PAYMENT_PREFIX) or not digits.isascii() or not digits.isdigit() or digits[0] == "0":
+        return None
+    return int(digits)
+
+
+class PaymentTable:
+    """
+    Dense table of every payment, indexed by integer payment id.
+    Columns instead of one object per payment: a payment costs a few machine
+    words, and ids stay plain ints until they are formatted at the API boundary.
+    - owner: account the refund goes to (updated when accounts merge), None for ids not in the table
+    - cashback, due: cashback amount and its due timestamp, int64 arrays until a
+      value doesn't fit, then the column becomes a list of Python ints
+    - refunded: 1 once the cashback was received
+    Also offers the dict methods the replay and checkpoint code use for state
+    fields (items, update, __contains__), rows are (owner, cashback, due, refunded).
+    """
+
+    __slots__ = ("owner", "cashback", "due", "refunded")
+
+    def __init__(self):
+        # index 0 is unused, payment ids start at 1
+        self.owner = [None]
+        self.cashback = array("q", [0])
+        self.due = array("q", [0])
+        self.refunded = bytearray(1)
+
+    def add(self, payment_id: int, owner: str, cashback: int, due: int, refunded: bool = False):
+        if payment_id >= len(self.owner):
+            # ids normally arrive in order, gaps only come from partial tables (parallel replay)
+            missing = payment_id + 1 - len(self.owner)
+            self.owner.extend([None] * missing)
+            self.cashback.extend([0] * missing)
+            self.due.extend([0] * missing)
+            self.refunded.extend(bytes(missing))
+        self.owner[payment_id] = owner
+        try:
+            self.cashback[payment_id] = cashback
+        except OverflowError:
+            self.cashback = list(self.cashback)
+            self.cashback[payment_id] = cashback
+        try:
+            self.due[payment_id] = due
+        except OverflowError:
+            self.due = list(self.due)
+            self.due[payment_id] = due
+        self.refunded[payment_id] = refunded
+
+    def remove(self, payment_id: int):
+        self.add(payment_id, None, 0, 0)
+
+    def row(self, payment_id: int) -> tuple[str, int, int, bool]:
+        return self.owner[payment_id], self.cashback[payment_id], self.due[payment_id], bool(self.refunded[payment_id])
+
+    def __contains__(self, payment_id: int) -> bool:
+        return 0 < payment_id < len(self.owner) and self.owner[payment_id] is not None
+
+    def __len__(self) -> int:
+        return len(self.owner) - self.owner.count(None)
+
+    def items(self):
+        """(payment_id, row) of every payment in id order"""
+        for payment_id, owner in enumerate(self.owner):
+            if owner is not None:
+                yield payment_id, self.row(payment_id)
+
+    def pending(self):
+        """(payment_id, due) of every payment whose cashback wasn't refunded yet, in id order"""
+        for payment_id, owner in enumerate(self.owner):
+            if owner is not None and not self.refunded[payment_id]:
+                yield payment_id, self.due[payment_id]
+
+    def last_id(self) -> int:
+        """Highest payment id in the table, 0 if it is empty"""
+        for payment_id in range(len(self.owner) - 1, 0, -1):
+            if self.owner[payment_id] is not None:
+                return payment_id
+        return 0
+
+    def update(self, other: "PaymentTable"):
+        for payment_id, row in other.items():
+            self.add(payment_id, *row)
+
+    def __copy__(self) -> "PaymentTable":
+        """Copy with its own columns (used by forks before the first write)"""
+        table = PaymentTable.__new__(PaymentTable)
+        table.owner = self.owner.copy()
+        table.cashback = self.cashback[:]
+        table.due = self.due[:]
+        table.refunded = self.refunded[:]
+        return table
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PaymentTable):
+            return NotImplemented
+        return list(self.items()) == list(other.items())
+
+    def __repr__(self) -> str:
+        return f"PaymentTable({dict(self.items())!r})"
+
+
+class TimerWheel:
+    """
+    Hierarchical timer wheel for cashback due times (ms).
+
+    Level L has 64 slots of 64**L ms each. An entry sits at the level of the
+    highest 6-bit digit where its due time differs from `now`, in the slot of
+    that digit, so adding is O(1). Advancing expires whole slots at once and
+    re-places (cascades) only the one slot per level that the new time falls
+    into, every entry cascades at most LEVELS times: O(1) amortized per due
+    refund, also when the clock jumps far ahead.
+    Due times past the top level wait in an overflow heap, due times that
+    are already <= now wait in a ready heap.
+    Slots get a list when they are first occupied, so an empty wheel (a
+    system without pending cashback) is a handful of empty dicts.
+    """
+
+    SLOT_BITS = 6
+    SLOTS = 1 << SLOT_BITS
+    LEVELS = 6  # 64**6 ms, about 2 years ahead of now
+    SPAN_BITS = SLOT_BITS * LEVELS
+
+    def __init__(self, now: int = 0):
+        self.now = now
+        self._slots = [{} for _ in range(self.LEVELS)]  # slot -> entries per level, only occupied slots have a list
+        self._occupied = [0] * self.LEVELS  # bitmask of non-empty slots per level
+        self._overflow = []  # heap of (due, seq, item) beyond the top level
+        self._ready = []  # heap of (due, seq, item) with due <= now
+        self._seq = 0  # tie-breaker: equal due times expire in insertion order
+        self._size = 0
+        self._cancelled = set()  # seq of cancelled entries still in the wheel, skipped when they expire
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __copy__(self) -> "TimerWheel":
+        """Copy with its own slots and heaps (used by forks before the first write)"""
+        wheel = TimerWheel.__new__(TimerWheel)
+        wheel.now = self.now
+        wheel._slots = [{slot: entries.copy() for slot, entries in level.items()} for level in self._slots]
+        wheel._occupied = self._occupied.copy()
+        wheel._overflow = self._overflow.copy()
+        wheel._ready = self._ready.copy()
+        wheel._seq = self._seq
+        wheel._size = self._size
+        wheel._cancelled = self._cancelled.copy()
+        return wheel
+
+    def add(self, due: int, item) -> int:
+        """Schedule `item` at `due`, returns a handle for cancel()"""
+        self._seq += 1
+        self._size += 1
+        self._place((due, self._seq, item))
+        return self._seq
+
+    def cancel(self, handle: int):
+        """Cancel an entry that hasn't expired yet, it is dropped lazily when its slot expires"""
+        self._cancelled.add(handle)
+        self._size -= 1
+
+    def _place(self, entry: tuple):
+        due = entry[0]
+        if due <= self.now:
+            heapq.heappush(self._ready, entry)
+            return
+        level = ((due ^ self.now).bit_length() - 1) // self.SLOT_BITS
+        if level >= self.LEVELS:
+            heapq.heappush(self._overflow, entry)
+            return
+        slot = (due >> (level * self.SLOT_BITS)) & (self.SLOTS - 1)
+        entries = self._slots[level].get(slot)
+        if entries is None:
+            self._slots[level][slot] = [entry]
+        else:
+            entries.append(entry)
+        self._occupied[level] |= 1 << slot
+
+    def _take(self, level: int, mask: int) -> list:
+        """Empty every slot of `level` in `mask`"""
+        entries = []
+        slots = self._slots[level]
+        self._occupied[level] &= ~mask
+        while mask:
+            low = mask & -mask
+            slot = low.bit_length() - 1
+            entries.extend(slots.pop(slot))
+            mask ^= low
+        return entries
+
+    def advance(self, to: int) -> list:
+        """
+        Move the clock to `to` (never backwards) and return the items due at
+        or before `to`, ordered by due time then insertion order.
+        """
+        expired = []
+        if to > self.now:
+            top = ((to ^ self.now).bit_length() - 1) // self.SLOT_BITS
+            # Levels below the highest changed digit are entirely in the past
+            for level in range(min(top, self.LEVELS)):
+                expired.extend(self._take(level, self._occupied[level]))
+
+            cascade = []
+            if top < self.LEVELS:
+                digit = (to >> (top * self.SLOT_BITS)) & (self.SLOTS - 1)
+                # Slots before the new digit are in the past, the slot of the digit is re-placed
+                expired.extend(self._take(top, self._occupied[top] & ((1 << digit) - 1)))
+                cascade = self._take(top, self._occupied[top] & (1 << digit))
+
+            self.now = to
+            for entry in cascade:
+                self._place(entry)
+            while self._overflow and self._overflow[0][0] >> self.SPAN_BITS <= to >> self.SPAN_BITS:
+                self._place(heapq.heappop(self._overflow))
+
+        while self._ready and self._ready[0][0] <= to:
+            expired.append(heapq.heappop(self._ready))
+
+        if self._cancelled:
+            live = []
+            for entry in expired:
+                if entry[1] in self._cancelled:
+                    self._cancelled.remove(entry[1])
+                else:
+                    live.append(entry)
+            expired = live
+        self._size -= len(expired)
+        expired.sort()
+        return [item for _, _, item in expired]
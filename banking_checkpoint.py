@@ -0,0 +1,365 @@
+import mmap
+import os
+import pickle
+import threading
+import time
+
+from banking_system_impl import STATE_FIELDS, BankingSystemImpl
+
+
+BASE_FILE = "base.pkl"
+DELTA_PREFIX = "delta-"
+DELTA_SUFFIX = ".pkl"
+
+
+class DirtyTracker:
+    """
+    Collects what changed in a BankingSystemImpl since the last checkpoint.
+    BankingSystemImpl calls these methods while `system._dirty` is set.
+    """
+
+    def __init__(self):
+        self.accounts = set()  # accounts_dict entries
+        self.records = {}  # account_id -> first changed index of record[account_id]
+        self.outgoing_ids = set()  # outgoing totals
+        self.ledgers = {}  # account_id -> first changed index of outgoing_ledger[account_id]
+        self.payment_lists = {}  # account_id -> first changed index of payments[account_id]
+        self.payment_rows = set()  # changed payment_table rows
+        self.aliases = set()  # aliases and merge_times
+        self.merged = set()  # merged_history
+        self.lineages = set()  # merge_children and merge_log
+        self.classes = set()  # account_classes
+        self.policies_changed = False  # cashback_policies
+
+    def account(self, account_id: str):
+        self.accounts.add(account_id)
+
+    def history(self, account_id: str, start: int):
+        if start < self.records.get(account_id, start + 1):
+            self.records[account_id] = start
+
+    def outgoing(self, account_id: str):
+        self.outgoing_ids.add(account_id)
+
+    def ledger(self, account_id: str, start: int):
+        if start < self.ledgers.get(account_id, start + 1):
+            self.ledgers[account_id] = start
+
+    def payment_ids(self, account_id: str, start: int):
+        if start < self.payment_lists.get(account_id, start + 1):
+            self.payment_lists[account_id] = start
+
+    def payment(self, payment_id: int):
+        self.payment_rows.add(payment_id)
+
+    def alias(self, account_id: str):
+        self.aliases.add(account_id)
+
+    def merged_history(self, account_id: str):
+        self.merged.add(account_id)
+
+    def lineage(self, account_id: str):
+        self.lineages.add(account_id)
+
+    def account_class(self, account_id: str):
+        self.classes.add(account_id)
+
+    def policies(self):
+        self.policies_changed = True
+
+    def __len__(self) -> int:
+        """Number of changed entries, used to skip empty checkpoints"""
+        return (len(self.accounts) + len(self.records) + len(self.outgoing_ids) + len(self.ledgers)
+                + len(self.payment_lists) + len(self.payment_rows) + len(self.aliases) + len(self.merged) + len(self.lineages)
+                + len(self.classes)
+                + self.policies_changed)
+
+
+def _check_in_memory(system: BankingSystemImpl):
+    if not system.storage.in_memory:
+        raise ValueError(f"cannot snapshot a system on {system.storage.name!r} storage")
+
+
+def _settle(system: BankingSystemImpl):
+    """Apply refunds deferred to background settlement, they are not part of the state"""
+    if system._settlement is not None:
+        system._settlement.settle_all()
+
+
+def snapshot(system: BankingSystemImpl) -> dict:
+    """Full copy of the system state (the base image)"""
+    _check_in_memory(system)
+    _settle(system)
+    state = {name: getattr(system, name) for name in STATE_FIELDS}
+    state["payment_counter"] = system.payment_counter
+    state["storage"] = system.storage
+    return pickle.loads(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def restore(state: dict, cls: type = BankingSystemImpl) -> BankingSystemImpl:
+    """
+    Build a BankingSystemImpl (or subclass `cls`) from a state produced by
+    snapshot() or save_snapshot(). The timer wheel is rebuilt unless the state carries it.
+    """
+    system = cls(storage=state.get("storage"))
+    for name in STATE_FIELDS:
+        setattr(system, name, state[name])
+    system.payment_counter = state["payment_counter"]
+    if "_cashback_wheel" in state:
+        system._cashback_wheel = state["_cashback_wheel"]
+    else:
+        system._rebuild_cashback_schedule()
+    return system
+
+
+def _full_state(system: BankingSystemImpl) -> dict:
+    _check_in_memory(system)
+    _settle(system)
+    state = {name: getattr(system, name) for name in STATE_FIELDS}
+    state["payment_counter"] = system.payment_counter
+    state["storage"] = system.storage
+    state["_cashback_wheel"] = system._cashback_wheel
+    return state
+
+
+def save_snapshot(system: BankingSystemImpl, path: str):
+    """
+    Write the full state to a single file for fast startup with load_snapshot().
+    Unlike the base image of a checkpoint directory it includes the timer
+    wheel, so loading doesn't scan the payment table.
+    """
+    _write_atomic(path, _full_state(system))
+
+
+def dump_snapshot(system: BankingSystemImpl) -> bytes:
+    """What save_snapshot() writes to the file, for keeping a snapshot in memory"""
+    return pickle.dumps(_full_state(system), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def loads_snapshot(data: bytes, cls: type = BankingSystemImpl) -> BankingSystemImpl:
+    """System from the output of dump_snapshot() (or the contents of a save_snapshot() file)"""
+    return restore(pickle.loads(data), cls)
+
+
+def load_snapshot(path: str, cls: type = BankingSystemImpl) -> BankingSystemImpl:
+    """Map a file written by save_snapshot() and unpickle the system straight from the mapping"""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        state = pickle.loads(mapped)
+    return restore(state, cls)
+
+
+def capture_delta(system: BankingSystemImpl, dirty: DirtyTracker) -> dict:
+    """
+    Collect only the changed parts of the state. None marks a deleted entry.
+    Record, ledger and payment id changes are stored as (start index, entries from start).
+    The delta shares objects with the live system, serialize it before the
+    system changes again.
+    """
+    delta = {
+        "accounts": {a: system.accounts_dict.get(a) for a in dirty.accounts},
+        "records": {a: (start, system.record[a][start:]) if a in system.record else None
+                    for a, start in dirty.records.items()},
+        "outgoing": {a: system.outgoing.get(a) for a in dirty.outgoing_ids},
+        "ledgers": {a: (start, system.outgoing_ledger[a][start:]) if a in system.outgoing_ledger else None
+                    for a, start in dirty.ledgers.items()},
+        "payments": {a: (start, system.payments[a][start:]) if a in system.payments else None
+                     for a, start in dirty.payment_lists.items()},
+        "payment_rows": {payment_id: system.payment_table.row(payment_id) for payment_id in dirty.payment_rows},
+        "aliases": {a: (system.aliases.get(a), system.merge_times.get(a)) for a in dirty.aliases},
+        "merged_history": {a: system.merged_history.get(a) for a in dirty.merged},
+        "lineage": {a: (system.merge_children.get(a), system.merge_log.get(a)) for a in dirty.lineages},
+        "account_classes": {a: system.account_classes.get(a) for a in dirty.classes},
+        "cashback_policies": system.cashback_policies if dirty.policies_changed else None,
+        "payment_counter": system.payment_counter,
+    }
+    return delta
+
+
+def _set_or_delete(target: dict, key, value):
+    if value is None:
+        target.pop(key, None)
+    else:
+        target[key] = value
+
+
+def apply_delta(state: dict, delta: dict):
+    """Fold one delta into a full state (in place)"""
+    for account_id, entry in delta["accounts"].items():
+        _set_or_delete(state["accounts_dict"], account_id, entry)
+    for field, changes in (("record", delta["records"]), ("outgoing_ledger", delta["ledgers"]), ("payments", delta["payments"])):
+        for account_id, change in changes.items():
+            if change is None:
+                state[field].pop(account_id, None)
+            else:
+                start, entries = change
+                state[field][account_id] = state[field].get(account_id, entries[:0])[:start] + entries
+    for account_id, total in delta["outgoing"].items():
+        _set_or_delete(state["outgoing"], account_id, total)
+    for payment_id, row in delta["payment_rows"].items():
+        state["payment_table"].add(payment_id, *row)
+    for account_id, (alias, merge_time) in delta["aliases"].items():
+        _set_or_delete(state["aliases"], account_id, alias)
+        _set_or_delete(state["merge_times"], account_id, merge_time)
+    for account_id, history in delta["merged_history"].items():
+        _set_or_delete(state["merged_history"], account_id, history)
+    for account_id, (children, log) in delta["lineage"].items():
+        _set_or_delete(state["merge_children"], account_id, children)
+        _set_or_delete(state["merge_log"], account_id, log)
+    for account_id, account_class in delta["account_classes"].items():
+        _set_or_delete(state["account_classes"], account_id, account_class)
+    if delta["cashback_policies"] is not None:
+        state["cashback_policies"] = delta["cashback_policies"]
+    state["payment_counter"] = delta["payment_counter"]
+
+
+def _write_atomic(path: str, data):
+    """Write to a temporary file first so readers never see a partial file"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read(path: str):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def _delta_files(directory: str) -> list[tuple[int, str]]:
+    """(sequence number, path) of every complete delta file, oldest first"""
+    deltas = []
+    for name in os.listdir(directory):
+        if name.startswith(DELTA_PREFIX) and name.endswith(DELTA_SUFFIX):
+            seq = int(name[len(DELTA_PREFIX):-len(DELTA_SUFFIX)])
+            deltas.append((seq, os.path.join(directory, name)))
+    return sorted(deltas)
+
+
+def load_state(directory: str) -> dict:
+    """Base image with every newer delta folded in"""
+    base = _read(os.path.join(directory, BASE_FILE))
+    state = base["state"]
+    for seq, path in _delta_files(directory):
+        if seq > base["seq"]:
+            apply_delta(state, _read(path))
+    return state
+
+
+def load_system(directory: str) -> BankingSystemImpl:
+    """Rebuild a BankingSystemImpl from a checkpoint directory"""
+    return restore(load_state(directory))
+
+
+def compact(directory: str) -> int:
+    """
+    Fold all delta files into a new base image and remove them.
+    Returns the number of deltas folded.
+    """
+    base = _read(os.path.join(directory, BASE_FILE))
+    state = base["state"]
+    seq = base["seq"]
+    folded = []
+    for delta_seq, path in _delta_files(directory):
+        if delta_seq > base["seq"]:
+            apply_delta(state, _read(path))
+            seq = delta_seq
+        folded.append(path)
+
+    if seq == base["seq"] and not folded:
+        return 0
+    _write_atomic(os.path.join(directory, BASE_FILE), {"seq": seq, "state": state})
+    # Deltas are only removed once the new base is in place
+    for path in folded:
+        os.remove(path)
+    return len(folded)
+
+
+class Checkpointer:
+    """
+    Incremental checkpoints of one BankingSystemImpl.
+    The first checkpoint is a full base image, every later one is an
+    append-only delta file with only the entries changed since the previous
+    checkpoint, so the cost follows the change rate, not the system size.
+    """
+
+    def __init__(self, system: BankingSystemImpl, directory: str, interval: float | None = None):
+        """
+        Attach a dirty tracker to `system` and write the base image if
+        `directory` doesn't have one yet.
+        - interval: seconds between checkpoints for maybe_checkpoint()
+        """
+        self.system = system
+        self.directory = directory
+        self.interval = interval
+        self._last_checkpoint = time.monotonic()
+
+        os.makedirs(directory, exist_ok=True)
+        base_path = os.path.join(directory, BASE_FILE)
+        if os.path.exists(base_path):
+            # Continue an existing directory (system loaded with load_system)
+            deltas = _delta_files(directory)
+            self._seq = max([_read(base_path)["seq"]] + [seq for seq, _ in deltas])
+        else:
+            self._seq = 0
+            _write_atomic(base_path, {"seq": 0, "state": snapshot(system)})
+
+        system._dirty = DirtyTracker()
+
+    def checkpoint(self) -> int:
+        """
+        Write the changes since the last checkpoint as a new delta file.
+        Returns the number of changed entries written (0 means nothing to write).
+        """
+        _settle(self.system)
+        dirty = self.system._dirty
+        self.system._dirty = DirtyTracker()
+        self._last_checkpoint = time.monotonic()
+        if not len(dirty):
+            return 0
+
+        self._seq += 1
+        path = os.path.join(self.directory, f"{DELTA_PREFIX}{self._seq:08d}{DELTA_SUFFIX}")
+        _write_atomic(path, capture_delta(self.system, dirty))
+        return len(dirty)
+
+    def maybe_checkpoint(self) -> int:
+        """Checkpoint if `interval` seconds passed since the last one, meant for request loops"""
+        if self.interval is None or time.monotonic() - self._last_checkpoint < self.interval:
+            return 0
+        return self.checkpoint()
+
+    def close(self):
+        """Write a final checkpoint and detach the dirty tracker"""
+        self.checkpoint()
+        self.system._dirty = None
+
+
+class Compactor:
+    """
+    Background thread that periodically folds delta files into the base image.
+    Only touches files, so it can run next to a live system and its Checkpointer.
+    """
+
+    def __init__(self, directory: str, interval: float = 60.0):
+        self.directory = directory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="banking-compactor", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            compact(self.directory)
+
+    def stop(self):
+        """Stop the thread and run one last compaction"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        compact(self.directory)
@@ -0,0 +1,108 @@
+from dataclasses import dataclass, replace
+
+from banking_system_impl import BankingSystemImpl
+from banking_workload import WorkloadConfig, generate
+
+
+@dataclass(frozen=True, slots=True)
+class Divergence:
+    """First operation where an engine's result differs from the oracle's"""
+
+    index: int
+    operation: tuple
+    expected: object
+    actual: object  # the exception if the engine raised
+
+
+def compare(operations: list[tuple], engine, oracle=BankingSystemImpl) -> Divergence | None:
+    """
+    Run `operations` on a fresh `engine()` and a fresh `oracle()` side by side.
+    Returns the first divergence, or None if every result matches.
+    """
+    engine_system = engine()
+    oracle_system = oracle()
+    for index, op in enumerate(operations):
+        expected = getattr(oracle_system, op[0])(*op[1:])
+        try:
+            actual = getattr(engine_system, op[0])(*op[1:])
+        except Exception as error:
+            return Divergence(index, op, expected, error)
+        if actual != expected:
+            return Divergence(index, op, expected, actual)
+    return None
+
+
+def with_probes(operations: list[tuple], points: int = 8) -> list[tuple]:
+    """
+    `operations` followed by queries that expose hidden state: get_balance of
+    every account at `points` times spread over the stream, and the full
+    top_spenders ranking.
+    """
+    if not operations:
+        return []
+    accounts = sorted({op[2] for op in operations if op[0] == "create_account"})
+    end = operations[-1][1]
+    times = sorted({1 + (end - 1) * i // (points - 1) for i in range(points)}) if points > 1 else [end]
+    probes = [("top_spenders", end + 1, len(accounts))]
+    timestamp = end + 1
+    for account_id in accounts:
+        for time_at in times:
+            timestamp += 1
+            probes.append(("get_balance", timestamp, account_id, time_at))
+    return operations + probes
+
+
+def shrink(operations: list[tuple], engine, oracle=BankingSystemImpl) -> list[tuple]:
+    """
+    Minimal failing trace: cuts everything after the first divergence, then
+    removes chunks of operations (delta debugging) as long as the rest still
+    diverges. Removing operations keeps timestamps increasing.
+    """
+    divergence = compare(operations, engine, oracle)
+    if divergence is None:
+        raise ValueError("operations don't diverge")
+    current = operations[:divergence.index + 1]
+    chunks = 2
+    while len(current) > 1:
+        size = -(-len(current) // chunks)
+        for start in range(0, len(current), size):
+            candidate = current[:start] + current[start + size:]
+            divergence = compare(candidate, engine, oracle)
+            if divergence is not None:
+                current = candidate[:divergence.index + 1]
+                chunks = max(chunks - 1, 2)
+                break
+        else:
+            if chunks >= len(current):
+                break
+            chunks = min(2 * chunks, len(current))
+    return current
+
+
+# Few accounts, short phases and many merges and cashback bursts, so
+# streams hit merge chains and refunds to merged accounts quickly
+FUZZ_CONFIG = WorkloadConfig(operations=300, accounts=6, skew=0.5, phase_length=40, cashback_phases=0.3, merge_storms=0.3)
+
+
+def fuzz(engine, seeds=range(50), oracle=BankingSystemImpl, config: WorkloadConfig = FUZZ_CONFIG) -> list[tuple] | None:
+    """
+    Compare `engine` with the oracle on one probed random stream per seed.
+    Returns the shrunk trace of the first stream that diverges, or None.
+    """
+    for seed in seeds:
+        operations = with_probes(generate(replace(config, seed=seed)))
+        if compare(operations, engine, oracle) is not None:
+            return shrink(operations, engine, oracle)
+    return None
+
+
+def format_trace(operations: list[tuple], engine, oracle=BankingSystemImpl) -> str:
+    """Trace as Python calls, ready to paste into a test; the diverging call shows both results"""
+    divergence = compare(operations, engine, oracle)
+    lines = []
+    for index, (name, *args) in enumerate(operations):
+        line = f"system.{name}({', '.join(map(repr, args))})"
+        if divergence is not None and index == divergence.index:
+            line += f"  # expected {divergence.expected!r}, got {divergence.actual!r}"
+        lines.append(line)
+    return "\n".join(lines)
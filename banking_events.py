@@ -0,0 +1,247 @@
+import collections
+import threading
+from dataclasses import dataclass
+
+import banking_replay
+
+
+@dataclass(frozen=True, slots=True)
+class AccountCreated:
+    timestamp: int
+    account_id: str
+
+
+@dataclass(frozen=True, slots=True)
+class BalanceChanged:
+    timestamp: int
+    account_id: str
+    balance: int
+
+
+@dataclass(frozen=True, slots=True)
+class PaymentMade:
+    timestamp: int
+    account_id: str
+    payment: str
+    amount: int
+    cashback: int
+    cashback_timestamp: int
+
+
+@dataclass(frozen=True, slots=True)
+class CashbackRefunded:
+    timestamp: int
+    account_id: str
+    payment: str
+    cashback: int
+
+
+@dataclass(frozen=True, slots=True)
+class AccountsMerged:
+    timestamp: int
+    account_id_1: str
+    account_id_2: str
+
+
+# Operations of BankingSystemImpl that attach() wraps, the ones that can publish events
+OPERATIONS = (*banking_replay.OPERATIONS, "deposit_many", "pay_many")
+
+# Backpressure policies for RingBuffer when it is full
+DROP_OLDEST = "drop_oldest"  # discard the oldest buffered event
+DROP_NEWEST = "drop_newest"  # discard the event being published
+BLOCK = "block"  # wait for the consumer (up to `timeout`), then raise BufferFullError
+ERROR = "error"  # raise BufferFullError right away
+BACKPRESSURE_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK, ERROR)
+
+
+class BufferFullError(Exception):
+    """Raised when a RingBuffer with BLOCK or ERROR policy can't take an event"""
+
+
+class RingBuffer:
+    """
+    Bounded buffer of events for one consumer.
+    The consumer calls poll() or get(), possibly from another thread.
+    """
+
+    def __init__(self, bus: "EventBus", capacity: int, backpressure: str, timeout: float | None):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"unknown backpressure policy {backpressure!r}")
+        self.capacity = capacity
+        self.backpressure = backpressure
+        self.timeout = timeout
+        self.dropped = 0  # events lost to DROP_OLDEST / DROP_NEWEST
+        self._bus = bus
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, event):
+        """Called by the bus for every published event"""
+        with self._cond:
+            if len(self._items) >= self.capacity:
+                if self.backpressure == DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped += 1
+                elif self.backpressure == DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                elif self.backpressure == ERROR:
+                    raise BufferFullError(f"ring buffer full ({self.capacity} events)")
+                elif not self._cond.wait_for(lambda: len(self._items) < self.capacity, self.timeout):
+                    raise BufferFullError(f"ring buffer still full after {self.timeout}s")
+            self._items.append(event)
+            self._cond.notify_all()
+
+    def poll(self, max_items: int | None = None) -> list:
+        """Take up to `max_items` buffered events (all if None) without waiting"""
+        with self._cond:
+            count = len(self._items) if max_items is None else min(max_items, len(self._items))
+            events = [self._items.popleft() for _ in range(count)]
+            self._cond.notify_all()
+        return events
+
+    def get(self, timeout: float | None = None):
+        """Wait for the next event, returns None if none arrived within `timeout`"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                return None
+            event = self._items.popleft()
+            self._cond.notify_all()
+        return event
+
+    def close(self):
+        """Stop receiving events"""
+        self._bus._buffers.remove(self)
+
+
+class EventBus:
+    """
+    Change-event stream of one BankingSystemImpl.
+    Events are delivered synchronously to callbacks and ring buffers in the
+    order the system applies the changes. Events are only built while
+    someone is subscribed.
+    attach() wraps the operations so that a call's events are held back
+    until it has applied all its changes: a subscriber that raises (or a
+    full ERROR / BLOCK ring buffer) fails the call after the fact, it never
+    leaves a change half applied. Every subscriber still gets the event,
+    the first exception is raised once all are delivered.
+    While a transaction is open, events are held back and only delivered
+    once it commits. Only the thread that holds is held back, refunds the
+    settlement worker applies are delivered right away.
+    """
+
+    def __init__(self):
+        self._callbacks = []
+        self._buffers = []
+        self._held = None  # events of the running operation or open transaction, None otherwise
+        self._holder = None  # thread that holds
+        self._wrappers = set()  # operation wrappers installed by attach()
+        self.published = 0
+
+    @property
+    def active(self) -> bool:
+        return bool(self._callbacks or self._buffers)
+
+    def subscribe(self, callback) -> callable:
+        """Call `callback(event)` for every event, returns a function to unsubscribe"""
+        self._callbacks.append(callback)
+        return lambda: self._callbacks.remove(callback)
+
+    def ring_buffer(self, capacity: int = 1024, backpressure: str = DROP_OLDEST, timeout: float | None = None) -> RingBuffer:
+        """Subscribe with a bounded buffer, see the backpressure policies above"""
+        buffer = RingBuffer(self, capacity, backpressure, timeout)
+        self._buffers.append(buffer)
+        return buffer
+
+    def publish(self, event):
+        if self._held is not None and self._holder == threading.get_ident():
+            self._held.append(event)
+            return
+        self.published += 1
+        error = None
+        for callback in self._callbacks:
+            try:
+                callback(event)
+            except Exception as exc:
+                error = error or exc
+        for buffer in self._buffers:
+            try:
+                buffer.put(event)
+            except Exception as exc:
+                error = error or exc
+        if error is not None:
+            raise error
+
+    @property
+    def held(self) -> int:
+        """Number of events held back by the open transaction"""
+        return len(self._held) if self._held is not None else 0
+
+    def hold(self):
+        """Hold back the events published by this thread until release()"""
+        if self._held is None:
+            self._held = []
+            self._holder = threading.get_ident()
+
+    def drop_held(self, start: int = 0):
+        """Forget the held events from index `start` on (rolled back changes)"""
+        if self._held is not None:
+            del self._held[start:]
+
+    def release(self):
+        """Deliver the held events and stop holding, raises the first subscriber error after delivering all"""
+        held, self._held = self._held or [], None
+        error = None
+        for event in held:
+            try:
+                self.publish(event)
+            except Exception as exc:
+                error = error or exc
+        if error is not None:
+            raise error
+
+    def attach(self, system):
+        """Replace the OPERATIONS of `system` by wrappers on the instance that deliver their events once they return"""
+        for name in OPERATIONS:
+            if system.__dict__.get(name) not in self._wrappers:
+                wrapper = self._operation(getattr(system, name))
+                self._wrappers.add(wrapper)
+                setattr(system, name, wrapper)
+
+    def _operation(self, method):
+        def delivered(*args):
+            if self._held is not None:
+                # Called by another operation, or inside a transaction
+                return method(*args)
+            self.hold()
+            try:
+                return method(*args)
+            finally:
+                self.release()
+        return delivered
+
+    # Hooks called by BankingSystemImpl
+    def account_created(self, timestamp: int, account_id: str):
+        if self.active:
+            self.publish(AccountCreated(timestamp, account_id))
+
+    def balance_changed(self, timestamp: int, account_id: str, balance: int):
+        if self.active:
+            self.publish(BalanceChanged(timestamp, account_id, balance))
+
+    def payment_made(self, timestamp: int, account_id: str, payment: str, amount: int, cashback: int, cashback_timestamp: int):
+        if self.active:
+            self.publish(PaymentMade(timestamp, account_id, payment, amount, cashback, cashback_timestamp))
+
+    def cashback_refunded(self, timestamp: int, account_id: str, payment: str, cashback: int):
+        if self.active:
+            self.publish(CashbackRefunded(timestamp, account_id, payment, cashback))
+
+    def accounts_merged(self, timestamp: int, account_id_1: str, account_id_2: str):
+        if self.active:
+            self.publish(AccountsMerged(timestamp, account_id_1, account_id_2))
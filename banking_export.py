@@ -0,0 +1,264 @@
+import itertools
+import json
+import os
+import struct
+import sys
+from array import array
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, chunks are written in the native columnar format without it
+    pa = pq = None
+
+
+# Rows per chunk file, bounds the memory of the buffered columns
+CHUNK_ROWS = 65536
+MANIFEST = "manifest.json"
+
+INT, STRING = "q", "s"
+# Exported tables in export order: name -> columns (name, kind). Strings are nullable.
+#   history          balance history of every account (record)
+#   merged_history   pre-merge history of merged accounts
+#   payments         every payment of every account with its cashback, due time and refund status
+#   merges           merges and recreations (merged_into null) of every merged account (merge_log)
+TABLES = {
+    "history": (("account_id", STRING), ("timestamp", INT), ("balance", INT)),
+    "merged_history": (("account_id", STRING), ("timestamp", INT), ("balance", INT)),
+    "payments": (("account_id", STRING), ("payment_id", INT), ("cashback", INT), ("due", INT), ("refunded", INT)),
+    "merges": (("account_id", STRING), ("timestamp", INT), ("merged_into", STRING)),
+}
+
+# Native chunk file, little-endian, every section padded to 8 bytes:
+#   header    magic "BKEX", version, column count, row count n
+#   schema    per column: kind ("q" or "s"), name length, UTF-8 name
+#   columns   int64: q[n]
+#             string: validity u8[n] (0 for null), end offset of every value in the blob q[n], UTF-8 blob
+MAGIC = b"BKEX"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+COLUMN = struct.Struct("<cB")
+
+
+def _padding(size: int) -> int:
+    return -size % 8
+
+
+def _history_rows(mapping, skip: int):
+    """(account_id, timestamp, balance) of every entry, the first `skip` rows left out"""
+    for account_id, entries in mapping.items():
+        if skip >= len(entries):
+            # Whole accounts are skipped without walking their entries
+            skip -= len(entries)
+            continue
+        for timestamp, balance in itertools.islice(entries, skip, None):
+            yield account_id, timestamp, balance
+        skip = 0
+
+
+def _payment_rows(system, skip: int):
+    table = system.payment_table
+    for account_id, payment_ids in system.payments.items():
+        if skip >= len(payment_ids):
+            skip -= len(payment_ids)
+            continue
+        for payment_id in itertools.islice(payment_ids, skip, None):
+            _, cashback, due, refunded = table.row(payment_id)
+            yield account_id, payment_id, cashback, due, int(refunded)
+        skip = 0
+
+
+def _merge_rows(system, skip: int):
+    rows = ((account_id, timestamp, merged_into) for account_id, log in system.merge_log.items()
+            for timestamp, merged_into in log)
+    return itertools.islice(rows, skip, None)
+
+
+def _rows(system, table: str, skip: int):
+    if table == "history":
+        return _history_rows(system.record, skip)
+    if table == "merged_history":
+        return _history_rows(system.merged_history, skip)
+    if table == "payments":
+        return _payment_rows(system, skip)
+    return _merge_rows(system, skip)
+
+
+def write_chunk(path: str, columns: tuple, values: list[list]):
+    """Write one chunk in the native columnar format, `values` holds one list per column"""
+    count = len(values[0]) if values else 0
+    parts = [HEADER.pack(MAGIC, VERSION, len(columns), count)]
+    schema = b"".join(COLUMN.pack(kind.encode("ascii"), len(name.encode("utf-8"))) + name.encode("utf-8")
+                      for name, kind in columns)
+    parts += [schema, bytes(_padding(len(schema)))]
+    for (_, kind), column in zip(columns, values):
+        if kind == INT:
+            data = array("q", column)
+            if sys.byteorder != "little":
+                data.byteswap()
+            parts.append(data.tobytes())
+            continue
+        validity = bytes(value is not None for value in column)
+        encoded = [value.encode("utf-8") if value is not None else b"" for value in column]
+        ends = array("q", itertools.accumulate(map(len, encoded)))
+        if sys.byteorder != "little":
+            ends.byteswap()
+        blob = b"".join(encoded)
+        parts += [validity, bytes(_padding(count)), ends.tobytes(), blob, bytes(_padding(len(blob)))]
+    with open(path, "wb") as file:
+        file.write(b"".join(parts))
+
+
+def _int_column(view: memoryview, offset: int, count: int):
+    if sys.byteorder == "little":
+        return view[offset:offset + 8 * count].cast("q")
+    column = array("q", view[offset:offset + 8 * count])
+    column.byteswap()
+    return memoryview(column)
+
+
+def read_chunk(path: str) -> dict[str, list | memoryview]:
+    """Columns of a native chunk file: int columns are views of the file contents, string columns lists"""
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a columnar export chunk")
+    magic, version, column_count, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} columnar export chunk")
+
+    view = memoryview(data)
+    offset = HEADER.size
+    columns = []
+    for _ in range(column_count):
+        kind, size = COLUMN.unpack_from(data, offset)
+        offset += COLUMN.size
+        columns.append((str(data[offset:offset + size], "utf-8"), kind.decode("ascii")))
+        offset += size
+    offset += _padding(offset - HEADER.size)
+
+    result = {}
+    for name, kind in columns:
+        if kind == INT:
+            if offset + 8 * count > len(data):
+                raise ValueError(f"{path} is truncated")
+            result[name] = _int_column(view, offset, count)
+            offset += 8 * count
+            continue
+        validity = view[offset:offset + count]
+        offset += count + _padding(count)
+        ends = _int_column(view, offset, count)
+        offset += 8 * count
+        size = ends[-1] if count else 0
+        if offset + size > len(data):
+            raise ValueError(f"{path} is truncated")
+        blob = view[offset:offset + size]
+        starts = itertools.chain((0,), ends)
+        result[name] = [str(blob[start:end], "utf-8") if valid else None
+                        for start, end, valid in zip(starts, ends, validity)]
+        offset += size + _padding(size)
+    if offset != len(data):
+        raise ValueError(f"{path} is truncated")
+    return result
+
+
+def _write_parquet(path: str, columns: tuple, values: list[list]):
+    types = {INT: pa.int64(), STRING: pa.string()}
+    pq.write_table(pa.table({name: pa.array(column, types[kind]) for (name, kind), column in zip(columns, values)}), path)
+
+
+def _chunk_path(directory: str, table: str, index: int, file_format: str) -> str:
+    return os.path.join(directory, f"{table}-{index:06d}.{'parquet' if file_format == 'parquet' else 'bkex'}")
+
+
+def _save_manifest(directory: str, manifest: dict):
+    """Write to a temporary file first so a crash leaves the previous manifest"""
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=1)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def load_manifest(directory: str) -> dict | None:
+    """The export's manifest, None if nothing was exported to `directory` yet"""
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def export(system, directory: str, chunk_rows: int = CHUNK_ROWS, file_format: str | None = None) -> dict[str, int]:
+    """
+    Export the balance histories, payments and merges of `system` (TABLES)
+    to chunk files of at most `chunk_rows` rows in `directory`: Parquet if
+    pyarrow is installed (or file_format="parquet"), the native columnar
+    format of write_chunk() otherwise (file_format="native"). Tables are
+    walked account by account, only one chunk of rows is held in memory.
+
+    The manifest records the rows and chunks written per table after every
+    chunk, so an interrupted export called again on the same directory
+    resumes after the last complete chunk, with the manifest's chunk size
+    and format. Resuming needs the same state: export a snapshot or hold
+    writes during the export. Returns the rows per table.
+    """
+    if chunk_rows < 1:
+        raise ValueError("chunk_rows must be at least 1")
+    if system._settlement is not None:
+        # Refunds deferred to background settlement are applied first
+        system._settlement.settle_all()
+    os.makedirs(directory, exist_ok=True)
+    manifest = load_manifest(directory)
+    if manifest is None:
+        if file_format is None:
+            file_format = "parquet" if pq is not None else "native"
+        if file_format not in ("parquet", "native"):
+            raise ValueError(f"unknown format {file_format!r}")
+        manifest = {"format": file_format, "chunk_rows": chunk_rows,
+                    "tables": {table: {"rows": 0, "chunks": 0, "complete": False} for table in TABLES}}
+        _save_manifest(directory, manifest)
+    file_format, chunk_rows = manifest["format"], manifest["chunk_rows"]
+    if file_format == "parquet" and pq is None:
+        raise ImportError("pyarrow is needed for a Parquet export")
+    write = _write_parquet if file_format == "parquet" else write_chunk
+
+    for table, columns in TABLES.items():
+        progress = manifest["tables"][table]
+        if progress["complete"]:
+            continue
+        rows = _rows(system, table, progress["rows"])
+        while True:
+            chunk = list(itertools.islice(rows, chunk_rows))
+            if chunk:
+                write(_chunk_path(directory, table, progress["chunks"], file_format), columns,
+                      [list(column) for column in zip(*chunk)])
+                progress["rows"] += len(chunk)
+                progress["chunks"] += 1
+            if len(chunk) < chunk_rows:
+                progress["complete"] = True
+            _save_manifest(directory, manifest)
+            if progress["complete"]:
+                break
+    return {table: progress["rows"] for table, progress in manifest["tables"].items()}
+
+
+def read_chunks(directory: str, table: str):
+    """Columns of every chunk of `table` in an export directory, in order, one chunk at a time"""
+    manifest = load_manifest(directory)
+    if manifest is None:
+        raise ValueError(f"{directory} holds no export")
+    for index in range(manifest["tables"][table]["chunks"]):
+        path = _chunk_path(directory, table, index, manifest["format"])
+        if manifest["format"] == "parquet":
+            yield pq.read_table(path).to_pydict()
+        else:
+            yield read_chunk(path)
+
+
+def read_rows(directory: str, table: str):
+    """Rows of `table` in an export directory as tuples in column order"""
+    names = [name for name, _ in TABLES[table]]
+    for columns in read_chunks(directory, table):
+        yield from zip(*(columns[name] for name in names))
@@ -0,0 +1,69 @@
+import copy
+
+from banking_system_impl import STATE_FIELDS, BankingSystemImpl
+
+
+# State that forks share until one side writes to it: STATE_FIELDS plus the timer wheel
+SHARED_FIELDS = STATE_FIELDS + ("_cashback_wheel",)
+
+
+class CopyOnWrite:
+    """
+    Tracks which parts of a forked system are still shared with other systems.
+    BankingSystemImpl calls these methods while `system._cow` is set, right
+    before it writes to a container or to one account's value, e.g. a
+    balance history list.
+    - container(field): shallow copy of the whole container on the first write
+    - value(field, key): also a copy of the single entry on its first write,
+      so only accounts that are actually touched get copied
+    A container that was empty when it was copied shares no values, its
+    entries are not tracked (forks of an empty template stay small).
+    """
+
+    def __init__(self, system: BankingSystemImpl):
+        self.system = system
+        self.containers = set()  # fields this system owns
+        self.values = {}  # field -> keys whose values this system owns
+        self.private = set()  # fields copied while empty, every value in them is owned
+
+    def container(self, field: str):
+        if field not in self.containers:
+            self.containers.add(field)
+            shared = getattr(self.system, field)
+            if not len(shared):
+                self.private.add(field)
+            setattr(self.system, field, copy.copy(shared))
+        return getattr(self.system, field)
+
+    def value(self, field: str, key):
+        container = self.container(field)
+        if field in self.private:
+            return container.get(key)
+        owned = self.values.get(field)
+        if owned is None:
+            owned = self.values[field] = set()
+        if key not in owned:
+            owned.add(key)
+            if key in container:
+                container[key] = copy.copy(container[key])
+        return container.get(key)
+
+
+def fork(system: BankingSystemImpl) -> BankingSystemImpl:
+    """
+    Independent copy of `system` in O(1): both systems share all state and
+    copy what they write to on first write (see CopyOnWrite).
+    The fork starts without a checkpointer or event bus.
+    Needs an in-memory storage backend.
+    """
+    if not system.storage.in_memory:
+        raise ValueError(f"cannot fork a system on {system.storage.name!r} storage")
+    child = type(system)(storage=system.storage)
+    for field in SHARED_FIELDS:
+        setattr(child, field, getattr(system, field))
+    child.payment_counter = system.payment_counter
+
+    # Everything is shared again, including what the parent owned so far
+    system._cow = CopyOnWrite(system)
+    child._cow = CopyOnWrite(child)
+    return child
@@ -0,0 +1,192 @@
+import contextlib
+import csv
+import gc
+import itertools
+import struct
+import sys
+from array import array
+
+from banking_storage import DictStorage
+
+
+# Rows per chunk when reading CSV, bounds the memory of the parsed columns
+CSV_CHUNK = 65536
+CSV_HEADER = ("account_id", "timestamp", "balance")
+
+# Columnar account file, little-endian:
+#   header    magic "BKAC", version, pad, row count n, size of the id blob
+#   columns   timestamp q[n], opening balance q[n], end offset of every id in the blob q[n]
+#   ids       UTF-8 account ids back to back
+MAGIC = b"BKAC"
+VERSION = 1
+HEADER = struct.Struct("<4sH2xQQ")
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    """
+    Garbage collection off while loading. The new containers can't form
+    reference cycles, collections triggered by allocating them would only
+    rescan the growing state.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _scalar(system, account_id: str, timestamp: int, balance: int):
+    system.create_account(timestamp, account_id)
+    if balance:
+        system.deposit(timestamp, account_id, balance)
+
+
+def _build(system, rows):
+    """Fast path of load_accounts()"""
+    accounts = system.accounts_dict
+    record = system.record
+    aliases = system.aliases
+    top_cache = system._top_cache
+    # Deposits sweep due cashback first, only needed while refunds are pending
+    sweep = system._process_cashback if len(system._cashback_wheel) else None
+    if type(system.storage) is DictStorage:
+        # History entries are immutable tuples, accounts created at the same
+        # millisecond share their opening entry
+        opening = (None, 0)
+        for account_id, timestamp, balance in rows:
+            if account_id in accounts or account_id in aliases:
+                _scalar(system, account_id, timestamp, balance)
+                continue
+            accounts[account_id] = {"time": timestamp, "account balance": balance}
+            if opening[0] != timestamp:
+                opening = (timestamp, 0)
+            if balance:
+                if sweep is not None:
+                    sweep(timestamp)
+                record[account_id] = [opening, (timestamp, balance)]
+            else:
+                record[account_id] = [opening]
+            if top_cache is not None:
+                top_cache.account_created(account_id)
+    else:
+        storage = system.storage
+        for account_id, timestamp, balance in rows:
+            if account_id in accounts or account_id in aliases:
+                _scalar(system, account_id, timestamp, balance)
+                continue
+            account = storage.account(timestamp)
+            account["account balance"] = balance
+            accounts[account_id] = account
+            if balance:
+                if sweep is not None:
+                    sweep(timestamp)
+                record[account_id] = storage.history(((timestamp, 0), (timestamp, balance)))
+            else:
+                record[account_id] = storage.history(((timestamp, 0),))
+            if top_cache is not None:
+                top_cache.account_created(account_id)
+
+
+def load_accounts(system, account_ids, timestamps, balances) -> int:
+    """
+    Create account_ids[i] at timestamps[i] with opening balance balances[i].
+    The state is the same as after create_account(timestamps[i], account_ids[i])
+    and, for a non-zero balance, deposit(timestamps[i], account_ids[i], balances[i])
+    for every row in order, but new accounts are built directly: no cashback
+    sweep per row unless refunds are pending, no alias resolution, one account
+    state and one history per account. Rows for ids that exist or were merged,
+    and every row while a checkpointer, event bus, fork or transaction is
+    attached, take the per-call path. Returns the number of accounts created.
+    """
+    if not len(account_ids) == len(timestamps) == len(balances):
+        raise ValueError("account_ids, timestamps and balances must have the same length")
+    before = len(system.accounts_dict)
+    rows = zip(account_ids, timestamps, balances)
+    if system._cow is not None or system._undo is not None or system._dirty is not None or system._events is not None:
+        for row in rows:
+            _scalar(system, *row)
+        return len(system.accounts_dict) - before
+
+    with _gc_paused():
+        _build(system, rows)
+    return len(system.accounts_dict) - before
+
+
+def load_csv(system, path: str) -> int:
+    """
+    Load accounts from a CSV file with the columns account_id, timestamp,
+    balance (a header row with these names is skipped), see load_accounts().
+    """
+    created = 0
+    with _gc_paused(), open(path, newline="", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        first = next(reader, None)
+        if first is not None and tuple(first) != CSV_HEADER:
+            reader = itertools.chain([first], reader)
+        while chunk := list(itertools.islice(reader, CSV_CHUNK)):
+            account_ids, timestamps, balances = zip(*chunk)
+            created += load_accounts(system, account_ids, list(map(int, timestamps)), list(map(int, balances)))
+    return created
+
+
+def write_columnar(path: str, account_ids, timestamps, balances):
+    """Write accounts to a columnar account file for load_columnar()"""
+    if not len(account_ids) == len(timestamps) == len(balances):
+        raise ValueError("account_ids, timestamps and balances must have the same length")
+    names = [account_id.encode("utf-8") for account_id in account_ids]
+    ends = array("q", itertools.accumulate(map(len, names)))
+    columns = [array("q", timestamps), array("q", balances), ends]
+    if sys.byteorder != "little":
+        for column in columns:
+            column.byteswap()
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(names), ends[-1] if names else 0))
+        for column in columns:
+            file.write(column.tobytes())
+        file.write(b"".join(names))
+
+
+def read_columnar(path: str) -> tuple[list[str], memoryview, memoryview]:
+    """
+    (account_ids, timestamps, balances) of a columnar account file. The
+    numeric columns are views of the file contents, ids are sliced out of
+    one decoded string when they are all ASCII.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a columnar account file")
+    magic, version, count, names_size = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} columnar account file")
+    if len(data) != HEADER.size + 24 * count + names_size:
+        raise ValueError(f"{path} is truncated")
+
+    view = memoryview(data)
+    columns = []
+    for index in range(3):
+        start = HEADER.size + 8 * count * index
+        if sys.byteorder == "little":
+            columns.append(view[start:start + 8 * count].cast("q"))
+        else:
+            column = array("q", view[start:start + 8 * count])
+            column.byteswap()
+            columns.append(memoryview(column))
+    timestamps, balances, ends = columns
+
+    blob = view[HEADER.size + 24 * count:]
+    starts = itertools.chain((0,), ends)
+    if bytes(blob).isascii():
+        text = str(blob, "ascii")
+        account_ids = [text[start:end] for start, end in zip(starts, ends)]
+    else:
+        account_ids = [str(blob[start:end], "utf-8") for start, end in zip(starts, ends)]
+    return account_ids, timestamps, balances
+
+
+def load_columnar(system, path: str) -> int:
+    """Load accounts from a file written by write_columnar(), see load_accounts()"""
+    return load_accounts(system, *read_columnar(path))
@@ -0,0 +1,276 @@
+from array import array
+from dataclasses import dataclass, replace
+import sys
+import types
+
+
+# Leaf objects: getsizeof already includes everything they own
+_LEAVES = frozenset((int, float, str, bytes, bytearray, array, type(None), bool))
+_COLLECTIONS = frozenset((list, tuple, set, frozenset))
+_BASES = (dict, list, tuple, set, frozenset, int, float, str, bytes, bytearray, array)
+# Program objects shared by every system, never counted
+_PROGRAM = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def deep_size(obj, seen: set) -> int:
+    """
+    Bytes used by `obj` and everything reachable from it (containers, __dict__
+    and __slots__ attributes), by sys.getsizeof. Objects whose id is in `seen`
+    are skipped and every counted object is added to it, so objects shared
+    between structures are counted once. Classes, modules and functions
+    are not counted.
+    """
+    total = 0
+    stack = [obj]
+    getsizeof = sys.getsizeof
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        kind = type(obj)
+        # Exact type checks first, most objects are ints, strings, tuples and dicts
+        if kind not in _LEAVES and kind is not dict and kind not in _COLLECTIONS:
+            if isinstance(obj, _PROGRAM):
+                continue
+            # Subclasses of containers and leaves are walked like their base
+            kind = next((base for base in _BASES if isinstance(obj, base)), object)
+        seen.add(id(obj))
+        total += getsizeof(obj)
+        if kind in _LEAVES:
+            continue
+        if kind is dict:
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif kind in _COLLECTIONS:
+            stack.extend(obj)
+        else:
+            if hasattr(obj, "__dict__"):
+                stack.append(obj.__dict__)
+            for cls in type(obj).__mro__:
+                slots = getattr(cls, "__slots__", ())
+                for name in (slots,) if isinstance(slots, str) else slots:
+                    if hasattr(obj, name):
+                        stack.append(getattr(obj, name))
+    return total
+
+
+# Structures of a BankingSystemImpl in report order. Objects shared between
+# structures (account id strings) are counted in the first one.
+STRUCTURES = ("accounts_dict", "record", "outgoing", "outgoing_ledger", "payments", "payment_table", "_cashback_wheel",
+              "aliases", "merge_times", "merged_history", "merge_children", "merge_log", "account_classes",
+              "cashback_policies")
+# Structures whose values are lists of entries (history entries or payment ids)
+ENTRY_STRUCTURES = frozenset(("record", "outgoing_ledger", "payments", "merged_history"))
+# Structures keyed by account id, they can't have more keys than there are accounts
+ACCOUNT_STRUCTURES = frozenset(("accounts_dict", "record", "outgoing", "outgoing_ledger", "payments", "aliases",
+                                "merge_times", "merged_history", "merge_children", "merge_log", "account_classes"))
+DAY = 86400000
+
+
+@dataclass(frozen=True, slots=True)
+class StructureSize:
+    """Footprint of one structure"""
+    bytes: int
+    keys: int  # accounts (payments for payment_table, pending refunds for _cashback_wheel)
+    entries: int  # history entries or payment ids in all values, 0 for structures without lists
+
+
+@dataclass(frozen=True, slots=True)
+class Cost:
+    """Measured bytes of a structure per key and per entry"""
+    per_key: float
+    per_entry: float
+
+    def bytes(self, keys: float, entries: float) -> float:
+        return self.per_key * keys + self.per_entry * entries
+
+
+def footprint(system) -> dict[str, StructureSize]:
+    """
+    Bytes (deep_size), keys and entries of every structure of an in-memory
+    system, in STRUCTURES order.
+    """
+    if not system.storage.in_memory:
+        raise ValueError(f"cannot measure a system on {system.storage.name!r} storage")
+    seen = set()
+    sizes = {}
+    for name in STRUCTURES:
+        structure = getattr(system, name)
+        entries = sum(map(len, structure.values())) if name in ENTRY_STRUCTURES else 0
+        sizes[name] = StructureSize(deep_size(structure, seen), len(structure), entries)
+    return sizes
+
+
+def _run(config, storage=None) -> tuple[dict[str, StructureSize], dict[str, StructureSize]]:
+    """Footprint after the setup of a generated workload (accounts created and funded) and at its end"""
+    from banking_replay import replay
+    from banking_system_impl import BankingSystemImpl
+    from banking_workload import generate
+
+    operations = generate(config)
+    setup = 2 * config.accounts
+    system = BankingSystemImpl(storage=storage)
+    replay(system, operations[:setup])
+    before = footprint(system)
+    replay(system, operations[setup:])
+    return before, footprint(system)
+
+
+def _determinant(rows) -> float:
+    (a, b, c), (d, e, f), (g, h, i) = rows
+    return a * (e * i - f * h) - b * (d * i - f * g) + c * (d * h - e * g)
+
+
+def measure_costs(storage=None, config=None) -> dict[str, Cost]:
+    """
+    Marginal bytes per key and per entry of every structure, fitted to the
+    footprints of three generated workloads: `config`, half its accounts
+    with twice its operations and twice its accounts. The fit has a
+    constant term for the empty containers, so costs are what one more key
+    or entry adds, container overallocation averaged in.
+    """
+    from banking_workload import WorkloadConfig
+
+    config = config if config is not None else WorkloadConfig(operations=20000, accounts=1000)
+    runs = [_run(variant, storage)[1] for variant in
+            (config, replace(config, accounts=config.accounts // 2, operations=2 * config.operations),
+             replace(config, accounts=2 * config.accounts))]
+    costs = {}
+    for name in STRUCTURES:
+        sizes = [run[name] for run in runs]
+        # bytes = fixed + per_key * keys + per_entry * entries, solved by Cramer's rule
+        matrix = [(1, size.keys, size.entries) for size in sizes]
+        determinant = _determinant(matrix)
+        if name in ENTRY_STRUCTURES and determinant:
+            solution = [_determinant([row[:column] + (size.bytes,) + row[column + 1:] for row, size in zip(matrix, sizes)])
+                        / determinant for column in (1, 2)]
+            if min(solution) >= 0:
+                costs[name] = Cost(*solution)
+                continue
+        # Least squares line through (keys, bytes). Structures with few keys
+        # in every run are too noisy for a slope, they get their mean size per key
+        mean_keys = sum(size.keys for size in sizes) / len(sizes)
+        mean_bytes = sum(size.bytes for size in sizes) / len(sizes)
+        spread = sum((size.keys - mean_keys) ** 2 for size in sizes)
+        slope = sum((size.keys - mean_keys) * (size.bytes - mean_bytes) for size in sizes) / spread if spread else 0
+        costs[name] = Cost(slope if slope > 0 else mean_bytes / max(1.0, mean_keys), 0.0)
+    return costs
+
+
+def observed_rates(before: dict[str, StructureSize], after: dict[str, StructureSize], units: float) -> dict[str, tuple[float, float]]:
+    """Keys and entries added per unit (operations, days, ...) between two footprints"""
+    return {name: ((after[name].keys - before[name].keys) / units, (after[name].entries - before[name].entries) / units)
+            for name in STRUCTURES}
+
+
+def project(sizes: dict[str, StructureSize], rates: dict[str, tuple[float, float]], units: float,
+            costs: dict[str, Cost], max_keys: dict[str, float] | None = None) -> dict[str, int]:
+    """
+    Projected bytes per structure after `units` more units at the observed
+    rates, with at most max_keys[name] keys in a structure. Dicts and lists
+    keep their capacity when keys or entries are removed, so shrinking
+    structures are projected at their current size.
+    """
+    projected = {}
+    for name, size in sizes.items():
+        keys = rates[name][0] * units
+        if max_keys is not None and name in max_keys:
+            keys = min(keys, max(0.0, max_keys[name] - size.keys))
+        projected[name] = round(size.bytes + max(0.0, costs[name].bytes(keys, rates[name][1] * units)))
+    return projected
+
+
+def key_limits(accounts: int, rates: dict[str, tuple[float, float]], units_per_day: float,
+               delay: int | None = None) -> dict[str, float]:
+    """
+    Most keys a structure can reach: `accounts` for structures keyed by
+    account, and for the timer wheel the payments of one cashback `delay`
+    (ms, the default policy's if None), since older ones were refunded.
+    """
+    if delay is None:
+        from banking_cashback import DEFAULT_POLICY
+        delay = DEFAULT_POLICY.delay
+    limits = dict.fromkeys(ACCOUNT_STRUCTURES, accounts)
+    limits["_cashback_wheel"] = rates["payment_table"][0] * units_per_day * delay / DAY
+    return limits
+
+
+def plan(config, accounts: int, operations: list[float], operations_per_day: float,
+         costs: dict[str, Cost] | None = None) -> tuple[dict[str, StructureSize], dict[str, tuple[float, float]], list[dict[str, int]]]:
+    """
+    Capacity plan for the workload `config` with `accounts` accounts: runs
+    it as a sample, scales the footprint after its setup (accounts created
+    and funded) to `accounts` and projects it `operations` further at the
+    sample's rates per operation, see project() and key_limits().
+    Returns (start, rates, bytes per structure for every horizon).
+    """
+    costs = costs if costs is not None else measure_costs()
+    before, after = _run(config)
+    rates = observed_rates(before, after, config.operations - 2 * config.accounts)
+    # Structures keyed by account scale with the accounts, the others (policies) stay as they are
+    scale = accounts / config.accounts
+    start = {name: StructureSize(round(costs[name].bytes(size.keys * scale, size.entries * scale)),
+                                 round(size.keys * scale), round(size.entries * scale))
+             if name in ACCOUNT_STRUCTURES else size for name, size in before.items()}
+    limits = key_limits(accounts, rates, operations_per_day)
+    return start, rates, [project(start, rates, horizon, costs, limits) for horizon in operations]
+
+
+def _mib(size: float) -> str:
+    return f"{size / 2 ** 20:,.1f}"
+
+
+def main(argv: list[str] | None = None):
+    """
+    Capacity planner: measures the per-key and per-entry costs, runs a
+    sample of the workload to observe how fast every structure grows per
+    operation, then projects memory for the target number of accounts.
+    """
+    import argparse
+    import json
+    from banking_workload import WorkloadConfig
+
+    parser = argparse.ArgumentParser(description="Memory capacity estimates for BankingSystemImpl")
+    parser.add_argument("--workload", help="JSON file with WorkloadConfig fields (operation mix, skew, ...)")
+    parser.add_argument("--accounts", type=int, default=1000000, help="accounts in production")
+    parser.add_argument("--operations-per-day", type=float, default=1e6, help="operations per day in production")
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 90, 365], help="projection horizons")
+    parser.add_argument("--memory-gib", type=float, help="memory budget, prints how many days it lasts")
+    args = parser.parse_args(argv)
+
+    fields = {}
+    if args.workload:
+        with open(args.workload, encoding="utf-8") as file:
+            fields = json.load(file)
+    config = WorkloadConfig(**fields)
+
+    costs = measure_costs()
+    start, rates, projections = plan(config, args.accounts, [args.operations_per_day * days for days in args.days],
+                                     args.operations_per_day, costs)
+
+    print(f"workload: {config.operations} sampled operations on {config.accounts} accounts, "
+          f"projected to {args.accounts} accounts and {args.operations_per_day:g} operations per day")
+    header = f"{'structure':<18} {'B/key':>7} {'B/entry':>7} {'new/op':>7} {'MiB now':>10}"
+    header += "".join(f" {f'{days} d':>10}" for days in args.days)
+    print(header)
+    for name in STRUCTURES:
+        growth = rates[name][1] if name in ENTRY_STRUCTURES else rates[name][0]
+        line = f"{name:<18} {costs[name].per_key:>7.0f} {costs[name].per_entry:>7.0f} {growth:>7.3f} {_mib(start[name].bytes):>10}"
+        print(line + "".join(f" {_mib(projection[name]):>10}" for projection in projections))
+    totals = [sum(projection.values()) for projection in projections]
+    now = sum(size.bytes for size in start.values())
+    print(f"{'total':<18} {'':>7} {'':>7} {'':>7} {_mib(now):>10}" + "".join(f" {_mib(total):>10}" for total in totals))
+
+    if args.memory_gib is not None:
+        budget = args.memory_gib * 2 ** 30
+        per_day = (totals[-1] - now) / args.days[-1]
+        if now > budget:
+            print(f"{args.memory_gib:g} GiB is too small for {args.accounts} accounts")
+        elif per_day <= 0:
+            print(f"{args.memory_gib:g} GiB lasts indefinitely")
+        else:
+            print(f"{args.memory_gib:g} GiB lasts about {(budget - now) / per_day:,.0f} days")
+
+
+if __name__ == "__main__":
+    main()
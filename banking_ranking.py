@@ -0,0 +1,93 @@
+from bisect import insort
+
+
+# Invalidation modes of TopSpendersCache
+VERSION = "version"  # every transfer, pay, merge or new account invalidates the cached ranking
+BOUNDARY = "boundary"  # the ranking is updated in place, only a merge that removes a ranked account invalidates it
+
+
+class TopSpendersCache:
+    """
+    Cached top_spenders ranking of a BankingSystemImpl, see
+    enable_top_spenders_cache(). Holds the (-outgoing, account_id) keys of
+    the top `n` accounts for the current `version`; requests for any n up to
+    that are answered from the cache.
+
+    BankingSystemImpl calls outgoing_changed(), account_created() and
+    merged() after the corresponding change while `system._top_cache` is set.
+    In BOUNDARY mode the cached keys are updated instead of dropped: outgoing
+    totals only grow, so an account can only move up, enter the top n and
+    push out the last one. Only a merge that removes a ranked account leaves
+    a gap that needs the accounts outside the cache, and invalidates.
+    """
+
+    def __init__(self, mode: str = VERSION):
+        if mode not in (VERSION, BOUNDARY):
+            raise ValueError(f"unknown invalidation mode {mode!r}")
+        self.mode = mode
+        self.version = 0  # bumped by every change that invalidates the cached ranking
+        self._cached_version = -1
+        self._n = 0  # n the cached ranking was selected for
+        self._ranking = []  # sorted (-outgoing, account_id) keys, fewer than _n only if there are fewer accounts
+        self._members = {}  # account_id -> key, for the accounts in _ranking
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, n: int) -> list[tuple[int, str]] | None:
+        """Keys of the top n if the cache can answer, else None"""
+        if self._cached_version == self.version and n <= self._n:
+            self.hits += 1
+            return self._ranking[:n]
+        self.misses += 1
+        return None
+
+    def put(self, n: int, ranking: list[tuple[int, str]]):
+        """Store a freshly selected ranking, the longest one wins for the same version"""
+        if self._cached_version == self.version and n <= self._n:
+            return
+        self._cached_version = self.version
+        self._n = n
+        self._ranking = ranking
+        self._members = {key[1]: key for key in ranking}
+
+    def invalidate(self):
+        self.version += 1
+
+    def _valid(self) -> bool:
+        return self._cached_version == self.version
+
+    def outgoing_changed(self, account_id: str, outgoing: int):
+        if self.mode == VERSION:
+            self.invalidate()
+        elif self._valid():
+            self._place(account_id, (-outgoing, account_id))
+
+    def account_created(self, account_id: str):
+        self.outgoing_changed(account_id, 0)
+
+    def merged(self, account_id_1: str, account_id_2: str, outgoing_1: int):
+        """account_id_2 was merged into account_id_1, which now has `outgoing_1`"""
+        if self.mode == VERSION:
+            self.invalidate()
+            return
+        if not self._valid():
+            return
+        if account_id_2 in self._members:
+            if len(self._ranking) == self._n:
+                # The next account outside the cache would move up
+                self.invalidate()
+                return
+            self._ranking.remove(self._members.pop(account_id_2))
+        self._place(account_id_1, (-outgoing_1, account_id_1))
+
+    def _place(self, account_id: str, key: tuple[int, str]):
+        ranking = self._ranking
+        old = self._members.get(account_id)
+        if old is not None:
+            ranking.remove(old)
+        elif len(ranking) == self._n:
+            if not ranking or key >= ranking[-1]:
+                return  # stays outside the top n
+            del self._members[ranking.pop()[1]]
+        insort(ranking, key)
+        self._members[account_id] = key
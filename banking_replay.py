@@ -0,0 +1,239 @@
+import heapq
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from banking_cashback import PaymentTable, payment_name
+from banking_system_impl import STATE_FIELDS, BankingSystemImpl
+
+
+# Operations are tuples of (method name, *arguments), e.g. ("deposit", 3, "account1", 100)
+OPERATIONS = (
+    "create_account",
+    "deposit",
+    "transfer",
+    "top_spenders",
+    "pay",
+    "get_payment_status",
+    "merge_accounts",
+    "get_balance",
+)
+
+
+def replay(system: BankingSystemImpl, operations: list[tuple]) -> list:
+    """
+    Serial replay: apply every operation to `system` in order.
+    Returns the result of every operation.
+    """
+    results = []
+    for op in operations:
+        if op[0] not in OPERATIONS:
+            raise ValueError(f"unknown operation {op[0]!r}")
+        results.append(getattr(system, op[0])(*op[1:]))
+    return results
+
+
+def footprint(op: tuple) -> tuple[str, ...]:
+    """
+    Account ids an operation reads or writes.
+    top_spenders reads every account and is handled separately (empty footprint).
+    """
+    name = op[0]
+    if name in ("transfer", "merge_accounts"):
+        return (op[2], op[3])
+    if name == "top_spenders":
+        return ()
+    return (op[2],)
+
+
+def cashback_tick(op: tuple) -> int | None:
+    """
+    Timestamp the operation passes to _process_cashback, or None if it doesn't.
+    Cashback is processed for every account on every tick, so partitions have
+    to see the ticks of all other partitions too.
+    """
+    name = op[0]
+    if name in ("create_account", "top_spenders"):
+        return None
+    if name == "get_balance":
+        return op[3]
+    return op[1]
+
+
+def conflict_groups(operations: list[tuple]) -> list[list[int]]:
+    """
+    Partition operations into conflict-free groups by account footprint.
+    Two operations end up in the same group if they (transitively) touch a
+    common account, e.g. a transfer or merge links both of its accounts.
+    Returns lists of operation indices, each in timestamp order.
+    """
+    parent = {}
+
+    def find(account_id):
+        root = account_id
+        while parent[root] != root:
+            root = parent[root]
+        # path compression
+        while parent[account_id] != root:
+            parent[account_id], account_id = root, parent[account_id]
+        return root
+
+    for op in operations:
+        accounts = footprint(op)
+        for account_id in accounts:
+            parent.setdefault(account_id, account_id)
+        for account_id in accounts[1:]:
+            root_1, root_2 = find(accounts[0]), find(account_id)
+            if root_1 != root_2:
+                parent[root_2] = root_1
+
+    groups = {}
+    for index, op in enumerate(operations):
+        accounts = footprint(op)
+        if accounts:
+            groups.setdefault(find(accounts[0]), []).append(index)
+    return list(groups.values())
+
+
+def _balance_partitions(groups: list[list[int]], workers: int) -> list[list[int]]:
+    """Greedy bin packing of groups into `workers` partitions by operation count"""
+    loads = [(0, i, []) for i in range(workers)]
+    for group in sorted(groups, key=len, reverse=True):
+        load, i, indices = heapq.heappop(loads)
+        indices.extend(group)
+        heapq.heappush(loads, (load + len(group), i, indices))
+    return [sorted(indices) for _, _, indices in loads if indices]
+
+
+def _replay_partition(entries: list[tuple[int, tuple]], ticks: list[tuple[int, int]], tops: list[tuple[int, int, int]],
+                      payment_numbers: dict[int, int] | None) -> tuple[dict, dict, list[int]]:
+    """
+    Replay one partition on a fresh system.
+    - entries: (index, operation) of the partition's own operations
+    - ticks: (index, timestamp) of every cashback tick in the batch
+    - tops: (index, timestamp, n) of every top_spenders call in the batch
+    - payment_numbers: global payment number of each successful pay, or None to number locally
+    Returns (results by index, state, indices of successful pays).
+    """
+    system = BankingSystemImpl()
+    own = {index for index, _ in entries}
+    results = {}
+    paid = []
+
+    stream = heapq.merge(
+        ((index, 0, op) for index, op in entries),
+        ((index, 1, tick) for index, tick in ticks if index not in own),
+        ((index, 2, query) for index, *query in tops),
+    )
+    for index, kind, payload in stream:
+        if kind == 1:
+            # Another partition's call processes cashback for everyone
+            system._process_cashback(payload)
+        elif kind == 2:
+            # Partial top spenders of this partition, merged by the caller
+            results[index] = system.top_spenders(*payload)
+        else:
+            if payload[0] == "pay" and payment_numbers is not None and index in payment_numbers:
+                system.payment_counter = payment_numbers[index]
+            result = getattr(system, payload[0])(*payload[1:])
+            if payload[0] == "pay" and result is not None:
+                paid.append(index)
+            results[index] = result
+
+    state = {name: getattr(system, name) for name in STATE_FIELDS}
+    return results, state, paid
+
+
+def _merge_top_spenders(partials: list[list[str]], n: int) -> list[str]:
+    """Combine per-partition top_spenders lists into the global top n"""
+    entries = []
+    for partial in partials:
+        for entry in partial:
+            account_id, _, amount = entry[:-1].rpartition("(")
+            entries.append((-int(amount), account_id, entry))
+    entries.sort()
+    return [entry for _, _, entry in entries[:n]]
+
+
+def _rename_payments(state: dict, results: dict, paid: list[int], payment_numbers: dict[int, int]):
+    """Replace partition-local payment ids with their global ids"""
+    ids = {local: payment_numbers[index] for local, index in enumerate(paid, start=1)}
+    for index in paid:
+        results[index] = payment_name(payment_numbers[index])
+    for account_id, payments in state["payments"].items():
+        state["payments"][account_id] = array("q", [ids[local] for local in payments])
+    table = PaymentTable()
+    for local, row in state["payment_table"].items():
+        table.add(ids[local], *row)
+    state["payment_table"] = table
+
+
+def replay_parallel(operations: list[tuple], workers: int | None = None) -> tuple[list, BankingSystemImpl]:
+    """
+    Replay a timestamp-ordered batch on a process pool, starting from an empty system.
+    Returns (results, system), identical to a serial replay on a new BankingSystemImpl.
+
+    Operations are split into conflict-free groups, groups are packed into
+    partitions and every partition runs on its own process.
+    Shared effects are reproduced explicitly:
+    - cashback ticks of all operations are replayed in every partition
+    - top_spenders is answered from the partial rankings of all partitions
+    - payment ids are numbered globally in operation order
+    """
+    for op in operations:
+        if op[0] not in OPERATIONS:
+            raise ValueError(f"unknown operation {op[0]!r}")
+
+    workers = workers or os.cpu_count() or 1
+    partitions = _balance_partitions(conflict_groups(operations), workers)
+    ticks = [(index, tick) for index, op in enumerate(operations) if (tick := cashback_tick(op)) is not None]
+    tops = [(index, op[1], op[2]) for index, op in enumerate(operations) if op[0] == "top_spenders"]
+    entries = [[(index, operations[index]) for index in partition] for partition in partitions]
+
+    def run(payment_numbers_per_partition):
+        jobs = [(part, ticks, tops, numbers) for part, numbers in zip(entries, payment_numbers_per_partition)]
+        if len(jobs) <= 1:
+            return [_replay_partition(*job) for job in jobs]
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            return list(pool.map(_replay_partition, *zip(*jobs)))
+
+    # Round 1: partitions number their payments locally
+    outputs = run([None] * len(entries))
+    paid = sorted(index for _, _, part_paid in outputs for index in part_paid)
+    payment_numbers = {index: number for number, index in enumerate(paid, start=1)}
+
+    if any(op[0] == "get_payment_status" for op in operations):
+        # Payment ids in the log refer to global numbers, so replay again with them known
+        outputs = run([{index: payment_numbers[index] for index in part_paid} for _, _, part_paid in outputs])
+    else:
+        for part_results, state, part_paid in outputs:
+            _rename_payments(state, part_results, part_paid, payment_numbers)
+
+    # Combine partition results and states
+    system = BankingSystemImpl()
+    system.payment_counter = len(paid) + 1
+    results = [None] * len(operations)
+    for part_results, state, _ in outputs:
+        for index, result in part_results.items():
+            if operations[index][0] != "top_spenders":
+                results[index] = result
+        for name in STATE_FIELDS:
+            getattr(system, name).update(state[name])
+    system._rebuild_cashback_schedule()
+    for index, _, n in tops:
+        results[index] = _merge_top_spenders([part_results.get(index, []) for part_results, _, _ in outputs], n)
+
+    return results, system
+
+
+def state_bytes(system: BankingSystemImpl) -> bytes:
+    """
+    Canonical byte encoding of the system state, used to check that a
+    parallel replay ends in exactly the same state as a serial one.
+    """
+    if system._settlement is not None:
+        system._settlement.settle_all()
+    state = [(name, sorted(getattr(system, name).items())) for name in STATE_FIELDS]
+    state.append(("payment_counter", system.payment_counter))
+    # repr instead of pickle: pickle output depends on which objects happen to be shared
+    return repr(state).encode()
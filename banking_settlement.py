@@ -0,0 +1,184 @@
+import collections
+import threading
+
+
+class SettlementWorker:
+    """
+    Background settlement of cashback refunds for a BankingSystemImpl, see
+    enable_background_settlement().
+
+    The request path still advances the timer wheel to every call's
+    timestamp, but instead of refunding every due payment inline it hands
+    the list of due payment ids to defer(), an O(1) append. The worker
+    looks up the owners, groups the ids per account and applies them.
+    Each account's deferred refunds keep the timestamp of the call that
+    found them due, and are applied with exactly that timestamp either by
+    the worker thread or by settle() when a call touches the account
+    first. A balance, history entry or payment status is therefore the
+    same as with inline processing, whoever applies it.
+
+    What stays on the request path: taking the due ids out of the wheel
+    (O(due)), and in settle() for lists the worker hasn't grouped yet, one
+    C-level pass to look up their owners and search the touched account
+    (once per list), then applying that account's own refunds.
+
+    All changes to deferred accounts happen under `lock`. Owners are looked
+    up before any call can change them: merge_accounts() settles both
+    accounts first, which looks up the owners of every list deferred so
+    far. After a call
+    has settled an account the worker can't touch it again until the next
+    call defers new refunds, which happens on the calling thread.
+    Change events of deferred refunds are published when they are applied,
+    so CashbackRefunded events of accounts nobody touched can come after
+    later events of other accounts.
+    """
+
+    def __init__(self, system):
+        self.system = system
+        self.lock = threading.Condition(threading.RLock())
+        self._incoming = []  # [timestamp, due payment ids, their owners or None] per call, not grouped yet
+        # account_id -> [(timestamp, payment ids), ...] in timestamp order, least recently deferred first
+        self._pending = collections.OrderedDict()
+        self._applying = None  # account the worker is settling right now
+        self._thread = None
+        self._stopped = False
+        self.deferred = 0  # refunds handed over by defer()
+        self.settled_inline = 0  # refunds applied by settle() on the request path
+        self.settled_background = 0  # refunds applied by the worker
+
+    def defer(self, timestamp: int, due: list[int]):
+        """Refunds of the payments `due` at `timestamp`, grouped per owning account later by _group()"""
+        with self.lock:
+            self._incoming.append([timestamp, due, None])
+            self.deferred += len(due)
+            self.lock.notify()
+
+    def _group(self):
+        """Move the deferred lists into _pending, grouped per owning account (lock held)"""
+        if not self._incoming:
+            return
+        table = self.system.payment_table
+        pending = self._pending
+        for timestamp, due, owners in self._incoming:
+            if owners is None:
+                owners = map(table.owner.__getitem__, due)
+            batch = {}  # account_id -> payment ids of this call
+            refunded = table.refunded
+            for payment_id, account_id in zip(due, owners):
+                if refunded[payment_id]:
+                    # Already applied by settle(). Transactions settle everything
+                    # when they begin, so a rollback can't make it due again here
+                    continue
+                payment_ids = batch.get(account_id)
+                if payment_ids is None:
+                    batch[account_id] = [payment_id]
+                else:
+                    payment_ids.append(payment_id)
+            for account_id, payment_ids in batch.items():
+                batches = pending.get(account_id)
+                if batches is None:
+                    pending[account_id] = [(timestamp, payment_ids)]
+                else:
+                    batches.append((timestamp, payment_ids))
+        # Cleared only now, so settle() sees either the list or its groups
+        self._incoming = []
+
+    def _apply(self, account_id: str) -> int:
+        """Apply the deferred refunds of one account, returns how many (lock held)"""
+        batches = self._pending.pop(account_id, None)
+        applied = self._apply_batches(batches) if batches else 0
+        # Lists that aren't grouped yet are younger than every grouped batch
+        owner = self.system.payment_table.owner
+        refunded = self.system.payment_table.refunded
+        for entry in self._incoming:
+            timestamp, due, owners = entry
+            if owners is None:
+                owners = entry[2] = tuple(map(owner.__getitem__, due))
+            if account_id not in owners:
+                continue
+            positions = []
+            position = owners.index(account_id)
+            while True:
+                positions.append(position)
+                try:
+                    position = owners.index(account_id, position + 1)
+                except ValueError:
+                    break
+            # Refunds applied by an earlier settle() stay in the list until it is grouped
+            payment_ids = [due[position] for position in positions if not refunded[due[position]]]
+            if payment_ids:
+                applied += self._apply_batches([(timestamp, payment_ids)])
+        return applied
+
+    def _apply_batches(self, batches: list[tuple[int, list[int]]]) -> int:
+        for timestamp, payment_ids in batches:
+            self.system._refund(timestamp, payment_ids)
+        return sum(len(payment_ids) for _, payment_ids in batches)
+
+    def settle(self, account_id: str):
+        """Apply the account's deferred refunds now, before a call reads or changes it"""
+        # Checked without the lock: the worker sets _applying before it takes
+        # an account out of _pending, so one of the three always shows it
+        if self._incoming or account_id in self._pending or self._applying == account_id:
+            with self.lock:
+                self.settled_inline += self._apply(account_id)
+
+    def settle_all(self):
+        """Apply every deferred refund, e.g. before the whole state is copied"""
+        with self.lock:
+            self._group()
+            while self._pending:
+                account_id, batches = self._pending.popitem(last=False)
+                self.settled_inline += self._apply_batches(batches)
+
+    def drain(self, limit: int | None = None) -> int:
+        """
+        Apply the deferred refunds of up to `limit` accounts (all if None),
+        oldest first. Returns the number of accounts settled. The worker
+        thread runs this, an asyncio task can call it instead of start().
+        """
+        count = 0
+        while limit is None or count < limit:
+            with self.lock:
+                self._group()
+                if not self._pending:
+                    break
+                self._applying = next(iter(self._pending))
+                batches = self._pending.pop(self._applying)
+                self.settled_background += self._apply_batches(batches)
+                self._applying = None
+            count += 1
+        return count
+
+    @property
+    def pending(self) -> int:
+        """Number of accounts with deferred refunds"""
+        with self.lock:
+            self._group()
+            return len(self._pending)
+
+    def start(self):
+        """Start the daemon thread that settles deferred refunds as they come in"""
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="cashback-settlement", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self._incoming and not self._pending and not self._stopped:
+                    self.lock.wait()
+                if self._stopped:
+                    return
+            self.drain(64)
+
+    def stop(self):
+        """Stop the thread and apply what is still deferred"""
+        with self.lock:
+            self._stopped = True
+            self.lock.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.settle_all()
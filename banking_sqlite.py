@@ -0,0 +1,314 @@
+from contextlib import contextmanager
+import sqlite3
+
+from banking_system import BankingSystem
+from banking_cashback import DEFAULT_POLICY, CashbackPolicy, parse_payment, payment_name
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id TEXT PRIMARY KEY,
+    created INTEGER NOT NULL,
+    balance INTEGER NOT NULL DEFAULT 0,
+    outgoing INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS accounts_by_outgoing ON accounts (outgoing DESC, id);
+
+-- Balance after every change; seq orders entries of one account at the same timestamp
+CREATE TABLE IF NOT EXISTS history (
+    account TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    balance INTEGER NOT NULL,
+    PRIMARY KEY (account, timestamp, seq)
+) WITHOUT ROWID;
+
+-- Pre-merge balance history of merged accounts and of the accounts they were merged into
+CREATE TABLE IF NOT EXISTS merged_history (
+    account TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    balance INTEGER NOT NULL,
+    PRIMARY KEY (account, timestamp, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS payments (
+    id INTEGER PRIMARY KEY,
+    account TEXT NOT NULL,
+    cashback INTEGER NOT NULL,
+    due INTEGER NOT NULL,
+    refunded INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS payments_by_account ON payments (account);
+CREATE INDEX IF NOT EXISTS payments_pending ON payments (due, id) WHERE refunded = 0;
+
+CREATE TABLE IF NOT EXISTS aliases (
+    account TEXT PRIMARY KEY,
+    target TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS aliases_by_target ON aliases (target);
+
+-- seq keeps the order in which accounts were first merged, like the merge_times dict
+CREATE TABLE IF NOT EXISTS merge_times (
+    account TEXT PRIMARY KEY,
+    merge_time INTEGER NOT NULL,
+    seq INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS merge_times_by_time ON merge_times (merge_time);
+"""
+
+# Statements are constant and parameterized, so the connection prepares each one
+# once and reuses it from its statement cache
+ACCOUNT_CREATED = "SELECT created FROM accounts WHERE id = ?"
+ACCOUNT_BALANCE = "SELECT balance FROM accounts WHERE id = ?"
+INSERT_ACCOUNT = "INSERT INTO accounts (id, created) VALUES (?, ?)"
+DELETE_ACCOUNT = "DELETE FROM accounts WHERE id = ?"
+ADD_BALANCE = "UPDATE accounts SET balance = balance + ? WHERE id = ? RETURNING balance"
+ADD_OUTGOING = "UPDATE accounts SET balance = balance - ?1, outgoing = outgoing + ?1 WHERE id = ?2 RETURNING balance"
+MERGE_ACCOUNT = ("UPDATE accounts SET (balance, outgoing) = (SELECT a.balance + b.balance, a.outgoing + b.outgoing "
+                 "FROM accounts a, accounts b WHERE a.id = ?1 AND b.id = ?2) WHERE id = ?1")
+TOP_SPENDERS = "SELECT id, outgoing FROM accounts ORDER BY outgoing DESC, id LIMIT ?"
+
+RECORD_BALANCE = "INSERT INTO history SELECT id, ?, ?, balance FROM accounts WHERE id = ?"
+BALANCE_AT = ("SELECT balance FROM history WHERE account = ? AND timestamp <= ? "
+              "ORDER BY timestamp DESC, seq DESC LIMIT 1")
+# Moves both histories to ?1 with new seqs from ?3 on, in (timestamp, balance) order like a sorted list of tuples
+MERGE_HISTORY = ("UPDATE history SET account = ?1, seq = ?3 + ordered.n "
+                 "FROM (SELECT account, timestamp, seq, ROW_NUMBER() OVER (ORDER BY timestamp, balance) - 1 AS n "
+                 "FROM history WHERE account IN (?1, ?2)) AS ordered "
+                 "WHERE history.account = ordered.account AND history.timestamp = ordered.timestamp "
+                 "AND history.seq = ordered.seq")
+MAX_SEQ = "SELECT MAX(seq) FROM history"
+
+HAS_MERGED_HISTORY = "SELECT 1 FROM merged_history WHERE account = ? LIMIT 1"
+SAVE_MERGED_HISTORY = "INSERT INTO merged_history SELECT * FROM history WHERE account = ?"
+MERGED_BALANCE_AT = ("SELECT balance FROM merged_history WHERE account = ? AND timestamp <= ? AND timestamp < ? "
+                     "ORDER BY timestamp DESC, seq DESC LIMIT 1")
+
+INSERT_PAYMENT = "INSERT INTO payments (id, account, cashback, due) VALUES (?, ?, ?, ?)"
+PAYMENT = "SELECT account, refunded FROM payments WHERE id = ?"
+MOVE_PAYMENTS = "UPDATE payments SET account = ? WHERE account = ?"
+NEXT_PAYMENT = "SELECT COALESCE(MAX(id), 0) + 1 FROM payments"
+# Both use the partial index on (due, id) of payments without refund
+PENDING_CASHBACK = "SELECT account, cashback FROM payments WHERE refunded = 0 AND due <= ? ORDER BY due, id"
+MARK_REFUNDED = "UPDATE payments SET refunded = 1 WHERE refunded = 0 AND due <= ?"
+
+ALIAS = "SELECT target FROM aliases WHERE account = ?"
+SET_ALIAS = "INSERT OR REPLACE INTO aliases VALUES (?, ?)"
+DELETE_ALIAS = "DELETE FROM aliases WHERE account = ?"
+MERGE_TIME = "SELECT merge_time FROM merge_times WHERE account = ?"
+SET_MERGE_TIME = ("INSERT INTO merge_times VALUES (?1, ?2, (SELECT COALESCE(MAX(seq), 0) + 1 FROM merge_times)) "
+                  "ON CONFLICT (account) DO UPDATE SET merge_time = ?2")
+DELETE_MERGE_TIME = "DELETE FROM merge_times WHERE account = ?"
+# Merge time of the first account merged (directly or through merged accounts) into ?1 after ?2
+MERGED_INTO_AFTER = ("WITH RECURSIVE merged (account) AS (SELECT account FROM aliases WHERE target = ?1 "
+                     "UNION ALL SELECT aliases.account FROM aliases JOIN merged ON aliases.target = merged.account) "
+                     "SELECT merge_times.merge_time, MIN(merge_times.seq) FROM merged "
+                     "JOIN merge_times ON merge_times.account = merged.account WHERE merge_times.merge_time > ?2")
+
+
+class SQLiteBankingSystem(BankingSystem):
+    """
+    BankingSystem on a local SQLite database for datasets larger than memory,
+    same results as BankingSystemImpl.
+
+    - accounts: balance, creation time and outgoing total, indexed by outgoing for top_spenders
+    - history: balance history keyed by (account, timestamp), get_balance is one index range lookup
+    - payments: payment id, owner, cashback and due time, a partial index on the
+      due time of unrefunded payments answers the pending cashback query
+    - aliases, merge_times and merged_history: account merging
+
+    Every operation runs in one explicit transaction; batch() runs many
+    operations in a single transaction, e.g. to replay a log.
+    """
+
+    def __init__(self, path: str = ":memory:", policy: CashbackPolicy = DEFAULT_POLICY):
+        # Autocommit mode: transactions are opened and closed explicitly
+        self.connection = sqlite3.connect(path, isolation_level=None, cached_statements=256)
+        self.connection.executescript(SCHEMA)
+        self.policy = policy
+        self.payment_counter = self.connection.execute(NEXT_PAYMENT).fetchone()[0]
+        self._seq = (self.connection.execute(MAX_SEQ).fetchone()[0] or 0) + 1
+        self._in_transaction = False
+
+    @contextmanager
+    def batch(self):
+        """Run the operations inside the with block in one transaction"""
+        if self._in_transaction:
+            yield
+            return
+        self.connection.execute("BEGIN")
+        self._in_transaction = True
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        else:
+            self.connection.execute("COMMIT")
+        finally:
+            self._in_transaction = False
+
+    def close(self):
+        self.connection.close()
+
+    def _one(self, sql: str, parameters: tuple):
+        row = self.connection.execute(sql, parameters).fetchone()
+        return None if row is None else row[0]
+
+    def _exists(self, account_id: str) -> bool:
+        return self._one(ACCOUNT_CREATED, (account_id,)) is not None
+
+    def _resolve(self, account_id: str) -> str:
+        """Resolve merged account to its current account"""
+        while (target := self._one(ALIAS, (account_id,))) is not None:
+            account_id = target
+        return account_id
+
+    def _is_merged_account(self, account_id: str) -> bool:
+        """Deleted from accounts and still aliased to the account it was merged into"""
+        return not self._exists(account_id) and self._one(ALIAS, (account_id,)) is not None
+
+    def _record_balance(self, account_id: str, timestamp: int):
+        self.connection.execute(RECORD_BALANCE, (timestamp, self._seq, account_id))
+        self._seq += 1
+
+    def _process_cashback(self, timestamp: int):
+        """Refund all cashback due by timestamp, summed per account"""
+        due = self.connection.execute(PENDING_CASHBACK, (timestamp,)).fetchall()
+        if not due:
+            return
+        refunds = {}
+        for account_id, cashback in due:
+            refunds[account_id] = refunds.get(account_id, 0) + cashback
+        self.connection.execute(MARK_REFUNDED, (timestamp,))
+        for account_id, cashback in refunds.items():
+            self.connection.execute(ADD_BALANCE, (cashback, account_id)).fetchone()
+            self._record_balance(account_id, timestamp)
+
+    def create_account(self, timestamp: int, account_id: str) -> bool:
+        with self.batch():
+            if self._exists(account_id):
+                return False
+            # Recreating a merged account clears its alias and merge time
+            self.connection.execute(DELETE_ALIAS, (account_id,))
+            self.connection.execute(DELETE_MERGE_TIME, (account_id,))
+            self.connection.execute(INSERT_ACCOUNT, (account_id, timestamp))
+            self._record_balance(account_id, timestamp)
+            return True
+
+    def deposit(self, timestamp: int, account_id: str, amount: int) -> int | None:
+        with self.batch():
+            self._process_cashback(timestamp)
+            if self._is_merged_account(account_id):
+                return None
+            account_id = self._resolve(account_id)
+            balance = self._one(ADD_BALANCE, (amount, account_id))
+            if balance is None:
+                return None
+            self._record_balance(account_id, timestamp)
+            return balance
+
+    def transfer(self, timestamp: int, source_account_id: str, target_account_id: str, amount: int) -> int | None:
+        with self.batch():
+            self._process_cashback(timestamp)
+            if self._is_merged_account(source_account_id) or self._is_merged_account(target_account_id):
+                return None
+            source_account_id = self._resolve(source_account_id)
+            target_account_id = self._resolve(target_account_id)
+            if source_account_id == target_account_id or not self._exists(target_account_id):
+                return None
+            source_balance = self._one(ACCOUNT_BALANCE, (source_account_id,))
+            if source_balance is None or source_balance < amount:
+                return None
+            balance = self._one(ADD_OUTGOING, (amount, source_account_id))
+            self.connection.execute(ADD_BALANCE, (amount, target_account_id)).fetchone()
+            self._record_balance(source_account_id, timestamp)
+            self._record_balance(target_account_id, timestamp)
+            return balance
+
+    def top_spenders(self, timestamp: int, n: int) -> list[str]:
+        # Read from the (outgoing DESC, id) index in order, stops after n rows
+        return [f"{account_id}({outgoing})" for account_id, outgoing in self.connection.execute(TOP_SPENDERS, (n,))]
+
+    def pay(self, timestamp: int, account_id: str, amount: int) -> str | None:
+        with self.batch():
+            self._process_cashback(timestamp)
+            if self._is_merged_account(account_id):
+                return None
+            account_id = self._resolve(account_id)
+            balance = self._one(ACCOUNT_BALANCE, (account_id,))
+            if balance is None or balance < amount:
+                return None
+            self.connection.execute(ADD_OUTGOING, (amount, account_id)).fetchone()
+            self._record_balance(account_id, timestamp)
+
+            payment_id = self.payment_counter
+            self.payment_counter += 1
+            self.connection.execute(INSERT_PAYMENT, (payment_id, account_id, self.policy.cashback(amount), self.policy.due(timestamp)))
+            return payment_name(payment_id)
+
+    def get_payment_status(self, timestamp: int, account_id: str, payment: str) -> str | None:
+        with self.batch():
+            self._process_cashback(timestamp)
+            if self._is_merged_account(account_id):
+                return None
+            account_id = self._resolve(account_id)
+            if not self._exists(account_id):
+                return None
+            payment_id = parse_payment(payment)
+            row = None if payment_id is None else self.connection.execute(PAYMENT, (payment_id,)).fetchone()
+            if row is None or row[0] != account_id:
+                return None
+            return "CASHBACK_RECEIVED" if row[1] else "IN_PROGRESS"
+
+    def merge_accounts(self, timestamp: int, account_id_1: str, account_id_2: str) -> bool:
+        with self.batch():
+            self._process_cashback(timestamp)
+            account_id_1 = self._resolve(account_id_1)
+            account_id_2 = self._resolve(account_id_2)
+            if account_id_1 == account_id_2 or not self._exists(account_id_1) or not self._exists(account_id_2):
+                return False
+
+            execute = self.connection.execute
+            execute(MERGE_ACCOUNT, (account_id_1, account_id_2))
+            # Pending cashback of account_id_2 now refunds to account_id_1
+            execute(MOVE_PAYMENTS, (account_id_1, account_id_2))
+
+            # Keep the pre-merge histories for get_balance, the first merge wins
+            for account_id in (account_id_2, account_id_1):
+                if self._one(HAS_MERGED_HISTORY, (account_id,)) is None:
+                    execute(SAVE_MERGED_HISTORY, (account_id,))
+
+            # Combined history renumbered inside the database, new seqs are above every existing one
+            self._seq += execute(MERGE_HISTORY, (account_id_1, account_id_2, self._seq)).rowcount
+
+            execute(SET_MERGE_TIME, (account_id_2, timestamp))
+            execute(SET_ALIAS, (account_id_2, account_id_1))
+            self._record_balance(account_id_1, timestamp)
+            execute(DELETE_ACCOUNT, (account_id_2,))
+            return True
+
+    def get_balance(self, timestamp: int, account_id: str, time_at: int) -> int | None:
+        with self.batch():
+            self._process_cashback(time_at)
+
+            # Merged account: its own history before the merge, nothing after
+            if self._one(ALIAS, (account_id,)) is not None:
+                merge_time = self._one(MERGE_TIME, (account_id,))
+                if merge_time and time_at >= merge_time:
+                    return None
+                if merge_time and self._one(HAS_MERGED_HISTORY, (account_id,)) is not None:
+                    return self._one(MERGED_BALANCE_AT, (account_id, time_at, merge_time))
+
+            account_id = self._resolve(account_id)
+            created = self._one(ACCOUNT_CREATED, (account_id,))
+            if created is None or time_at < created:
+                return None
+
+            # Before an account merged into it: the history it had before the merge
+            merge_time = self._one(MERGED_INTO_AFTER, (account_id, time_at))
+            if merge_time is not None and self._one(HAS_MERGED_HISTORY, (account_id,)) is not None:
+                return self._one(MERGED_BALANCE_AT, (account_id, time_at, merge_time))
+
+            return self._one(BALANCE_AT, (account_id, time_at))
@@ -0,0 +1,170 @@
+from array import array
+
+from banking_cashback import PaymentTable
+
+
+# Kinds of state containers, tell a backend what values a container holds
+SCALAR = "scalar"  # one int, str or other small value per key (outgoing totals, aliases, ...)
+ACCOUNT = "account"  # account state {"time", "account balance"} per account
+HISTORY = "history"  # list of (timestamp, value) pairs per account (balance history, outgoing ledger)
+IDS = "ids"  # payment ids per account
+
+
+class DictStorage:
+    """
+    Storage backend of BankingSystemImpl: creates the containers the state
+    lives in and the per-account values stored in them.
+    This default backend uses plain dicts, lists and tuples.
+
+    A backend provides:
+    - mapping(field, kind): container for the state field `field`, a MutableMapping
+    - account(timestamp): new account state, supports ["time"] and ["account balance"]
+    - history(entries): new list-like history of (timestamp, value) pairs
+    - payment_ids(): new array-like list of payment ids
+    - payment_table(): table of all payments, see banking_cashback.PaymentTable
+    - in_memory: False if the state can't be copied in memory (fork, checkpoints)
+    """
+
+    name = "dict"
+    in_memory = True
+
+    def mapping(self, field: str, kind: str) -> dict:
+        return {}
+
+    def account(self, timestamp: int) -> dict:
+        return {"time": timestamp, "account balance": 0}
+
+    def history(self, entries=()) -> list:
+        return list(entries)
+
+    def payment_ids(self) -> array:
+        return array("q")
+
+    def payment_table(self) -> PaymentTable:
+        return PaymentTable()
+
+
+class AccountRow:
+    """Account state in two slots instead of a dict, same item access as the dict"""
+
+    __slots__ = ("time", "balance")
+
+    def __init__(self, time: int, balance: int = 0):
+        self.time = time
+        self.balance = balance
+
+    def __getitem__(self, key: str) -> int:
+        if key == "account balance":
+            return self.balance
+        if key == "time":
+            return self.time
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: int):
+        if key == "account balance":
+            self.balance = value
+        elif key == "time":
+            self.time = value
+        else:
+            raise KeyError(key)
+
+    def __copy__(self) -> "AccountRow":
+        return AccountRow(self.time, self.balance)
+
+    def __eq__(self, other) -> bool:
+        try:
+            return self["time"] == other["time"] and self["account balance"] == other["account balance"]
+        except (KeyError, TypeError):
+            return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr({"time": self.time, "account balance": self.balance})
+
+
+class ArrayHistory:
+    """
+    History of (timestamp, value) pairs in two int64 arrays, 16 bytes per
+    entry instead of a tuple object. Behaves like the list of tuples.
+    """
+
+    __slots__ = ("first", "second")
+
+    def __init__(self, entries=()):
+        self.first = array("q")
+        self.second = array("q")
+        self.extend(entries)
+
+    def __len__(self) -> int:
+        return len(self.first)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            history = ArrayHistory()
+            history.first = self.first[index]
+            history.second = self.second[index]
+            return history
+        return self.first[index], self.second[index]
+
+    def __setitem__(self, index, entry):
+        if isinstance(index, slice):
+            entries = list(entry)
+            self.first[index] = array("q", [first for first, _ in entries])
+            self.second[index] = array("q", [second for _, second in entries])
+        else:
+            self.first[index], self.second[index] = entry
+
+    def __delitem__(self, index):
+        del self.first[index]
+        del self.second[index]
+
+    def __iter__(self):
+        return zip(self.first, self.second)
+
+    def __add__(self, other) -> "ArrayHistory":
+        history = self.copy()
+        history.extend(other)
+        return history
+
+    def append(self, entry: tuple[int, int]):
+        self.first.append(entry[0])
+        self.second.append(entry[1])
+
+    def extend(self, entries):
+        for first, second in entries:
+            self.first.append(first)
+            self.second.append(second)
+
+    def sort(self):
+        self[:] = sorted(self)
+
+    def copy(self) -> "ArrayHistory":
+        return self[:]
+
+    __copy__ = copy
+
+    def __eq__(self, other) -> bool:
+        try:
+            return len(self) == len(other) and all(a == tuple(b) for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class ArrayStorage(DictStorage):
+    """
+    Compact in-memory backend: slotted account rows and histories in int64
+    arrays, for large datasets that still fit in memory.
+    """
+
+    name = "array"
+
+    def account(self, timestamp: int) -> AccountRow:
+        return AccountRow(timestamp)
+
+    def history(self, entries=()) -> ArrayHistory:
+        return ArrayHistory(entries)
+
+
+DEFAULT_STORAGE = DictStorage()
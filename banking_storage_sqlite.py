@@ -0,0 +1,352 @@
+import pickle
+import sqlite3
+from array import array
+from collections.abc import MutableMapping
+
+from banking_storage import ACCOUNT, HISTORY, IDS, SCALAR
+
+
+def _encode(value):
+    """ints and strings are stored natively, everything else pickled"""
+    if value is None or isinstance(value, (int, str)):
+        return value
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _decode(value):
+    return pickle.loads(value) if isinstance(value, bytes) else value
+
+
+class SQLiteAccount:
+    """Account state row, item access reads and writes the database"""
+
+    __slots__ = ("mapping", "key")
+    COLUMNS = {"time": "time", "account balance": "balance"}
+
+    def __init__(self, mapping: "SQLiteMapping", key):
+        self.mapping = mapping
+        self.key = key
+
+    def __getitem__(self, name: str) -> int:
+        row = self.mapping.storage.connection.execute(
+            f"SELECT {self.COLUMNS[name]} FROM {self.mapping.table} WHERE key = ?", (self.key,)).fetchone()
+        return row[0]
+
+    def __setitem__(self, name: str, value: int):
+        self.mapping.storage.connection.execute(
+            f"UPDATE {self.mapping.table} SET {self.COLUMNS[name]} = ? WHERE key = ?", (value, self.key))
+
+    def copy(self) -> dict:
+        return {"time": self["time"], "account balance": self["account balance"]}
+
+    def __eq__(self, other) -> bool:
+        return self.copy() == other
+
+    def __repr__(self) -> str:
+        return repr(self.copy())
+
+
+class SQLiteSequence:
+    """
+    Balance history, outgoing ledger or payment id list of one account, a
+    list-like view on rows (key, idx, a, b). Indexes are dense from 0, so
+    item access and len() are primary key lookups.
+    """
+
+    __slots__ = ("mapping", "key")
+
+    def __init__(self, mapping: "SQLiteMapping", key):
+        self.mapping = mapping
+        self.key = key
+
+    @property
+    def _items(self) -> str:
+        return self.mapping.table + "_items"
+
+    def _execute(self, sql: str, parameters=()):
+        return self.mapping.storage.connection.execute(sql.format(items=self._items), parameters)
+
+    def _value(self, row: tuple):
+        return (row[0], row[1]) if self.mapping.kind == HISTORY else row[1]
+
+    def _columns(self, entry) -> tuple:
+        return tuple(entry) if self.mapping.kind == HISTORY else (None, entry)
+
+    def __len__(self) -> int:
+        last = self._execute("SELECT MAX(idx) FROM {items} WHERE key = ?", (self.key,)).fetchone()[0]
+        return 0 if last is None else last + 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            rows = self._execute("SELECT a, b FROM {items} WHERE key = ? AND idx >= ? AND idx < ? ORDER BY idx",
+                                 (self.key, start, stop)).fetchall()
+            return self.mapping.materialize([self._value(row) for row in rows[::step]])
+        if index < 0:
+            index += len(self)
+        row = self._execute("SELECT a, b FROM {items} WHERE key = ? AND idx = ?", (self.key, index)).fetchone()
+        if row is None:
+            raise IndexError("history index out of range")
+        return self._value(row)
+
+    def __setitem__(self, index, entry):
+        if isinstance(index, slice):
+            entries = list(self)
+            entries[index] = list(entry)
+            self._rewrite(entries)
+            return
+        if index < 0:
+            index += len(self)
+        self._execute("UPDATE {items} SET a = ?, b = ? WHERE key = ? AND idx = ?", self._columns(entry) + (self.key, index))
+
+    def __delitem__(self, index):
+        if isinstance(index, slice) and index.step is None and index.stop is None:
+            # Truncation (undo and rollback of appends)
+            start = index.indices(len(self))[0]
+            self._execute("DELETE FROM {items} WHERE key = ? AND idx >= ?", (self.key, start))
+            return
+        entries = list(self)
+        del entries[index]
+        self._rewrite(entries)
+
+    def __iter__(self):
+        rows = self._execute("SELECT a, b FROM {items} WHERE key = ? ORDER BY idx", (self.key,)).fetchall()
+        return iter([self._value(row) for row in rows])
+
+    def _rewrite(self, entries: list):
+        self._execute("DELETE FROM {items} WHERE key = ?", (self.key,))
+        self._insert(0, entries)
+
+    def _insert(self, start: int, entries: list):
+        self.mapping.storage.connection.executemany(
+            f"INSERT INTO {self._items} (key, idx, a, b) VALUES (?, ?, ?, ?)",
+            [(self.key, start + i) + self._columns(entry) for i, entry in enumerate(entries)])
+
+    def append(self, entry):
+        self._insert(len(self), [entry])
+
+    def extend(self, entries):
+        entries = list(entries)  # may read from another sequence of the same table
+        self._insert(len(self), entries)
+
+    def sort(self):
+        self._rewrite(sorted(self))
+
+    def copy(self):
+        return self.mapping.materialize(list(self))
+
+    def __add__(self, other):
+        return self.mapping.materialize(list(self) + list(other))
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class SQLiteMapping(MutableMapping):
+    """
+    One state container in its own table. Scalars are stored in the row,
+    account state in (time, balance) columns, histories and payment id lists
+    in a second `<table>_items` table keyed by (key, idx).
+    Values of account, history and id containers are live views on the rows.
+    """
+
+    def __init__(self, storage: "SQLiteStorage", table: str, kind: str):
+        self.storage = storage
+        self.table = table
+        self.kind = kind
+        execute = storage.connection.execute
+        if kind == SCALAR:
+            execute(f"CREATE TABLE IF NOT EXISTS {table} (key PRIMARY KEY, value) WITHOUT ROWID")
+        elif kind == ACCOUNT:
+            execute(f"CREATE TABLE IF NOT EXISTS {table} (key PRIMARY KEY, time INTEGER, balance INTEGER) WITHOUT ROWID")
+        else:
+            execute(f"CREATE TABLE IF NOT EXISTS {table} (key PRIMARY KEY) WITHOUT ROWID")
+            execute(f"CREATE TABLE IF NOT EXISTS {table}_items "
+                    "(key, idx INTEGER, a INTEGER, b INTEGER, PRIMARY KEY (key, idx)) WITHOUT ROWID")
+
+    def materialize(self, values: list):
+        """In-memory copy of a history or id list"""
+        return array("q", values) if self.kind == IDS else values
+
+    def __contains__(self, key) -> bool:
+        return self.storage.connection.execute(f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)).fetchone() is not None
+
+    def __getitem__(self, key):
+        if self.kind == SCALAR:
+            row = self.storage.connection.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            return _decode(row[0])
+        if key not in self:
+            raise KeyError(key)
+        return SQLiteAccount(self, key) if self.kind == ACCOUNT else SQLiteSequence(self, key)
+
+    def __setitem__(self, key, value):
+        execute = self.storage.connection.execute
+        if self.kind == SCALAR:
+            execute(f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)", (key, _encode(value)))
+        elif self.kind == ACCOUNT:
+            execute(f"INSERT OR REPLACE INTO {self.table} (key, time, balance) VALUES (?, ?, ?)",
+                    (key, value["time"], value["account balance"]))
+        else:
+            if isinstance(value, SQLiteSequence) and value.mapping is self and value.key == key:
+                return
+            entries = list(value)
+            execute(f"INSERT OR IGNORE INTO {self.table} (key) VALUES (?)", (key,))
+            SQLiteSequence(self, key)._rewrite(entries)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.storage.connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        if self.kind in (HISTORY, IDS):
+            self.storage.connection.execute(f"DELETE FROM {self.table}_items WHERE key = ?", (key,))
+
+    _MISSING = object()
+
+    def pop(self, key, default=_MISSING):
+        # Copy the value out before its rows are deleted
+        if key not in self:
+            if default is self._MISSING:
+                raise KeyError(key)
+            return default
+        value = self[key]
+        if not isinstance(value, (int, str)) and value is not None and self.kind != SCALAR:
+            value = value.copy()
+        del self[key]
+        return value
+
+    def __iter__(self):
+        return iter([row[0] for row in self.storage.connection.execute(f"SELECT key FROM {self.table}")])
+
+    def __len__(self) -> int:
+        return self.storage.connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def __repr__(self) -> str:
+        return f"SQLiteMapping({self.table!r}, {dict(self.items())!r})"
+
+
+class _SQLiteColumn:
+    """One column of the payment table, indexed by payment id like the in-memory columns"""
+
+    __slots__ = ("table", "column", "default")
+
+    def __init__(self, table: "SQLitePaymentTable", column: str, default):
+        self.table = table
+        self.column = column
+        self.default = default
+
+    def __getitem__(self, payment_id: int):
+        row = self.table.storage.connection.execute(
+            f"SELECT {self.column} FROM payment_table WHERE id = ?", (payment_id,)).fetchone()
+        return self.default if row is None else row[0]
+
+    def __setitem__(self, payment_id: int, value):
+        self.table.storage.connection.execute(
+            f"UPDATE payment_table SET {self.column} = ? WHERE id = ?", (int(value) if isinstance(value, bool) else value, payment_id))
+
+    def __iter__(self):
+        """Values by payment id from 0, ids without a payment give the default"""
+        values = dict(self.table.storage.connection.execute(f"SELECT id, {self.column} FROM payment_table"))
+        last = max(values, default=0)
+        return iter([values.get(payment_id, self.default) for payment_id in range(last + 1)])
+
+
+class SQLitePaymentTable:
+    """banking_cashback.PaymentTable in the payment_table table"""
+
+    def __init__(self, storage: "SQLiteStorage"):
+        self.storage = storage
+        storage.connection.execute("CREATE TABLE IF NOT EXISTS payment_table "
+                                   "(id INTEGER PRIMARY KEY, owner TEXT, cashback INTEGER, due INTEGER, refunded INTEGER)")
+        self.owner = _SQLiteColumn(self, "owner", None)
+        self.cashback = _SQLiteColumn(self, "cashback", 0)
+        self.due = _SQLiteColumn(self, "due", 0)
+        self.refunded = _SQLiteColumn(self, "refunded", 0)
+
+    def add(self, payment_id: int, owner: str, cashback: int, due: int, refunded: bool = False):
+        if owner is None:
+            self.remove(payment_id)
+            return
+        self.storage.connection.execute("INSERT OR REPLACE INTO payment_table VALUES (?, ?, ?, ?, ?)",
+                                        (payment_id, owner, cashback, due, int(refunded)))
+
+    def remove(self, payment_id: int):
+        self.storage.connection.execute("DELETE FROM payment_table WHERE id = ?", (payment_id,))
+
+    def row(self, payment_id: int) -> tuple[str, int, int, bool]:
+        row = self.storage.connection.execute(
+            "SELECT owner, cashback, due, refunded FROM payment_table WHERE id = ?", (payment_id,)).fetchone()
+        return (None, 0, 0, False) if row is None else (row[0], row[1], row[2], bool(row[3]))
+
+    def __contains__(self, payment_id: int) -> bool:
+        return self.storage.connection.execute("SELECT 1 FROM payment_table WHERE id = ?", (payment_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self.storage.connection.execute("SELECT COUNT(*) FROM payment_table").fetchone()[0]
+
+    def items(self):
+        rows = self.storage.connection.execute("SELECT id, owner, cashback, due, refunded FROM payment_table ORDER BY id").fetchall()
+        return iter([(row[0], (row[1], row[2], row[3], bool(row[4]))) for row in rows])
+
+    def pending(self):
+        rows = self.storage.connection.execute("SELECT id, due FROM payment_table WHERE refunded = 0 ORDER BY id").fetchall()
+        return iter(rows)
+
+    def last_id(self) -> int:
+        return self.storage.connection.execute("SELECT COALESCE(MAX(id), 0) FROM payment_table").fetchone()[0]
+
+    def update(self, other):
+        for payment_id, row in other.items():
+            self.add(payment_id, *row)
+
+    def __eq__(self, other) -> bool:
+        return list(self.items()) == list(other.items())
+
+
+class SQLiteStorage:
+    """
+    Storage backend on a local SQLite database, for datasets larger than
+    memory: every state container is a table and per-account values are
+    live views on their rows, so only the timer wheel of pending cashback
+    stays in memory.
+    Changes are written inside one open SQLite transaction, commit() makes
+    them durable. Forks, checkpoints and begin()/rollback() need an
+    in-memory backend.
+    """
+
+    name = "sqlite"
+    in_memory = False
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self._tables = set()
+
+    def mapping(self, field: str, kind: str) -> SQLiteMapping:
+        if field in self._tables:
+            raise ValueError(f"table {field!r} is already used by another system, use one SQLiteStorage per system")
+        self._tables.add(field)
+        return SQLiteMapping(self, field, kind)
+
+    def account(self, timestamp: int) -> dict:
+        return {"time": timestamp, "account balance": 0}
+
+    def history(self, entries=()) -> list:
+        return list(entries)
+
+    def payment_ids(self) -> array:
+        return array("q")
+
+    def payment_table(self) -> SQLitePaymentTable:
+        return SQLitePaymentTable(self)
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
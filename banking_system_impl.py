@@ -1,28 +1,80 @@
+from bisect import bisect_left, bisect_right
+import heapq
+from operator import itemgetter
+import sys
+
 from banking_system import BankingSystem
+from banking_cashback import DEFAULT_CLASS, DEFAULT_POLICY, CashbackPolicy, TimerWheel, parse_payment, payment_name
+from banking_storage import ACCOUNT, DEFAULT_STORAGE, HISTORY, IDS, SCALAR
+
+
+# Structures that make up the state of a BankingSystemImpl (besides payment_counter)
+STATE_FIELDS = ("accounts_dict", "record", "outgoing", "outgoing_ledger", "payments", "payment_table", "aliases", "merge_times",
+                "merged_history", "merge_children", "merge_log", "account_classes", "cashback_policies")
 
 
 class BankingSystemImpl(BankingSystem):
 
-    def __init__(self):
+    # Width of the outgoing ledger buckets in ms. 1 keeps windows exact,
+    # wider buckets use less memory but round windows to bucket boundaries.
+    OUTGOING_BUCKET_MS = 1
+
+    def __init__(self, storage=None):
         """
         Initialize all data structure for account storage and transaction tracking. 
+        The containers come from `storage` (banking_storage.DictStorage by default),
+        see banking_storage for the compact array and SQLite backends.
         - accounts_dict: Maps account_id to account info (timestamp, balance)
         - record: Balance history per account for timestamp queries
         - outgoing: Total outgoing transactions per account
-        - payments: Stores all payment transactions per account
+        - outgoing_ledger: Time-bucketed running outgoing totals per account for windowed queries
+        - payments: Integer ids of all payment transactions per account
+        - payment_table: Cashback, due time, status and owner of every payment by integer id
+        - account_classes: Account class per account, selects the cashback policy (default if missing)
+        - cashback_policies: Cashback policy per account class
+        - _cashback_wheel: Timer wheel of pending cashback payment ids, ordered by due time
         - aliases: Account ID redirection for merged accounts
         - merge_times: Records the timestamp at which an account was merged
         - merged_history: Stores pre-merge balance history of merged accounts
+        - merge_children: Merge forest, the accounts merged into each account with their own merge_children
+        - merge_log: Merges and recreations of every merged account, for absorbed_into()
+        - _dirty: Optional tracker of changed accounts for incremental checkpoints
+        - _events: Optional change-event stream, see enable_events()
+        - _cow: Optional copy-on-write tracker of state shared with forks, see fork()
+        - _undo: Undo log while a transaction is open, see begin()
+        - _top_cache: Optional cached top_spenders ranking, see enable_top_spenders_cache()
+        - _settlement: Optional background cashback settlement, see enable_background_settlement()
+        - _tracer: Optional per-call latency tracer, see enable_tracing()
         """
         # TODO: implement
-        self.accounts_dict = {}
-        self.record = {} # added for level 4 to keep track of balance
-        self.outgoing = {} # added for level2
-        self.payments = {} # added for level3 pay method
+        self.storage = storage = storage if storage is not None else DEFAULT_STORAGE
+        self.accounts_dict = storage.mapping("accounts_dict", ACCOUNT)
+        self.record = storage.mapping("record", HISTORY) # added for level 4 to keep track of balance
+        self.outgoing = storage.mapping("outgoing", SCALAR) # added for level2
+        self.outgoing_ledger = storage.mapping("outgoing_ledger", HISTORY)  # account_id -> [(bucket_start, cumulative outgoing)] for top_spenders_between
+        self.payments = storage.mapping("payments", IDS) # added for level3 pay method, account_id -> array of payment ids
+        self.payment_table = storage.payment_table()  # payment id -> (owner, cashback, due, refunded)
         self.payment_counter = 1  # added for level 3 to generate payment1, payment2
-        self.aliases = {} # Level 4: merged account redirection
-        self.merge_times = {}  # Level 4: Store when each account was merged (account_id -> merge_timestamp)
-        self.merged_history = {}  # Level 4: Store merged account's original history before merge
+        self.account_classes = storage.mapping("account_classes", SCALAR)  # account_id -> account class
+        self.cashback_policies = storage.mapping("cashback_policies", SCALAR)  # account class -> CashbackPolicy
+        self.cashback_policies[DEFAULT_CLASS] = DEFAULT_POLICY
+        self._cashback_wheel = TimerWheel()  # pending payment ids by cashback timestamp
+        self.aliases = storage.mapping("aliases", SCALAR) # Level 4: merged account redirection
+        self.merge_times = storage.mapping("merge_times", SCALAR)  # Level 4: Store when each account was merged (account_id -> merge_timestamp)
+        self.merged_history = storage.mapping("merged_history", HISTORY)  # Level 4: Store merged account's original history before merge
+        self.merge_children = storage.mapping("merge_children", SCALAR)  # account_id -> ((merge_time, child_id, child's merge_children), ...)
+        self.merge_log = storage.mapping("merge_log", SCALAR)  # account_id -> ((timestamp, merged into or None when recreated), ...)
+        self._dirty = None  # banking_checkpoint.DirtyTracker while a checkpointer is attached
+        self._events = None  # banking_events.EventBus once enable_events() was called
+        self._cow = None  # banking_fork.CopyOnWrite once the system was forked
+        self._undo = None  # banking_transaction.UndoLog while a transaction is open
+        self._top_cache = None  # banking_ranking.TopSpendersCache once enable_top_spenders_cache() was called
+        self._settlement = None  # banking_settlement.SettlementWorker once enable_background_settlement() was called
+        self._tracer = None  # banking_tracing.Tracer once enable_tracing() was called
+        if len(self.payment_table):
+            # A reopened database (SQLiteStorage): continue its payment ids and refund its pending cashback
+            self.payment_counter = self.payment_table.last_id() + 1
+            self._rebuild_cashback_schedule()
     
     def _resolve(self, account_id: str) -> str:
         """Resolve merged account to its current account"""
@@ -38,6 +90,19 @@ class BankingSystemImpl(BankingSystem):
         has_alias = account_id in self.aliases
         return is_deleted and has_alias
     
+    # Level 4
+    def _latest_merge_into(self, account_id: str) -> int | None:
+        """
+        Latest merge time of the accounts that resolve to account_id, from the
+        merge forest. Accounts merged into a child were merged before the
+        child itself, so only direct children are checked, newest first,
+        skipping children that were recreated since.
+        """
+        for merge_time, child_id, _ in reversed(self.merge_children.get(account_id, ())):
+            if self.aliases.get(child_id) == account_id and self.merge_times.get(child_id) == merge_time:
+                return merge_time
+        return None
+
     # Level 4
     def _binary_search_record(self, balance_record: list[tuple[int, int]], time_at: int) -> int | None:
         """Calls binary search for balance history to find balance at or before time_at"""
@@ -57,24 +122,184 @@ class BankingSystemImpl(BankingSystem):
 
         return result
     
+    # Level 4
+    def _history_before(self, account_id: str, merge_time: int) -> list[tuple[int, int]]:
+        """Balance history of account_id as it was kept when it merged, before merge_time"""
+        return [(t, b) for t, b in self.merged_history[account_id] if t < merge_time]
+
+    # Level 4
+    def _merge_records(self, account_id_1: str, account_id_2: str):
+        """Add account_id_2's balance history to account_id_1's, in timestamp order"""
+        self.record[account_id_1].extend(self.record[account_id_2])
+        self.record[account_id_1].sort()
+
     # Level 4
     def _record_balance(self, account_id: str, timestamp: int):
         """Stores a history of balance"""
         record_balance = self.accounts_dict[account_id]["account balance"]
+        if self._cow is not None:
+            self._cow.value("record", account_id)
+        if self._undo is not None:
+            self._undo.tail(self.record[account_id])
+        if self._dirty is not None:
+            self._dirty.account(account_id)
+            self._dirty.history(account_id, len(self.record[account_id]))
         self.record[account_id].append((timestamp, record_balance))
+        if self._events is not None:
+            self._events.balance_changed(timestamp, account_id, record_balance)
         
     
+    # Level 2
+    def _add_outgoing(self, account_id: str, timestamp: int, amount: int):
+        """Adds amount to the outgoing total and to the current bucket of the outgoing ledger"""
+        if self._cow is not None:
+            self._cow.container("outgoing")
+            self._cow.value("outgoing_ledger", account_id)
+        if self._undo is not None:
+            self._undo.entry("outgoing", account_id)
+            if account_id in self.outgoing_ledger:
+                self._undo.tail(self.outgoing_ledger[account_id])
+            else:
+                self._undo.entry("outgoing_ledger", account_id)
+        self.outgoing[account_id] = self.outgoing.get(account_id, 0) + amount
+
+        bucket = timestamp - timestamp % self.OUTGOING_BUCKET_MS
+        if account_id not in self.outgoing_ledger:
+            self.outgoing_ledger[account_id] = self.storage.history()
+        ledger = self.outgoing_ledger[account_id]
+        if ledger and ledger[-1][0] == bucket:
+            # Same bucket: update the last running total
+            ledger[-1] = (bucket, ledger[-1][1] + amount)
+        else:
+            ledger.append((bucket, (ledger[-1][1] if ledger else 0) + amount))
+
+        if self._dirty is not None:
+            self._dirty.outgoing(account_id)
+            self._dirty.ledger(account_id, len(ledger) - 1)
+        if self._top_cache is not None:
+            self._top_cache.outgoing_changed(account_id, self.outgoing[account_id])
+
+    # Level 2
+    def _merge_ledgers(self, ledger_1: list[tuple[int, int]], ledger_2: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        """Combines two outgoing ledgers: per-bucket amounts of both, then running totals again"""
+        amounts = []
+        for ledger in (ledger_1, ledger_2):
+            previous = 0
+            for bucket, total in ledger:
+                amounts.append((bucket, total - previous))
+                previous = total
+        amounts.sort(key=itemgetter(0))
+
+        combined = []
+        running = 0
+        for bucket, amount in amounts:
+            running += amount
+            if combined and combined[-1][0] == bucket:
+                combined[-1] = (bucket, running)
+            else:
+                combined.append((bucket, running))
+        return combined
+
+    # Level 2
+    def _outgoing_between(self, account_id: str, time_from: int, time_to: int) -> int:
+        """Outgoing total of buckets in [time_from, time_to] from the running totals (two binary searches)"""
+        ledger = self.outgoing_ledger.get(account_id)
+        if not ledger:
+            return 0
+        hi = bisect_right(ledger, time_to, key=itemgetter(0))
+        lo = bisect_left(ledger, time_from - time_from % self.OUTGOING_BUCKET_MS, key=itemgetter(0))
+        if hi <= lo:
+            return 0
+        return ledger[hi - 1][1] - (ledger[lo - 1][1] if lo > 0 else 0)
+
     # Level 3
     def _process_cashback(self, timestamp: int):
-        """Process pending cashback refunds up to timestamp"""
-        for account_id in self.payments:
-            for payment_id, record in self.payments[account_id].items():
-                if not record["refunded"] and timestamp >= record["cashback_timestamp"]:
-                    self.accounts_dict[account_id]["account balance"] += record["cashback"]
-                    record["refunded"] = True
+        """
+        Process pending cashback refunds up to timestamp.
+        Refunds are summed per account first, so after a long idle period every
+        account gets one balance update and one history entry at `timestamp`
+        instead of one per refund.
+        """
+        # Only due entries come out of the timer wheel, in due time order
+        if self._cow is not None:
+            self._cow.container("_cashback_wheel")
+        due = self._cashback_wheel.advance(timestamp)
+        if not due:
+            return
+        if self._settlement is not None and self._cow is None and self._undo is None:
+            # Refunded in the background, or by the first call that touches the account
+            self._settlement.defer(timestamp, due)
+            return
+        self._refund(timestamp, due)
+
+    # Level 3
+    def _refund(self, timestamp: int, due: list[int]):
+        """Refund the cashback of the payment ids `due`, found due by the call at `timestamp`"""
+        if self._cow is not None:
+            self._cow.container("payment_table")
+            for payment_id in due:
+                self._cow.value("accounts_dict", self.payment_table.owner[payment_id])
+        if self._undo is not None:
+            for payment_id in due:
+                self._undo.refund(payment_id)
+            for account_id in dict.fromkeys(self.payment_table.owner[payment_id] for payment_id in due):
+                self._undo.balance(account_id)
+
+        table = self.payment_table
+        refunds = {}  # account_id -> total cashback due
+        for payment_id in due:
+            account_id = table.owner[payment_id]
+            cashback = table.cashback[payment_id]
+            table.refunded[payment_id] = True
+            refunds[account_id] = refunds.get(account_id, 0) + cashback
+            if self._dirty is not None:
+                self._dirty.payment(payment_id)
+            if self._events is not None:
+                self._events.cashback_refunded(timestamp, account_id, payment_name(payment_id), cashback)
+
+        for account_id, cashback in refunds.items():
+            self.accounts_dict[account_id]["account balance"] += cashback
+            # update balance record
+            self._record_balance(account_id, timestamp)
+
+    # Level 3
+    def _cashback_policy(self, account_id: str) -> CashbackPolicy:
+        """Cashback policy of the account's class"""
+        return self.cashback_policies[self.account_classes.get(account_id, DEFAULT_CLASS)]
+
+    # Level 3
+    def _schedule_cashback(self, account_id: str, payment_id: int, cashback: int, cashback_timestamp: int):
+        """Store the payment in the payment table and put its cashback on the timer wheel"""
+        # One shared string per account instead of one per payment in the owner column
+        account_id = sys.intern(account_id)
+        if self._cow is not None:
+            self._cow.value("payments", account_id)
+            self._cow.container("payment_table")
+            self._cow.container("_cashback_wheel")
+        if self._undo is not None:
+            if account_id in self.payments:
+                self._undo.tail(self.payments[account_id])
+            else:
+                self._undo.entry("payments", account_id)
+        if account_id not in self.payments:
+            self.payments[account_id] = self.storage.payment_ids()
+        if self._dirty is not None:
+            self._dirty.payment_ids(account_id, len(self.payments[account_id]))
+            self._dirty.payment(payment_id)
+        self.payments[account_id].append(payment_id)
+        self.payment_table.add(payment_id, account_id, cashback, cashback_timestamp)
+        handle = self._cashback_wheel.add(cashback_timestamp, payment_id)
+        if self._undo is not None:
+            self._undo.payment(payment_id, handle)
 
-                    # update balance record
-                    self._record_balance(account_id, timestamp)
+    # Level 3
+    def _rebuild_cashback_schedule(self):
+        """Rebuild the timer wheel from the payment table, e.g. after restoring a snapshot"""
+        self._cashback_wheel = TimerWheel()
+        table = self.payment_table
+        # payment id order keeps the same tie-breaking as the live system
+        for payment_id, due in table.pending():
+            self._cashback_wheel.add(due, payment_id)
 
 
     def create_account(self, timestamp: int, account_id: str) -> bool:
@@ -87,17 +312,37 @@ class BankingSystemImpl(BankingSystem):
         if account_id in self.accounts_dict:
             return False # Return False if account exists
         
+        if self._cow is not None:
+            for field in ("aliases", "merge_times", "merge_log", "accounts_dict", "record"):
+                self._cow.value(field, account_id)
+        if self._undo is not None:
+            for field in ("aliases", "merge_times", "merge_log", "accounts_dict", "record"):
+                self._undo.entry(field, account_id)
+
         # Level 4:Clear alias if recreating merged account
         if account_id in self.aliases:
             del self.aliases[account_id]
         if account_id in self.merge_times:
             del self.merge_times[account_id]
+        # Level 4: A new incarnation of a merged account, absorbed_into() stops following the old one here
+        if account_id in self.merge_log:
+            self.merge_log[account_id] += ((timestamp, None),)
         
         # Create new account, add timestamp and account balance as nested dict of account_id
-        self.accounts_dict[account_id] = {"time": timestamp, "account balance": 0}
+        self.accounts_dict[account_id] = self.storage.account(timestamp)
 
         # Level 4: store balance record
-        self.record[account_id] = [(timestamp, 0)]
+        self.record[account_id] = self.storage.history([(timestamp, 0)])
+
+        if self._dirty is not None:
+            self._dirty.account(account_id)
+            self._dirty.history(account_id, 0)
+            self._dirty.alias(account_id)
+            self._dirty.lineage(account_id)
+        if self._events is not None:
+            self._events.account_created(timestamp, account_id)
+        if self._top_cache is not None:
+            self._top_cache.account_created(account_id)
 
         return True
 
@@ -119,9 +364,15 @@ class BankingSystemImpl(BankingSystem):
         
         # level4 for aliasing - use _resolve
         account_id = self._resolve(account_id)
+        if self._settlement is not None:
+            self._settlement.settle(account_id)
 
         if account_id not in self.accounts_dict:
             return None  # Return None if there is no account_id
+        if self._cow is not None:
+            self._cow.value("accounts_dict", account_id)
+        if self._undo is not None:
+            self._undo.balance(account_id)
         self.accounts_dict[account_id]["account balance"] += amount
         # update balance record
         self._record_balance(account_id, timestamp)
@@ -152,6 +403,9 @@ class BankingSystemImpl(BankingSystem):
         # Level 4 for aliasing - use _resolve
         source_account_id = self._resolve(source_account_id)
         target_account_id = self._resolve(target_account_id)
+        if self._settlement is not None:
+            self._settlement.settle(source_account_id)
+            self._settlement.settle(target_account_id)
         #Checking if both accounts exist
         if source_account_id not in self.accounts_dict or target_account_id not in self.accounts_dict:
             return None
@@ -162,6 +416,12 @@ class BankingSystemImpl(BankingSystem):
         if self.accounts_dict[source_account_id]["account balance"] < amount:
             return None
         # Performing the transfer
+        if self._cow is not None:
+            self._cow.value("accounts_dict", source_account_id)
+            self._cow.value("accounts_dict", target_account_id)
+        if self._undo is not None:
+            self._undo.balance(source_account_id)
+            self._undo.balance(target_account_id)
         self.accounts_dict[source_account_id]["account balance"] -= amount
         self.accounts_dict[target_account_id]["account balance"] += amount
 
@@ -174,8 +434,7 @@ class BankingSystemImpl(BankingSystem):
         #######
         #Level2
         # accrue the "outgoing" from the spending from the source account
-        current_outgoing = self.outgoing.get(source_account_id, 0)
-        self.outgoing[source_account_id] = current_outgoing + amount
+        self._add_outgoing(source_account_id, timestamp, amount)
         ######
 
         #Return the new balance of the source account
@@ -188,11 +447,11 @@ class BankingSystemImpl(BankingSystem):
         
         Sort accounts by how much they spent (most first).
         If two accounts spent the same, sort by account name (A to Z).
-        Use bubble sort to do the sorting.
-        
-        Algorithm source:
-        - Bubble Sort: GeeksforGeeks. "Python Program for Bubble Sort."
-          https://www.geeksforgeeks.org/python-program-for-bubble-sort/
+
+        Only the top n are selected, with a heap of size n over
+        (-outgoing, account_id) keys: O(accounts * log n) instead of sorting
+        every account. benchmarks/bench_top_spenders.py compares it with the
+        former bubble sort.
         
         Args:
             timestamp: Current timestamp (not used in Level 2 yet)
@@ -201,36 +460,27 @@ class BankingSystemImpl(BankingSystem):
         Returns:
             List of strings for result
         """
-        # make list of all accounts and how much they spent
-        account_outgoing_list = []
-        for account_id in self.accounts_dict.keys():
-            outgoing_amount = self.outgoing.get(account_id, 0)
-            account_outgoing_list.append((account_id, outgoing_amount))
-        
-        # sort using bubble sort
-        # compare two accounts next to each other and swap if needed
-        for i in range(len(account_outgoing_list)):
-            for j in range(len(account_outgoing_list) - 1):
-                # check if first account spent less than second account
-                if account_outgoing_list[j][1] < account_outgoing_list[j + 1][1]:
-                    # swap them
-                    account_outgoing_list[j], account_outgoing_list[j + 1] = account_outgoing_list[j + 1], account_outgoing_list[j]
-                elif account_outgoing_list[j][1] == account_outgoing_list[j + 1][1]:
-                    # if they spent same amount, check account names
-                    if account_outgoing_list[j][0] > account_outgoing_list[j + 1][0]:
-                        # swap them
-                        account_outgoing_list[j], account_outgoing_list[j + 1] = account_outgoing_list[j + 1], account_outgoing_list[j]
-        
-        # get first n accounts from sorted list
-        top_n = account_outgoing_list[:n]
-        
-        # result
-        result = []
-        for account_id, amount in top_n:
-            result.append(f"{account_id}({amount})")
-        
-        return result
-    
+        ranking = self._top_cache.get(n) if self._top_cache is not None else None
+        if ranking is None:
+            outgoing = self.outgoing
+            # Smallest keys first: largest outgoing, then account name A to Z
+            keys = ((-outgoing.get(account_id, 0), account_id) for account_id in self.accounts_dict)
+            ranking = heapq.nsmallest(n, keys)
+            if self._top_cache is not None:
+                self._top_cache.put(n, ranking)
+        return [f"{account_id}({-amount})" for amount, account_id in ranking]
+
+    def top_spenders_between(self, time_from: int, time_to: int, n: int) -> list[str]:
+        """
+        Get top n accounts by money spent between time_from and time_to (both included).
+        Same order and format as top_spenders.
+
+        Every account is answered from its outgoing ledger with two binary
+        searches, raw transactions are never scanned.
+        """
+        totals = ((-self._outgoing_between(account_id, time_from, time_to), account_id) for account_id in self.accounts_dict)
+        return [f"{account_id}({-amount})" for amount, account_id in heapq.nsmallest(n, totals)]
+
 
 
     def pay(self, timestamp: int, account_id: str, amount: int) -> str | None:
@@ -255,6 +505,8 @@ class BankingSystemImpl(BankingSystem):
 
         # Level 4 for aliasing - use _resolve
         account_id = self._resolve(account_id)
+        if self._settlement is not None:
+            self._settlement.settle(account_id)
 
         # Returns None if account_id doesn't exist
         if account_id not in self.accounts_dict:
@@ -265,28 +517,31 @@ class BankingSystemImpl(BankingSystem):
             return None
         
         # Withdraw money
+        if self._cow is not None:
+            self._cow.value("accounts_dict", account_id)
+        if self._undo is not None:
+            self._undo.balance(account_id)
         self.accounts_dict[account_id]["account balance"] -= amount
 
         # update new balance record after withdrawal (level 4)
         self._record_balance(account_id, timestamp)
 
         # Keep track in outgoing for top_spenders accounting for the total amount of money withdrawn from accounts
-        if account_id not in self.outgoing:
-            self.outgoing[account_id] = 0
-        self.outgoing[account_id] += amount
+        self._add_outgoing(account_id, timestamp, amount)
 
-        # Track payment and assign payment number
-        payment = "payment" + str(self.payment_counter)
+        # Track payment and assign payment number, stored as an int and formatted only for the caller
+        payment_id = self.payment_counter
         self.payment_counter += 1
 
-        # Calculate cashback for current payment (2% round down)
-        cashback = amount * 2 // 100
-        cashback_timestamp = timestamp + 86400000
-
-        if account_id not in self.payments:
-            self.payments[account_id] = {}
+        # Calculate cashback for current payment from the account's policy (default 2% round down after 24 hours)
+        policy = self._cashback_policy(account_id)
+        cashback = policy.cashback(amount)
+        cashback_timestamp = policy.due(timestamp)
+        self._schedule_cashback(account_id, payment_id, cashback, cashback_timestamp)
 
-        self.payments[account_id][payment] = {"cashback_timestamp": cashback_timestamp, "refunded": False, "cashback": cashback}
+        payment = payment_name(payment_id)
+        if self._events is not None:
+            self._events.payment_made(timestamp, account_id, payment, amount, cashback, cashback_timestamp)
 
         return payment
     
@@ -312,17 +567,20 @@ class BankingSystemImpl(BankingSystem):
         
         # Level 4 for aliasing - use _resolve
         account_id = self._resolve(account_id)
+        if self._settlement is not None:
+            self._settlement.settle(account_id)
         
         # Return None if account_id doesn't exist
         if account_id not in self.accounts_dict:
             return None
 
-        # Return None if account has no payments or payment not found
-        if account_id not in self.payments or payment not in self.payments[account_id]:
+        # Return None if payment not found or made by another account, ids are parsed back in O(1)
+        payment_id = parse_payment(payment)
+        if payment_id is None or payment_id not in self.payment_table or self.payment_table.owner[payment_id] != account_id:
             return None
 
         # Return the status of the payment
-        if self.payments[account_id][payment]["refunded"]:
+        if self.payment_table.refunded[payment_id]:
             return "CASHBACK_RECEIVED"
         else:
             return "IN_PROGRESS"
@@ -349,6 +607,9 @@ class BankingSystemImpl(BankingSystem):
         # Level 4: Resolve accounts to handle chain merges
         account_id_1 = self._resolve(account_id_1)
         account_id_2 = self._resolve(account_id_2)
+        if self._settlement is not None:
+            self._settlement.settle(account_id_1)
+            self._settlement.settle(account_id_2)
         
         # Requirement 1: Prevent account merging into itself
         if account_id_1 == account_id_2:
@@ -358,6 +619,26 @@ class BankingSystemImpl(BankingSystem):
         if account_id_1 not in self.accounts_dict or account_id_2 not in self.accounts_dict:
             return False
         
+        # Copy what the merge rewrites if it is shared with a fork
+        if self._cow is not None:
+            for field in ("accounts_dict", "record", "outgoing_ledger", "payments"):
+                self._cow.value(field, account_id_1)
+            for field in ("outgoing", "payment_table", "account_classes", "merged_history", "merge_times", "aliases",
+                          "merge_children", "merge_log"):
+                self._cow.container(field)
+        # Log what the merge rewrites if a transaction is open
+        if self._undo is not None:
+            self._undo.balance(account_id_1)
+            for field in ("accounts_dict", "outgoing", "outgoing_ledger", "payments", "record", "merged_history", "merge_children"):
+                self._undo.entry(field, account_id_1)
+                self._undo.entry(field, account_id_2)
+            for field in ("account_classes", "merge_times", "aliases", "merge_log"):
+                self._undo.entry(field, account_id_2)
+            if account_id_1 in self.payments:
+                self._undo.tail(self.payments[account_id_1])
+            if account_id_1 in self.record:
+                self._undo.contents(self.record[account_id_1])
+
         # Add balances
         self.accounts_dict[account_id_1]["account balance"] += self.accounts_dict[account_id_2]["account balance"]
 
@@ -368,12 +649,27 @@ class BankingSystemImpl(BankingSystem):
         if account_id_2 in self.outgoing:
             del self.outgoing[account_id_2]
 
-        # Move payment to account_id_1
+        # Combine outgoing ledgers for windowed top spenders
+        ledger_2 = self.outgoing_ledger.pop(account_id_2, [])
+        if ledger_2:
+            self.outgoing_ledger[account_id_1] = self.storage.history(self._merge_ledgers(self.outgoing_ledger.get(account_id_1, []), ledger_2))
+
+        # Move payment to account_id_1, pending cashback now refunds to account_id_1
         if account_id_2 in self.payments:
             if account_id_1 not in self.payments:
-                self.payments[account_id_1] = {}
-            self.payments[account_id_1].update(self.payments[account_id_2])
+                self.payments[account_id_1] = self.storage.payment_ids()
+            for payment_id in self.payments[account_id_2]:
+                if self._undo is not None:
+                    self._undo.owner(payment_id)
+                self.payment_table.owner[payment_id] = account_id_1
+                if self._dirty is not None:
+                    self._dirty.payment(payment_id)
+            self.payments[account_id_1].extend(self.payments[account_id_2])
             del self.payments[account_id_2]
+
+        # account_id_1 keeps its own account class
+        if self.account_classes.pop(account_id_2, None) is not None and self._dirty is not None:
+            self._dirty.account_class(account_id_2)
         
         # Level 4: Merge balance records and store original histories
         if account_id_2 in self.record:
@@ -384,14 +680,13 @@ class BankingSystemImpl(BankingSystem):
                 self.merged_history[account_id_2] = self.record[account_id_2].copy()
             if account_id_1 not in self.merged_history:
                 if account_id_1 not in self.record:
-                    self.record[account_id_1] = []
+                    self.record[account_id_1] = self.storage.history()
                 self.merged_history[account_id_1] = self.record[account_id_1].copy()
             
             # Merge histories: combine account_id_2's history into account_id_1
             if account_id_1 not in self.record:
-                self.record[account_id_1] = []
-            self.record[account_id_1].extend(self.record[account_id_2])
-            self.record[account_id_1].sort()
+                self.record[account_id_1] = self.storage.history()
+            self._merge_records(account_id_1, account_id_2)
             del self.record[account_id_2]  # Remove account_id_2 from system
         
         # Level 4: Store merge timestamp for get_balance filtering
@@ -399,7 +694,29 @@ class BankingSystemImpl(BankingSystem):
         
         # Level 4: Set up alias for account_id_2 -> account_id_1 
         self.aliases[account_id_2] = account_id_1
-        
+
+        # Level 4: account_id_2 and everything merged into it become a subtree of account_id_1
+        # in the merge forest, entries are tuples and never change after the merge
+        subtree = self.merge_children.pop(account_id_2, ())
+        self.merge_children[account_id_1] = self.merge_children.get(account_id_1, ()) + ((timestamp, account_id_2, subtree),)
+        self.merge_log[account_id_2] = self.merge_log.get(account_id_2, ()) + ((timestamp, account_id_1),)
+        
+        # Mark everything the merge rewrote for incremental checkpoints
+        if self._dirty is not None:
+            for account_id in (account_id_1, account_id_2):
+                self._dirty.account(account_id)
+                self._dirty.history(account_id, 0)
+                self._dirty.outgoing(account_id)
+                self._dirty.ledger(account_id, 0)
+                self._dirty.payment_ids(account_id, 0)
+                self._dirty.merged_history(account_id)
+                self._dirty.lineage(account_id)
+            self._dirty.alias(account_id_2)
+        if self._events is not None:
+            self._events.accounts_merged(timestamp, account_id_1, account_id_2)
+        if self._top_cache is not None:
+            self._top_cache.merged(account_id_1, account_id_2, self.outgoing[account_id_1])
+
         # Record balance after merge and remove account_id_2
         self._record_balance(account_id_1, timestamp)
         del self.accounts_dict[account_id_2]
@@ -429,26 +746,248 @@ class BankingSystemImpl(BankingSystem):
             if merge_time and time_at < merge_time:
                 # Before merge: use original history
                 if original_id in self.merged_history:
-                    history = [(t, b) for t, b in self.merged_history[original_id] if t < merge_time]
+                    history = self._history_before(original_id, merge_time)
                     return self._binary_search_record(history, time_at) if history else None
         
         # Resolve merged account and check existence
         account_id = self._resolve(account_id)
+        if self._settlement is not None:
+            self._settlement.settle(account_id)
         if account_id not in self.accounts_dict or time_at < self.accounts_dict[account_id]["time"]:
             return None
         
-        # Check if account merged others before time_at
-        for merged_id, mt in self.merge_times.items():
-            if self._resolve(merged_id) == account_id and time_at < mt:
-                if account_id in self.merged_history:
-                    history = [(t, b) for t, b in self.merged_history[account_id] if t < mt]
-                    return self._binary_search_record(history, time_at) if history else None
+        # Check if account merged others before time_at, the latest merge into it decides
+        mt = self._latest_merge_into(account_id)
+        if mt is not None and time_at < mt and account_id in self.merged_history:
+            history = self._history_before(account_id, mt)
+            return self._binary_search_record(history, time_at) if history else None
 
         # Use current balance history
         return self._binary_search_record(self.record[account_id], time_at)
 
-        
+    def lineage(self, account_id: str) -> list[tuple[str, str, int]] | None:
+        """
+        Original accounts that make up account_id, as (account merged, account
+        it was merged into, merge timestamp), parents before their children.
+        Returns None if account_id doesn't exist. Time is proportional to the answer.
+        """
+        if account_id not in self.accounts_dict:
+            return None
+        result = []
+        # Reversed on the stack, so children come out in merge order
+        stack = [(child, account_id) for child in reversed(self.merge_children.get(account_id, ()))]
+        while stack:
+            (merge_time, child_id, subtree), parent = stack.pop()
+            result.append((child_id, parent, merge_time))
+            stack.extend((child, child_id) for child in reversed(subtree))
+        return result
 
-        
+    def absorbed_into(self, account_id: str, at_time: int) -> str | None:
+        """
+        Account that held account_id's funds at at_time: the end of its merge
+        chain as of at_time. Returns None if account_id wasn't merged at that
+        time (or was recreated since). Time is proportional to the chain length.
+        """
+        log = self.merge_log.get(account_id)
+        if not log:
+            return None
+        i = bisect_right(log, at_time, key=itemgetter(0)) - 1
+        if i < 0 or log[i][1] is None:
+            return None
+        since, current = log[i]
+        while True:
+            # The merge that ended the incarnation of `current` that absorbed the previous account
+            log = self.merge_log.get(current, ())
+            j = bisect_right(log, since, key=itemgetter(0))
+            if j == len(log) or log[j][0] > at_time or log[j][1] is None:
+                return current
+            since, current = log[j]
+
+    def deposit_many(self, timestamp: int, account_ids: list[str], amounts: list[int]) -> list[int | None]:
+        """
+        Bulk version of deposit for many accounts at the same timestamp.
+        Returns one result per entry, same as calling deposit for each entry in order.
+
+        Uses NumPy array operations when NumPy is installed.
+        """
+        import banking_bulk
+        return banking_bulk.deposit_many(self, timestamp, account_ids, amounts)
+
+    def pay_many(self, timestamp: int, account_ids: list[str], amounts: list[int]) -> list[str | None]:
+        """
+        Bulk version of pay for many accounts at the same timestamp.
+        Returns one result per entry, same as calling pay for each entry in order.
+
+        Uses NumPy array operations when NumPy is installed.
+        """
+        import banking_bulk
+        return banking_bulk.pay_many(self, timestamp, account_ids, amounts)
+
+    def load_accounts(self, account_ids: list[str], timestamps: list[int], balances: list[int]) -> int:
+        """
+        Bulk account provisioning: same state as create_account and deposit of
+        the opening balance per row, with the account structures built directly.
+        Returns the number of accounts created.
+        See banking_loader for loading from CSV and columnar files.
+        """
+        import banking_loader
+        return banking_loader.load_accounts(self, account_ids, timestamps, balances)
+
+    def enable_events(self):
+        """
+        Start publishing change events (AccountCreated, BalanceChanged, PaymentMade,
+        CashbackRefunded, AccountsMerged).
+        Returns the banking_events.EventBus to subscribe to.
+        """
+        if self._events is None:
+            import banking_events
+            self._events = banking_events.EventBus()
+            self._events.attach(self)
+        return self._events
+
+    def enable_top_spenders_cache(self, mode: str = "version"):
+        """
+        Cache the top_spenders ranking between changes, for callers that ask
+        for the same or a smaller n many times in a row.
+        mode "version": any transfer, pay, merge or new account drops the cache
+        mode "boundary": changes update the cached ranking in place, only a
+        merge that removes a ranked account drops it
+        Returns the banking_ranking.TopSpendersCache (hit and miss counters).
+        """
+        if self._top_cache is None or self._top_cache.mode != mode:
+            import banking_ranking
+            self._top_cache = banking_ranking.TopSpendersCache(mode)
+        return self._top_cache
+
+    def enable_background_settlement(self, start: bool = True):
+        """
+        Take cashback refunds off the request path: calls defer the refunds
+        that became due to a worker thread and only settle the accounts they
+        touch. Results stay exactly the same, every refund keeps the
+        timestamp of the call that found it due.
+        start=False leaves the thread off, e.g. to call drain() from an asyncio task.
+        Refunds are processed inline again while the system is forked or a
+        transaction is open; fork(), begin() and snapshots settle everything first.
+        Returns the banking_settlement.SettlementWorker.
+        """
+        if self._settlement is None:
+            import banking_settlement
+            self._settlement = banking_settlement.SettlementWorker(self)
+        if start:
+            self._settlement.start()
+        return self._settlement
+
+    def enable_tracing(self, sample_rate: float = 1.0, threshold: float = 0.001, capacity: int = 256):
+        """
+        Time every operation call (or every 1/sample_rate-th one) with its
+        sub-phases: cashback sweep, alias resolution, merge-history scan,
+        binary search and history sort. Calls slower than `threshold` seconds
+        are kept with their arguments, the last `capacity` of them.
+        Returns the banking_tracing.Tracer (slowest(n), dump(n), latency percentiles).
+        """
+        if self._tracer is None:
+            import banking_tracing
+            self._tracer = banking_tracing.Tracer(sample_rate, threshold, capacity)
+            self._tracer.attach(self)
+        return self._tracer
+
+    @classmethod
+    def from_snapshot(cls, path: str) -> "BankingSystemImpl":
+        """
+        Build a system from a file written by save_snapshot() instead of
+        replaying its history, e.g. for short-lived CLI processes.
+        """
+        import banking_checkpoint
+        return banking_checkpoint.load_snapshot(path, cls)
 
+    def save_snapshot(self, path: str):
+        """Write the full state to `path` for from_snapshot()"""
+        import banking_checkpoint
+        banking_checkpoint.save_snapshot(self, path)
+
+    def fork(self) -> "BankingSystemImpl":
+        """
+        Independent copy of the system for what-if simulation, created in O(1).
+        Both systems share their state and copy only what they write to, on the
+        first write after the fork (containers shallow, values per account).
+        """
+        if self._undo is not None:
+            raise RuntimeError("cannot fork while a transaction is open")
+        if self._settlement is not None:
+            self._settlement.settle_all()
+        import banking_fork
+        return banking_fork.fork(self)
+
+    def begin(self):
+        """
+        Open a transaction, or a savepoint inside the open one.
+        Changes after begin() are kept by commit() or reverted by rollback(),
+        change events are only published once the outermost transaction commits.
+        Needs an in-memory storage backend.
+        """
+        if not self.storage.in_memory:
+            raise ValueError(f"transactions need in-memory storage, not {self.storage.name!r}")
+        if self._undo is None:
+            if self._settlement is not None:
+                self._settlement.settle_all()
+            import banking_transaction
+            self._undo = banking_transaction.UndoLog(self)
+        self._undo.begin()
+
+    def commit(self):
+        """Keep the changes since the last begin()"""
+        if self._undo is None:
+            raise RuntimeError("no open transaction")
+        if self._undo.commit():
+            self._undo = None
+
+    def rollback(self):
+        """
+        Revert every change since the last begin(), including cashback refunded
+        and payment ids handed out in between. Costs O(changes made), not O(state).
+        """
+        if self._undo is None:
+            raise RuntimeError("no open transaction")
+        if self._undo.rollback():
+            self._undo = None
+        if self._top_cache is not None:
+            self._top_cache.invalidate()
+
+    def register_cashback_policy(self, account_class: str, policy: CashbackPolicy):
+        """
+        Add or replace the cashback policy of an account class.
+        Applies to payments made after the call, scheduled cashback keeps its rate and due time.
+        """
+        if self._cow is not None:
+            self._cow.container("cashback_policies")
+        if self._undo is not None:
+            self._undo.entry("cashback_policies", account_class)
+        self.cashback_policies[account_class] = policy
+        if self._dirty is not None:
+            self._dirty.policies()
+
+    def set_account_class(self, account_id: str, account_class: str) -> bool:
+        """
+        Put account_id in account_class, which selects its cashback policy.
+        Returns False if the account doesn't exist.
+        Raises ValueError for a class without a registered policy.
+        """
+        if account_class not in self.cashback_policies:
+            raise ValueError(f"no cashback policy registered for account class {account_class!r}")
+        if self._is_merged_account(account_id):
+            return False
+        account_id = self._resolve(account_id)
+        if account_id not in self.accounts_dict:
+            return False
 
+        if self._cow is not None:
+            self._cow.container("account_classes")
+        if self._undo is not None:
+            self._undo.entry("account_classes", account_id)
+        if account_class == DEFAULT_CLASS:
+            self.account_classes.pop(account_id, None)
+        else:
+            self.account_classes[account_id] = account_class
+        if self._dirty is not None:
+            self._dirty.account_class(account_id)
+        return True
@@ -0,0 +1,200 @@
+import collections
+import os
+from urllib.parse import quote, unquote
+
+from banking_checkpoint import dump_snapshot, load_snapshot, loads_snapshot
+from banking_memory import deep_size
+from banking_system_impl import BankingSystemImpl
+
+
+SNAPSHOT_SUFFIX = ".snapshot"
+
+# Where a tenant is, see TenantManager.location()
+RESIDENT = "resident"  # a live BankingSystemImpl
+COMPACT = "compact"  # snapshot bytes in memory
+ON_DISK = "disk"  # snapshot file in the manager's directory
+
+
+def _close(system: BankingSystemImpl, tenant_id: str):
+    """Make every public method of an evicted system raise, on the instance only"""
+    def closed(*args, **kwargs):
+        raise RuntimeError(f"tenant {tenant_id!r} was evicted, get it from the TenantManager again")
+
+    for name in dir(type(system)):
+        if not name.startswith("_") and callable(getattr(type(system), name)):
+            setattr(system, name, closed)
+
+
+class TenantManager:
+    """
+    Hosts many independent BankingSystemImpl ledgers (tenants) in one process.
+
+    - A new tenant is a fork of one empty template system, so an empty
+      tenant shares every container with the template and owns only the
+      containers it writes to (see banking_fork).
+    - At most `max_resident` tenants stay live. The least recently used
+      ones are evicted: a tenant that never changed is dropped, a snapshot
+      of up to `compact_limit` bytes is kept in memory in the compact store
+      shared by all tenants, a larger one is written to `directory`.
+      The next get() of an evicted tenant loads it again.
+    - Live tenants and the compact store together stay under `memory_quota`
+      bytes: least recently used tenants are evicted first, then the oldest
+      compact snapshots are moved to disk.
+    - memory() and memory_report() give the bytes a tenant uses on its own,
+      without what it shares with the template.
+
+    With a quota, a live tenant's size is measured when it is created or
+    loaded and again when another tenant is accessed (O(its size)), so the
+    quota is checked against sizes from each tenant's last use. Without
+    one, live tenants are only measured by memory() and memory_report().
+    Tenants with an open transaction are never evicted. Event buses, caches
+    and checkpointers attached to a tenant are not part of its snapshot and
+    don't survive eviction. An evicted system is closed: its settlement
+    worker is stopped and every public method raises RuntimeError, so
+    writes through a reference kept from before the eviction can't be lost.
+    """
+
+    def __init__(self, directory: str, max_resident: int = 1000, memory_quota: int | None = None,
+                 compact_limit: int = 64 * 1024, storage=None):
+        self.directory = directory
+        self.max_resident = max_resident
+        self.memory_quota = memory_quota
+        self.compact_limit = compact_limit
+        os.makedirs(directory, exist_ok=True)
+
+        self._template = BankingSystemImpl(storage=storage)
+        self._template_objects = set()  # ids of everything tenants share with the template
+        deep_size(self._template, self._template_objects)
+        self._resident = collections.OrderedDict()  # tenant_id -> system, least recently used first
+        self._compact = collections.OrderedDict()  # tenant_id -> snapshot bytes, oldest first
+        self._sizes = {}  # tenant_id -> bytes, compact tenants and measured live tenants
+        self.memory_bytes = 0  # sum of _sizes
+        self.loads = 0
+        self.evictions = 0
+
+    def _path(self, tenant_id: str) -> str:
+        return os.path.join(self.directory, quote(tenant_id, safe="") + SNAPSHOT_SUFFIX)
+
+    def _set_size(self, tenant_id: str, size: int):
+        self.memory_bytes += size - self._sizes.get(tenant_id, 0)
+        self._sizes[tenant_id] = size
+
+    def _measure(self, tenant_id: str):
+        self._set_size(tenant_id, deep_size(self._resident[tenant_id], set(self._template_objects)))
+
+    def get(self, tenant_id: str) -> BankingSystemImpl:
+        """
+        The tenant's system: live, loaded from its snapshot, or a new empty one.
+        Valid until the tenant is evicted (by a later get() or evict()), call
+        get() again instead of keeping it.
+        """
+        if self.memory_quota is not None and self._resident:
+            # The most recent tenant is the one that may have grown since it was measured
+            previous = next(reversed(self._resident))
+            if previous != tenant_id:
+                self._measure(previous)
+
+        system = self._resident.get(tenant_id)
+        if system is not None:
+            self._resident.move_to_end(tenant_id)
+        else:
+            path = self._path(tenant_id)
+            if tenant_id in self._compact:
+                system = loads_snapshot(self._compact.pop(tenant_id))
+                self.loads += 1
+            elif os.path.exists(path):
+                system = load_snapshot(path)
+                os.remove(path)
+                self.loads += 1
+            else:
+                system = self._template.fork()
+            self._resident[tenant_id] = system
+            if self.memory_quota is not None:
+                self._measure(tenant_id)
+        self._enforce_limits(tenant_id)
+        return system
+
+    def _over_limits(self) -> bool:
+        if len(self._resident) > self.max_resident:
+            return True
+        return self.memory_quota is not None and self.memory_bytes > self.memory_quota
+
+    def _enforce_limits(self, keep: str):
+        """Evict least recently used tenants until both limits hold, `keep` stays live"""
+        if not self._over_limits():
+            return
+        for tenant_id in list(self._resident):
+            if tenant_id != keep:
+                self.evict(tenant_id)
+            if not self._over_limits():
+                return
+        # Still over the quota with only `keep` (and pinned tenants) live
+        while self._compact and self._over_limits():
+            self._spill(next(iter(self._compact)))
+
+    def _spill(self, tenant_id: str):
+        """Move a compact snapshot to disk"""
+        data = self._compact.pop(tenant_id)
+        path = self._path(tenant_id)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        self.memory_bytes -= self._sizes.pop(tenant_id)
+
+    def evict(self, tenant_id: str) -> bool:
+        """
+        Move a live tenant to the compact store or to disk, see the class
+        docstring. Returns False if the tenant isn't live or has an open transaction.
+        """
+        system = self._resident.get(tenant_id)
+        if system is None or system._undo is not None:
+            return False
+        del self._resident[tenant_id]
+        self.memory_bytes -= self._sizes.pop(tenant_id, 0)
+        self.evictions += 1
+        if system._settlement is not None:
+            # Joins the thread and applies the deferred refunds before the snapshot
+            system._settlement.stop()
+        # Every call copies the timer wheel to advance it, even read-only ones. A refund
+        # or a new payment also writes the payment table, so the wheel alone changes nothing
+        written = system._cow is None or system._cow.containers - {"_cashback_wheel"}
+        data = dump_snapshot(system) if written else None
+        _close(system, tenant_id)
+        if not written:
+            return True  # never written, its next get() forks the template again
+        self._compact[tenant_id] = data
+        self._set_size(tenant_id, len(data))
+        if len(data) > self.compact_limit:
+            self._spill(tenant_id)
+        return True
+
+    def location(self, tenant_id: str) -> str | None:
+        """RESIDENT, COMPACT or ON_DISK, None for an unknown tenant"""
+        if tenant_id in self._resident:
+            return RESIDENT
+        if tenant_id in self._compact:
+            return COMPACT
+        if os.path.exists(self._path(tenant_id)):
+            return ON_DISK
+        return None
+
+    def memory(self, tenant_id: str) -> int:
+        """Bytes a tenant uses in memory: measured now if live, the snapshot size if compact, else 0"""
+        if tenant_id in self._resident:
+            self._measure(tenant_id)
+        return self._sizes.get(tenant_id, 0)
+
+    def memory_report(self) -> dict[str, int]:
+        """Bytes per live or compact tenant, live tenants measured now"""
+        for tenant_id in self._resident:
+            self._measure(tenant_id)
+        return dict(self._sizes)
+
+    def tenant_ids(self) -> list[str]:
+        """Every known tenant (evicted tenants that never changed are forgotten)"""
+        on_disk = [unquote(name[:-len(SNAPSHOT_SUFFIX)]) for name in os.listdir(self.directory)
+                   if name.endswith(SNAPSHOT_SUFFIX)]
+        return sorted(set(self._resident) | set(self._compact) | set(on_disk))
+
+    def __len__(self) -> int:
+        return len(self.tenant_ids())
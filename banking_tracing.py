@@ -0,0 +1,152 @@
+import collections
+import heapq
+import time
+from dataclasses import dataclass
+
+from banking_replay import OPERATIONS
+
+
+# Sub-phases timed inside a traced call: method of BankingSystemImpl -> phase
+PHASES = {
+    "_process_cashback": "cashback sweep",
+    "_resolve": "alias resolution",
+    "_latest_merge_into": "merge-history scan",
+    "_history_before": "merge-history scan",
+    "_binary_search_record": "binary search",
+    "_merge_records": "history sort",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Span:
+    """One traced call slower than the tracer's threshold"""
+    operation: str
+    args: tuple
+    duration: float  # seconds
+    phases: dict[str, float]  # phase -> seconds spent in it, phases that didn't run are missing
+
+    def __str__(self) -> str:
+        phases = ", ".join(f"{phase} {1e3 * seconds:.3f} ms" for phase, seconds in
+                           sorted(self.phases.items(), key=lambda item: -item[1]))
+        return f"{self.operation}{self.args!r} {1e3 * self.duration:.3f} ms" + (f" ({phases})" if phases else "")
+
+
+class Tracer:
+    """
+    Latency tracer of one BankingSystemImpl, see enable_tracing().
+
+    attach() replaces the operations by timing wrappers on the instance,
+    so a system without tracer runs the plain methods. One call in
+    `sample_every` is traced: the phase methods in PHASES are wrapped too
+    while it runs, so calls that aren't traced only pay for the
+    operation wrapper. A traced call's duration goes
+    into a per-operation histogram with power of two buckets, and if it
+    took longer than `threshold` seconds it is kept as a Span with its
+    arguments and the time of every phase. The last `capacity` slow calls
+    are kept. Phase times include the phases they call, calls other
+    operations make (bulk methods) count as part of the outer call.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, threshold: float = 0.001, capacity: int = 256):
+        if not 0 < sample_rate <= 1:
+            raise ValueError("sample_rate must be in (0, 1]")
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.sample_every = round(1 / sample_rate)
+        self.threshold = threshold
+        self.slow = collections.deque(maxlen=capacity)  # ring buffer of slow Spans, oldest first
+        self.histograms = {name: collections.Counter() for name in OPERATIONS}  # bucket -> traced calls
+        self.calls = 0  # operation calls seen, traced or not
+        self._phases = None  # phase -> ns of the call being traced
+        self._timed = {}  # phase method -> its timing wrapper
+
+    def attach(self, system):
+        self._timed = {method: self._phase(phase, getattr(system, method)) for method, phase in PHASES.items()}
+        for name in OPERATIONS:
+            setattr(system, name, self._operation(name, getattr(system, name), system.__dict__))
+
+    def detach(self, system):
+        """Back to the plain methods, enable_tracing() starts a new tracer afterwards"""
+        for name in (*OPERATIONS, *PHASES):
+            system.__dict__.pop(name, None)
+        system._tracer = None
+        if system._events is not None:
+            # Its wrappers went with the tracer's
+            system._events.attach(system)
+
+    def _operation(self, name: str, method, namespace: dict):
+        histogram = self.histograms[name]
+        timed = self._timed
+        threshold_ns = self.threshold * 1e9
+
+        def traced(*args):
+            if self._phases is not None:
+                return method(*args)
+            self.calls += 1
+            if self.calls % self.sample_every:
+                return method(*args)
+            phases = self._phases = {}
+            namespace.update(timed)
+            start = time.perf_counter_ns()
+            try:
+                return method(*args)
+            finally:
+                duration = time.perf_counter_ns() - start
+                for phase_method in timed:
+                    del namespace[phase_method]
+                self._phases = None
+                # Bucket b holds durations of 2**(b-1) to 2**b - 1 ns
+                histogram[duration.bit_length()] += 1
+                if duration > threshold_ns:
+                    self.slow.append(Span(name, args, duration / 1e9,
+                                          {phase: ns / 1e9 for phase, ns in phases.items()}))
+        return traced
+
+    def _phase(self, phase: str, method):
+        def timed(*args):
+            phases = self._phases
+            start = time.perf_counter_ns()
+            try:
+                return method(*args)
+            finally:
+                phases[phase] = phases.get(phase, 0) + time.perf_counter_ns() - start
+        return timed
+
+    def slowest(self, n: int) -> list[Span]:
+        """The n slowest calls in the ring buffer, slowest first"""
+        return heapq.nlargest(n, self.slow, key=lambda span: span.duration)
+
+    def dump(self, n: int = 10) -> str:
+        """The n slowest calls, one line each"""
+        return "\n".join(str(span) for span in self.slowest(n))
+
+    def percentile(self, operation: str, q: float) -> float | None:
+        """
+        Upper bound in seconds of the q-th percentile (0-100) of the traced
+        calls of `operation`, within a factor of two. None before the first traced call.
+        """
+        histogram = self.histograms[operation]
+        rank = q / 100 * sum(histogram.values())
+        seen = 0
+        for bucket in sorted(histogram):
+            seen += histogram[bucket]
+            if seen >= rank:
+                return 2 ** bucket / 1e9
+        return None
+
+    def within(self, operation: str, seconds: float) -> float | None:
+        """
+        Share of the traced calls of `operation` that were certainly faster
+        than `seconds` (whole buckets below it), for SLO checks. None before the first traced call.
+        """
+        histogram = self.histograms[operation]
+        total = sum(histogram.values())
+        if not total:
+            return None
+        return sum(count for bucket, count in histogram.items() if 2 ** bucket <= seconds * 1e9) / total
+
+    def summary(self) -> dict[str, dict]:
+        """Traced calls, p50, p99 and p99.9 in seconds per operation that was traced"""
+        return {name: {"calls": sum(histogram.values()), "p50": self.percentile(name, 50),
+                       "p99": self.percentile(name, 99), "p99.9": self.percentile(name, 99.9)}
+                for name, histogram in self.histograms.items() if histogram}
@@ -0,0 +1,136 @@
+from banking_system_impl import BankingSystemImpl
+
+
+MISSING = object()  # marks a dict key that didn't exist before the change
+
+
+class UndoLog:
+    """
+    Undo log of the open transaction (and its nested savepoints) of one
+    BankingSystemImpl. BankingSystemImpl calls the hook methods while
+    `system._undo` is set, right before it changes state, and every entry
+    stores just enough to revert that change. Rolling back applies the
+    entries in reverse, so its cost follows the work done in the
+    transaction, not the size of the state.
+    """
+
+    def __init__(self, system: BankingSystemImpl):
+        self.system = system
+        self._entries = []
+        self._savepoints = []  # (entries length, payment_counter, held events) per begin()
+
+    @property
+    def depth(self) -> int:
+        return len(self._savepoints)
+
+    def begin(self):
+        events = self.system._events
+        if events is not None:
+            events.hold()
+        held = events.held if events is not None else 0
+        self._savepoints.append((len(self._entries), self.system.payment_counter, held))
+
+    def commit(self) -> bool:
+        """
+        Keep the changes since the last begin().
+        Returns True once the outermost transaction is closed.
+        """
+        self._savepoints.pop()
+        if self._savepoints:
+            # The outer transaction can still roll these changes back
+            return False
+        self._entries.clear()
+        if self.system._events is not None:
+            self.system._events.release()
+        return True
+
+    def rollback(self) -> bool:
+        """
+        Revert the changes since the last begin().
+        Returns True once the outermost transaction is closed.
+        """
+        start, payment_counter, held = self._savepoints.pop()
+        system = self.system
+        table = system.payment_table
+        unrefunded = set()
+
+        for entry in reversed(self._entries[start:]):
+            kind = entry[0]
+            if kind == "entry":
+                _, field, key, value = entry
+                container = getattr(system, field)
+                if value is MISSING:
+                    container.pop(key, None)
+                else:
+                    container[key] = value
+            elif kind == "balance":
+                entry[1]["account balance"] = entry[2]
+            elif kind == "tail":
+                _, items, length, last = entry
+                del items[length:]
+                if length:
+                    items[length - 1] = last
+            elif kind == "contents":
+                entry[1][:] = entry[2]
+            elif kind == "owner":
+                table.owner[entry[1]] = entry[2]
+            elif kind == "refund":
+                table.refunded[entry[1]] = False
+                unrefunded.add(entry[1])
+            elif kind == "scheduled":
+                # Rescheduled by a rolled back savepoint: cancelled if still waiting,
+                # due again below if the payment existed before this savepoint
+                _, payment_id, handle = entry
+                if payment_id not in unrefunded:
+                    system._cashback_wheel.cancel(handle)
+                unrefunded.add(payment_id)
+            elif kind == "payment":
+                _, payment_id, handle = entry
+                table.remove(payment_id)
+                if payment_id not in unrefunded:
+                    # Still waiting on the wheel
+                    system._cashback_wheel.cancel(handle)
+        del self._entries[start:]
+        system.payment_counter = payment_counter
+
+        # Refunds of payments made before the transaction are due again, in payment order
+        for payment_id in sorted(unrefunded):
+            if payment_id in table:
+                handle = system._cashback_wheel.add(table.due[payment_id], payment_id)
+                if self._savepoints:
+                    # The enclosing transaction must cancel this handle when it rolls back
+                    self._entries.append(("scheduled", payment_id, handle))
+
+        events = system._events
+        if events is not None:
+            events.drop_held(held)
+            if not self._savepoints:
+                events.release()
+        return not self._savepoints
+
+    # Hooks called by BankingSystemImpl
+    def entry(self, field: str, key):
+        """Key `key` of the state dict `field` is set or deleted"""
+        self._entries.append(("entry", field, key, getattr(self.system, field).get(key, MISSING)))
+
+    def balance(self, account_id: str):
+        account = self.system.accounts_dict[account_id]
+        self._entries.append(("balance", account, account["account balance"]))
+
+    def tail(self, items):
+        """`items` (list or array) gets appended to or its last item replaced"""
+        self._entries.append(("tail", items, len(items), items[-1] if len(items) else None))
+
+    def contents(self, items: list):
+        """`items` is rewritten in place, e.g. sorted"""
+        self._entries.append(("contents", items, items[:]))
+
+    def owner(self, payment_id: int):
+        self._entries.append(("owner", payment_id, self.system.payment_table.owner[payment_id]))
+
+    def refund(self, payment_id: int):
+        self._entries.append(("refund", payment_id))
+
+    def payment(self, payment_id: int, handle: int):
+        """New payment `payment_id`, scheduled on the timer wheel as `handle`"""
+        self._entries.append(("payment", payment_id, handle))
@@ -0,0 +1,210 @@
+import struct
+import sys
+from array import array
+
+from banking_cashback import parse_payment, payment_name
+from banking_replay import OPERATIONS
+
+
+# Binary frames for a network service in front of a BankingSystem.
+# A frame carries a batch of operations in the (method name, *arguments)
+# format of banking_replay, little-endian:
+#
+#   header   magic "BW", version, pad, operation count n, new names, names size
+#   names    names size bytes of u16 length + UTF-8 account id, one per new handle,
+#            zero padded to a multiple of 8
+#   columns  timestamp q[n], value q[n], account handle I[n], second handle I[n], opcode B[n]
+#
+# Account ids are sent once per session: the encoder gives every new id the
+# next handle and puts it in the names block of the frame that first uses it,
+# the decoder appends it to its table. Frames of a session must be decoded in
+# the order they were encoded. The value column holds the amount, n of
+# top_spenders, time_at of get_balance, or the number N of a 'paymentN'
+# (0 for any other payment string, which no engine knows either).
+MAGIC = b"BW"
+VERSION = 1
+HEADER = struct.Struct("<2sBxIII")
+NAME_LENGTH = struct.Struct("<H")
+# Bytes per operation in the columns
+OPERATION_SIZE = 8 + 8 + 4 + 4 + 1
+
+OPCODES = {name: code for code, name in enumerate(OPERATIONS, 1)}
+CREATE_ACCOUNT, DEPOSIT, TRANSFER, TOP_SPENDERS, PAY, GET_PAYMENT_STATUS, MERGE_ACCOUNTS, GET_BALANCE = range(1, 9)
+# Arguments after the timestamp: a = account handle, b = second handle, v = value, p = payment number
+ARGUMENTS = {"create_account": "a", "deposit": "av", "transfer": "abv", "top_spenders": "v", "pay": "av",
+             "get_payment_status": "ap", "merge_accounts": "ab", "get_balance": "av"}
+
+
+def _padding(size: int) -> int:
+    return -size % 8
+
+
+def frame_length(header: bytes | memoryview) -> int:
+    """Total length of the frame that starts with `header` (at least HEADER.size bytes)"""
+    _, _, count, _, names_size = HEADER.unpack_from(header)
+    return HEADER.size + names_size + _padding(names_size) + count * OPERATION_SIZE
+
+
+def _column(view: memoryview, offset: int, typecode: str, count: int):
+    """Zero-copy view of a column, a converted copy on big-endian machines"""
+    size = array(typecode).itemsize * count
+    if sys.byteorder == "little":
+        return view[offset:offset + size].cast(typecode)
+    column = array(typecode, view[offset:offset + size])
+    column.byteswap()
+    return column
+
+
+class FrameEncoder:
+    """Encodes batches of operations into frames, one encoder per session"""
+
+    def __init__(self):
+        self.handles = {}  # account_id -> handle
+
+    def _handle(self, account_id: str, added: dict[str, int], names: list[bytes]) -> int:
+        handle = self.handles.get(account_id)
+        if handle is None:
+            handle = added.get(account_id)
+        if handle is None:
+            name = account_id.encode("utf-8")
+            if len(name) > 0xFFFF:
+                raise ValueError(f"account id of {len(name)} bytes is too long")
+            handle = added[account_id] = len(self.handles) + len(added)
+            names.append(NAME_LENGTH.pack(len(name)) + name)
+        return handle
+
+    def encode(self, operations: list[tuple]) -> bytes:
+        """
+        One frame with all `operations`. New account handles are only kept
+        once the frame is built, an operation that can't be encoded leaves
+        the session as it was.
+        """
+        count = len(operations)
+        timestamps = array("q", bytes(8 * count))
+        values = array("q", bytes(8 * count))
+        first = array("I", bytes(4 * count))
+        second = array("I", bytes(4 * count))
+        opcodes = bytearray(count)
+        added = {}  # account_id -> handle of the accounts this frame introduces
+        names = []
+
+        for index, op in enumerate(operations):
+            name, timestamp, *args = op
+            code = OPCODES.get(name)
+            if code is None:
+                raise ValueError(f"unknown operation {name!r}")
+            opcodes[index] = code
+            timestamps[index] = timestamp
+            for kind, value in zip(ARGUMENTS[name], args):
+                if kind == "a":
+                    first[index] = self._handle(value, added, names)
+                elif kind == "b":
+                    second[index] = self._handle(value, added, names)
+                elif kind == "p":
+                    values[index] = parse_payment(value) or 0
+                else:
+                    values[index] = value
+
+        names_block = b"".join(names)
+        parts = [HEADER.pack(MAGIC, VERSION, count, len(names), len(names_block)),
+                 names_block, bytes(_padding(len(names_block)))]
+        for column in (timestamps, values, first, second):
+            if sys.byteorder != "little":
+                column.byteswap()
+            parts.append(column.tobytes())
+        parts.append(opcodes)
+        self.handles.update(added)
+        return b"".join(parts)
+
+
+class FrameDecoder:
+    """
+    Decodes frames of one session. dispatch() runs a frame on an engine
+    straight from the buffer, decode() turns it back into operations.
+    """
+
+    def __init__(self):
+        self.names = []  # handle -> account_id
+
+    def _read(self, buffer) -> tuple:
+        """Reads the header and names, returns the columns of the frame"""
+        view = memoryview(buffer)
+        if len(view) < HEADER.size:
+            raise ValueError("incomplete frame header")
+        magic, version, count, new_names, names_size = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a version {VERSION} frame")
+        if len(view) < frame_length(view):
+            raise ValueError("incomplete frame")
+
+        offset = HEADER.size
+        names = self.names
+        for _ in range(new_names):
+            (length,) = NAME_LENGTH.unpack_from(view, offset)
+            offset += NAME_LENGTH.size
+            # Interned like the engine's own ids, so dict lookups compare by identity
+            names.append(sys.intern(str(view[offset:offset + length], "utf-8")))
+            offset += length
+        offset += _padding(names_size)
+
+        timestamps = _column(view, offset, "q", count)
+        values = _column(view, offset + 8 * count, "q", count)
+        first = _column(view, offset + 16 * count, "I", count)
+        second = _column(view, offset + 20 * count, "I", count)
+        opcodes = view[offset + 24 * count:offset + 25 * count]
+        return count, timestamps, values, first, second, opcodes
+
+    def dispatch(self, system, buffer) -> list:
+        """
+        Run every operation of the frame in `buffer` (bytes, bytearray or a
+        memoryview of a receive buffer) on `system`, returns their results.
+        Arguments are read from the columns per call, no operation tuples are built.
+        """
+        count, timestamps, values, first, second, opcodes = self._read(buffer)
+        names = self.names
+        deposit, transfer, pay = system.deposit, system.transfer, system.pay
+        results = []
+        append = results.append
+        for index in range(count):
+            code = opcodes[index]
+            if code == DEPOSIT:
+                append(deposit(timestamps[index], names[first[index]], values[index]))
+            elif code == TRANSFER:
+                append(transfer(timestamps[index], names[first[index]], names[second[index]], values[index]))
+            elif code == PAY:
+                append(pay(timestamps[index], names[first[index]], values[index]))
+            elif code == GET_BALANCE:
+                append(system.get_balance(timestamps[index], names[first[index]], values[index]))
+            elif code == GET_PAYMENT_STATUS:
+                append(system.get_payment_status(timestamps[index], names[first[index]], payment_name(values[index])))
+            elif code == CREATE_ACCOUNT:
+                append(system.create_account(timestamps[index], names[first[index]]))
+            elif code == TOP_SPENDERS:
+                append(system.top_spenders(timestamps[index], values[index]))
+            elif code == MERGE_ACCOUNTS:
+                append(system.merge_accounts(timestamps[index], names[first[index]], names[second[index]]))
+            else:
+                raise ValueError(f"unknown opcode {code}")
+        return results
+
+    def decode(self, buffer) -> list[tuple]:
+        """The operations of the frame in `buffer`"""
+        count, timestamps, values, first, second, opcodes = self._read(buffer)
+        operations = []
+        for index in range(count):
+            code = opcodes[index]
+            if not 0 < code <= len(OPERATIONS):
+                raise ValueError(f"unknown opcode {code}")
+            name = OPERATIONS[code - 1]
+            args = []
+            for kind in ARGUMENTS[name]:
+                if kind == "a":
+                    args.append(self.names[first[index]])
+                elif kind == "b":
+                    args.append(self.names[second[index]])
+                elif kind == "p":
+                    args.append(payment_name(values[index]))
+                else:
+                    args.append(values[index])
+            operations.append((name, timestamps[index], *args))
+        return operations
@@ -0,0 +1,280 @@
+import bisect
+import gzip
+import json
+import random
+from dataclasses import asdict, dataclass, field
+
+from banking_cashback import DEFAULT_POLICY
+from banking_replay import replay
+from banking_system_impl import BankingSystemImpl
+
+
+# Operation mix of the steady phase, relative weights
+DEFAULT_MIX = {
+    "deposit": 30,
+    "transfer": 20,
+    "pay": 20,
+    "get_payment_status": 8,
+    "get_balance": 15,
+    "top_spenders": 2,
+    "create_account": 4,
+    "merge_accounts": 1,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class WorkloadConfig:
+    """
+    Shape of a generated workload. The same config always gives the same operations.
+    - skew: Zipf exponent of account popularity, 0 is uniform
+    - mix: operation weights of the steady phase
+    - cashback_phases / merge_storms: share of phases that are payment bursts
+      followed by a jump past the cashback delay, or bursts of merges
+    - long_range: share of get_balance queries anywhere in the past instead of the last hour
+    """
+
+    seed: int = 0
+    operations: int = 10000
+    accounts: int = 1000
+    skew: float = 1.1
+    mix: dict = field(default_factory=lambda: dict(DEFAULT_MIX))
+    phase_length: int = 500
+    cashback_phases: float = 0.1
+    merge_storms: float = 0.05
+    long_range: float = 0.3
+
+
+class _Zipf:
+    """Draws from a population with Zipfian popularity, ranks shuffled by the seed"""
+
+    def __init__(self, rng: random.Random, population: list, skew: float):
+        self.rng = rng
+        self.population = population[:]
+        rng.shuffle(self.population)
+        self.cumulative = []
+        total = 0.0
+        for rank in range(1, len(population) + 1):
+            total += rank ** -skew
+            self.cumulative.append(total)
+
+    def draw(self):
+        index = bisect.bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])
+        return self.population[min(index, len(self.population) - 1)]
+
+
+class _Generator:
+    """Keeps a rough model of the system (live accounts, issued payments) to emit mostly valid operations"""
+
+    HOUR = 3600000
+
+    def __init__(self, config: WorkloadConfig):
+        if config.accounts < 2:
+            raise ValueError("a workload needs at least 2 accounts")
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.ids = [f"account{i}" for i in range(config.accounts)]
+        self.zipf = _Zipf(self.rng, self.ids, config.skew)
+        self.live = set()
+        self.merged = []
+        self.payments = []  # (payment number, payer) of pay operations, assuming they succeed
+        self.timestamp = 0
+        self.operations = []
+
+    def emit(self, name: str, *args, step: int | None = None):
+        self.timestamp += step if step is not None else self.rng.choice((1, 1, 10, 100, 1000))
+        self.operations.append((name, self.timestamp, *args))
+
+    def account(self) -> str:
+        return self.zipf.draw()
+
+    def other(self, account_id: str) -> str:
+        while (other := self.account()) == account_id:
+            pass
+        return other
+
+    def past(self) -> int:
+        if self.rng.random() < self.config.long_range:
+            return self.rng.randint(1, self.timestamp)
+        return self.rng.randint(max(1, self.timestamp - self.HOUR), self.timestamp)
+
+    def setup(self):
+        for account_id in self.ids:
+            self.emit("create_account", account_id, step=1)
+            self.live.add(account_id)
+        for account_id in self.ids:
+            self.emit("deposit", account_id, self.rng.randint(10000, 100000), step=1)
+
+    def operation(self, name: str):
+        rng = self.rng
+        if name == "deposit":
+            self.emit(name, self.account(), rng.randint(1, 5000))
+        elif name == "transfer":
+            source = self.account()
+            self.emit(name, source, self.other(source), rng.randint(1, 2000))
+        elif name == "pay":
+            account_id = self.account()
+            self.payments.append((len(self.payments) + 1, account_id))
+            self.emit(name, account_id, rng.randint(1, 1000))
+        elif name == "get_payment_status":
+            if not self.payments:
+                return self.operation("pay")
+            number, account_id = rng.choice(self.payments[-1000:])
+            self.emit(name, account_id, f"payment{number}")
+        elif name == "get_balance":
+            account_id = rng.choice(self.merged) if self.merged and rng.random() < 0.1 else self.account()
+            self.emit(name, account_id, self.past())
+        elif name == "top_spenders":
+            self.emit(name, rng.randint(1, 20))
+        elif name == "create_account":
+            # Mostly recreating merged accounts, otherwise a duplicate that fails
+            account_id = self.merged.pop(rng.randrange(len(self.merged))) if self.merged else self.account()
+            self.live.add(account_id)
+            self.emit(name, account_id)
+        elif name == "merge_accounts":
+            if len(self.live) < 2:
+                return self.operation("create_account")
+            account_id_1 = self.account()
+            account_id_2 = self.other(account_id_1)
+            if account_id_1 in self.live and account_id_2 in self.live:
+                self.live.discard(account_id_2)
+                self.merged.append(account_id_2)
+            self.emit(name, account_id_1, account_id_2)
+
+    def phase(self, kind: str, length: int):
+        names, weights = zip(*self.config.mix.items())
+        for _ in range(length):
+            if kind == "cashback":
+                self.operation("pay" if self.rng.random() < 0.8 else "get_payment_status")
+            elif kind == "merge_storm":
+                self.operation(self.rng.choices(("merge_accounts", "create_account", "get_balance"), (6, 2, 2))[0])
+            else:
+                self.operation(self.rng.choices(names, weights)[0])
+        if kind == "cashback":
+            # Idle until all cashback of the burst is due at once
+            self.timestamp += DEFAULT_POLICY.delay
+
+    def run(self) -> list[tuple]:
+        self.setup()
+        remaining = self.config.operations
+        while remaining > 0:
+            length = min(self.config.phase_length, remaining)
+            draw = self.rng.random()
+            if draw < self.config.cashback_phases:
+                kind = "cashback"
+            elif draw < self.config.cashback_phases + self.config.merge_storms:
+                kind = "merge_storm"
+            else:
+                kind = "steady"
+            self.phase(kind, length)
+            remaining -= length
+        return self.operations
+
+
+def generate(config: WorkloadConfig = WorkloadConfig()) -> list[tuple]:
+    """
+    Deterministic operation list for `config`, in the (method name, *arguments)
+    format of banking_replay. Starts by creating and funding every account,
+    then runs `config.operations` operations in phases of `config.phase_length`.
+    """
+    return _Generator(config).run()
+
+
+# Replay file: gzip text, a JSON header line, then one operation per line as
+# "<code> <timestamp delta> <arguments>[\t<JSON result>]". Accounts are indexes
+# into the header's account table, get_balance stores time_at as a distance back,
+# strings are JSON encoded.
+FORMAT = "banking-replay"
+VERSION = 1
+CODES = {"create_account": "c", "deposit": "d", "transfer": "t", "top_spenders": "s", "pay": "p",
+         "get_payment_status": "g", "merge_accounts": "m", "get_balance": "b"}
+OPERATION_CODES = {code: name for name, code in CODES.items()}
+# Argument kinds after the timestamp: a = account, i = int, s = string, t = time before the timestamp
+ARGUMENTS = {"create_account": "a", "deposit": "ai", "transfer": "aai", "top_spenders": "i", "pay": "ai",
+             "get_payment_status": "as", "merge_accounts": "aa", "get_balance": "at"}
+
+
+def write_replay(path: str, operations: list[tuple], results: list | None = None, config: WorkloadConfig | None = None):
+    """Write operations (and the results of a reference run) to a compact replay file"""
+    accounts = {}
+    for op in operations:
+        for kind, value in zip(ARGUMENTS[op[0]], op[2:]):
+            if kind == "a":
+                accounts.setdefault(value, len(accounts))
+    header = {"format": FORMAT, "version": VERSION, "accounts": list(accounts),
+              "config": asdict(config) if config is not None else None, "results": results is not None}
+
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        file.write(json.dumps(header, separators=(",", ":")) + "\n")
+        previous = 0
+        for index, op in enumerate(operations):
+            name, timestamp, *args = op
+            fields = [CODES[name], str(timestamp - previous)]
+            previous = timestamp
+            for kind, value in zip(ARGUMENTS[name], args):
+                if kind == "a":
+                    fields.append(str(accounts[value]))
+                elif kind == "t":
+                    fields.append(str(timestamp - value))
+                elif kind == "s":
+                    fields.append(json.dumps(value).replace(" ", "\\u0020"))
+                else:
+                    fields.append(str(value))
+            line = " ".join(fields)
+            if results is not None:
+                line += "\t" + json.dumps(results[index], separators=(",", ":"))
+            file.write(line + "\n")
+
+
+def read_replay(path: str) -> tuple[list[tuple], list | None]:
+    """Returns (operations, results of the reference run or None)"""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        header = json.loads(file.readline())
+        if header.get("format") != FORMAT or header.get("version") != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} replay file")
+        accounts = header["accounts"]
+        operations = []
+        results = [] if header["results"] else None
+        timestamp = 0
+        for line in file:
+            text, _, result = line.rstrip("\n").partition("\t")
+            code, delta, *fields = text.split(" ")
+            name = OPERATION_CODES[code]
+            timestamp += int(delta)
+            args = []
+            for kind, value in zip(ARGUMENTS[name], fields):
+                if kind == "a":
+                    args.append(accounts[int(value)])
+                elif kind == "i":
+                    args.append(int(value))
+                elif kind == "t":
+                    args.append(timestamp - int(value))
+                else:
+                    args.append(json.loads(value))
+            operations.append((name, timestamp, *args))
+            if results is not None:
+                results.append(json.loads(result))
+    return operations, results
+
+
+def record(path: str, config: WorkloadConfig = WorkloadConfig(), system: BankingSystemImpl | None = None) -> list[tuple]:
+    """Generate a workload, run it on a reference system and write both to `path`"""
+    operations = generate(config)
+    results = replay(system if system is not None else BankingSystemImpl(), operations)
+    write_replay(path, operations, results, config)
+    return operations
+
+
+def verify(path: str, system) -> tuple | None:
+    """
+    Replay the file on `system` (any BankingSystem) and compare with the
+    reference results. Returns None if all match, else the first mismatch
+    as (index, operation, expected, actual).
+    """
+    operations, expected = read_replay(path)
+    if expected is None:
+        raise ValueError(f"{path} has no reference results")
+    for index, op in enumerate(operations):
+        actual = getattr(system, op[0])(*op[1:])
+        if actual != expected[index]:
+            return index, op, expected[index], actual
+    return None
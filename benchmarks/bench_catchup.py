@@ -0,0 +1,54 @@
+"""
+Measures the first call after a long idle period with many pending refunds.
+
+Compares the aggregated catch-up (one balance update and history entry per
+account) with applying every refund on its own.
+
+    python benchmarks/bench_catchup.py [payments] [accounts]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banking_system_impl import BankingSystemImpl
+
+
+class PerRefundSystem(BankingSystemImpl):
+    """Applies and records every due refund separately"""
+
+    def _process_cashback(self, timestamp: int):
+        for record in self._cashback_wheel.advance(timestamp):
+            self.accounts_dict[record.account_id]["account balance"] += record.cashback
+            record.refunded = True
+            self._record_balance(record.account_id, timestamp)
+
+
+def catch_up(system: BankingSystemImpl, payments: int, accounts: int) -> tuple:
+    """Returns (seconds, history entries added) of the first call after idle"""
+    for i in range(accounts):
+        system.create_account(i + 1, f"account{i}")
+        system.deposit(accounts + i + 1, f"account{i}", 10 ** 9)
+    timestamp = 3 * accounts
+    for i in range(payments):
+        system.pay(timestamp + i, f"account{i % accounts}", 100)
+
+    before = sum(len(history) for history in system.record.values())
+    start = time.perf_counter()
+    system.deposit(10 ** 12, "account0", 0)
+    seconds = time.perf_counter() - start
+    return seconds, sum(len(history) for history in system.record.values()) - before
+
+
+def main():
+    payments = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    for name, system in [("per refund", PerRefundSystem()), ("aggregated", BankingSystemImpl())]:
+        seconds, entries = catch_up(system, payments, accounts)
+        print(f"{name:<12} {1000 * seconds:>10.1f} ms  {entries:>8,} history entries")
+
+
+if __name__ == "__main__":
+    main()
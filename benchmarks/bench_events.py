@@ -0,0 +1,73 @@
+"""
+Measures the cost of publishing change events.
+
+Runs the same deposit/transfer/pay workload on a system without events,
+with an event bus but no subscriber, with a callback and with a ring buffer.
+
+    python benchmarks/bench_events.py [operations]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banking_system_impl import BankingSystemImpl
+
+
+ACCOUNTS = 1000
+
+
+def run_workload(system: BankingSystemImpl, operations: int) -> float:
+    """Returns seconds spent on `operations` deposits, transfers and pays"""
+    for i in range(ACCOUNTS):
+        system.create_account(i + 1, f"account{i}")
+        system.deposit(ACCOUNTS + i + 1, f"account{i}", 1_000_000)
+
+    timestamp = 3 * ACCOUNTS
+    start = time.perf_counter()
+    for i in range(operations):
+        timestamp += 1
+        account_id = f"account{i % ACCOUNTS}"
+        kind = i % 3
+        if kind == 0:
+            system.deposit(timestamp, account_id, 10)
+        elif kind == 1:
+            system.transfer(timestamp, account_id, f"account{(i + 1) % ACCOUNTS}", 5)
+        else:
+            system.pay(timestamp, account_id, 3)
+    return time.perf_counter() - start
+
+
+def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+
+    def no_events():
+        return BankingSystemImpl()
+
+    def idle_bus():
+        system = BankingSystemImpl()
+        system.enable_events()
+        return system
+
+    def callback():
+        system = BankingSystemImpl()
+        received = []
+        system.enable_events().subscribe(received.append)
+        return system
+
+    def ring_buffer():
+        system = BankingSystemImpl()
+        system.enable_events().ring_buffer(capacity=4096)
+        return system
+
+    baseline = None
+    for name, factory in [("no events", no_events), ("bus, no subscriber", idle_bus),
+                          ("callback subscriber", callback), ("ring buffer", ring_buffer)]:
+        seconds = run_workload(factory(), operations)
+        baseline = baseline or seconds
+        print(f"{name:<22} {operations / seconds:>12,.0f} ops/s  overhead {100 * (seconds / baseline - 1):6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Measures the streaming columnar export on a generated workload: rows per
+second and peak memory allocated during the export for two chunk sizes,
+against pickling the exported structures in one piece. Time and memory
+come from separate runs, tracemalloc slows the traced run down.
+
+    python benchmarks/bench_export.py [operations]
+"""
+import os
+import pickle
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import banking_export
+from banking_replay import replay
+from banking_system_impl import BankingSystemImpl
+from banking_workload import WorkloadConfig, generate
+
+
+def measure(run) -> tuple[float, int]:
+    """Seconds of run(0) and peak bytes allocated by run(1)"""
+    start = time.perf_counter()
+    run(0)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    run(1)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    system = BankingSystemImpl()
+    replay(system, generate(WorkloadConfig(operations=count, accounts=20000, merge_storms=0.1)))
+    fields = ("record", "merged_history", "payments", "payment_table", "merge_log")
+
+    with tempfile.TemporaryDirectory() as directory:
+        seconds, peak = measure(lambda _: pickle.dumps({name: getattr(system, name) for name in fields}))
+        print(f"{'pickle':<18} {seconds:>6.2f} s  peak {peak / 2 ** 20:>7.1f} MiB")
+        for chunk_rows in (8192, 65536):
+            # Every run exports to a new directory, an existing export would be resumed
+            counts = {}
+            seconds, peak = measure(lambda run: counts.update(banking_export.export(
+                system, os.path.join(directory, f"{chunk_rows}-{run}"), chunk_rows=chunk_rows, file_format="native")))
+            rows = sum(counts.values())
+            print(f"{f'export {chunk_rows}':<18} {seconds:>6.2f} s  peak {peak / 2 ** 20:>7.1f} MiB  "
+                  f"{rows / seconds:>10,.0f} rows/s  {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Measures forking a large system for a what-if merge simulation.
+
+Compares copy.deepcopy with fork(), then merges `merges` account pairs in
+the copy, the way a what-if simulation would.
+
+    python benchmarks/bench_fork.py [accounts] [merges]
+"""
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import banking_fork  # imported up front so the fork timing excludes the import
+from banking_system_impl import BankingSystemImpl
+
+
+def build(accounts: int) -> tuple[BankingSystemImpl, int]:
+    """System with some history and pending cashback per account, returns (system, last timestamp)"""
+    system = BankingSystemImpl()
+    timestamp = 0
+    for i in range(accounts):
+        timestamp += 1
+        system.create_account(timestamp, f"account{i}")
+    for round_ in range(10):
+        for i in range(accounts):
+            timestamp += 1
+            system.deposit(timestamp, f"account{i}", 1000)
+            system.pay(timestamp, f"account{i}", 100)
+    return system, timestamp
+
+
+def what_if(system: BankingSystemImpl, timestamp: int, merges: int):
+    for i in range(merges):
+        system.merge_accounts(timestamp + i + 1, f"account{2 * i}", f"account{2 * i + 1}")
+
+
+def main():
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    merges = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    system, timestamp = build(accounts)
+
+    for name, copier in [("deepcopy", copy.deepcopy), ("fork", banking_fork.fork)]:
+        start = time.perf_counter()
+        copied = copier(system)
+        copy_seconds = time.perf_counter() - start
+        what_if(copied, timestamp, merges)
+        total_seconds = time.perf_counter() - start
+        print(f"{name:<9} copy {1000 * copy_seconds:>9.2f} ms  copy + {merges} merges {1000 * total_seconds:>9.2f} ms")
+        del copied  # freeing the deep copy would otherwise land in the next timing
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Measures get_balance on a system with many merged accounts.
+
+Compares the merge forest lookup with the former scan of every merge time,
+then times lineage() and absorbed_into() on the longest merge chain.
+
+    python benchmarks/bench_lineage.py [merges...]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banking_system_impl import BankingSystemImpl
+
+
+class ScanningSystem(BankingSystemImpl):
+    """get_balance merge check as it was: every merge time is resolved"""
+
+    def _latest_merge_into(self, account_id):
+        return max((mt for merged_id, mt in self.merge_times.items() if self._resolve(merged_id) == account_id), default=None)
+
+
+def populate(system: BankingSystemImpl, merges: int) -> BankingSystemImpl:
+    """merges + 100 accounts, merged at random into the survivors"""
+    rng = random.Random(merges)
+    live = [f"account{i}" for i in range(merges + 100)]
+    for i, account_id in enumerate(live):
+        system.create_account(i + 1, account_id)
+        system.deposit(len(live) + i + 1, account_id, 1000)
+    timestamp = 2 * len(live)
+    for _ in range(merges):
+        timestamp += 1
+        a, b = rng.sample(range(len(live)), 2)
+        system.merge_accounts(timestamp, live[a], live[b])
+        live[b] = live[-1]
+        live.pop()
+    return system
+
+
+def timed(system: BankingSystemImpl, queries: int) -> tuple[float, list[int | None]]:
+    accounts = sorted(system.accounts_dict)
+    rng = random.Random(0)
+    timestamp = 10 ** 9
+    start = time.perf_counter()
+    results = []
+    for _ in range(queries):
+        timestamp += 1
+        results.append(system.get_balance(timestamp, rng.choice(accounts), rng.randint(1, timestamp // 2)))
+    return (time.perf_counter() - start) / queries, results
+
+
+def main():
+    counts = [int(count) for count in sys.argv[1:]] or [100, 1000, 10000]
+
+    print(f"{'merges':>8} {'forest':>12} {'scan':>12}")
+    for merges in counts:
+        system = populate(BankingSystemImpl(), merges)
+        forest_seconds, expected = timed(system, 2000)
+        scan_seconds, result = timed(populate(ScanningSystem(), merges), 200)
+        assert result == expected[:200]
+        print(f"{merges:>8} {1e6 * forest_seconds:>9.2f} us {1e6 * scan_seconds:>9.1f} us  ({scan_seconds / forest_seconds:.0f}x)")
+
+    account_id = max(system.accounts_dict, key=lambda account_id: len(system.merge_children.get(account_id, ())))
+    start = time.perf_counter()
+    lineage = system.lineage(account_id)
+    lineage_seconds = time.perf_counter() - start
+    deepest = lineage[-1][0]
+    start = time.perf_counter()
+    assert system.absorbed_into(deepest, 10 ** 9) == account_id
+    absorbed_seconds = time.perf_counter() - start
+    print(f"\nlineage of {account_id}: {len(lineage)} accounts in {1e6 * lineage_seconds:.1f} us, "
+          f"absorbed_into {1e6 * absorbed_seconds:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures bulk account provisioning against create_account + deposit per
+account, loading from lists, a CSV file and a columnar account file.
+
+Accounts are created in batches of 100 per millisecond with opening
+balances, most of them non-zero. Best of three runs each, every run
+checks that the state equals the per-call result.
+
+    python benchmarks/bench_loader.py [accounts]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import banking_loader
+from banking_replay import state_bytes
+from banking_system_impl import BankingSystemImpl
+
+
+def per_call(account_ids, timestamps, balances) -> BankingSystemImpl:
+    system = BankingSystemImpl()
+    for account_id, timestamp, balance in zip(account_ids, timestamps, balances):
+        system.create_account(timestamp, account_id)
+        if balance:
+            system.deposit(timestamp, account_id, balance)
+    return system
+
+
+def best(build) -> tuple[float, BankingSystemImpl]:
+    seconds, system = float("inf"), None
+    for _ in range(3):
+        system = None
+        start = time.perf_counter()
+        system = build()
+        seconds = min(seconds, time.perf_counter() - start)
+    return seconds, system
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    account_ids = [f"account{i}" for i in range(count)]
+    timestamps = [1 + i // 100 for i in range(count)]
+    balances = [(i * 7919) % 100000 for i in range(count)]
+    print(f"{count} accounts")
+
+    baseline, system = best(lambda: per_call(account_ids, timestamps, balances))
+    expected = state_bytes(system)
+    del system
+    print(f"{'create + deposit':<17} {baseline:>6.2f} s")
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "accounts.csv")
+        with open(csv_path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(banking_loader.CSV_HEADER)
+            writer.writerows(zip(account_ids, timestamps, balances))
+        columnar_path = os.path.join(directory, "accounts.columnar")
+        banking_loader.write_columnar(columnar_path, account_ids, timestamps, balances)
+
+        def from_lists():
+            system = BankingSystemImpl()
+            system.load_accounts(account_ids, timestamps, balances)
+            return system
+
+        def from_file(load, path):
+            system = BankingSystemImpl()
+            load(system, path)
+            return system
+
+        for name, build in (("load_accounts", from_lists),
+                            ("load_csv", lambda: from_file(banking_loader.load_csv, csv_path)),
+                            ("load_columnar", lambda: from_file(banking_loader.load_columnar, columnar_path))):
+            seconds, system = best(build)
+            assert state_bytes(system) == expected, name
+            del system
+            print(f"{name:<17} {seconds:>6.2f} s  {baseline / seconds:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
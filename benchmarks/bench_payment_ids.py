@@ -0,0 +1,83 @@
+"""
+Measures memory and lookup time of payment storage.
+
+Compares the integer-id payment table with the previous layout, a dict per
+account keyed by "paymentN" strings holding one record object per payment.
+Both include the timer wheel of pending cashback.
+
+    python benchmarks/bench_payment_ids.py [payments] [accounts]
+"""
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banking_cashback import TimerWheel, parse_payment
+from banking_system_impl import BankingSystemImpl
+
+
+@dataclass(slots=True)
+class StringKeyedPayment:
+    account_id: str
+    payment: str
+    cashback: int
+    cashback_timestamp: int
+    refunded: bool = False
+
+
+def string_keyed(payments: int, accounts: int) -> tuple:
+    store = {}
+    wheel = TimerWheel()
+    for i in range(1, payments + 1):
+        account_id = f"account{i % accounts}"
+        payment = "payment" + str(i)
+        record = StringKeyedPayment(account_id, payment, 2 * i, 86400000 + i)
+        store.setdefault(account_id, {})[payment] = record
+        wheel.add(record.cashback_timestamp, record)
+    return store, wheel
+
+
+def payment_table(payments: int, accounts: int) -> BankingSystemImpl:
+    system = BankingSystemImpl()
+    for i in range(1, payments + 1):
+        system._schedule_cashback(f"account{i % accounts}", i, 2 * i, 86400000 + i)
+    return system
+
+
+def measure(build, payments: int, accounts: int):
+    """Returns (result, bytes still allocated after the build)"""
+    tracemalloc.start()
+    result = build(payments, accounts)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    payments = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    (store, _), old_size = measure(string_keyed, payments, accounts)
+    system, new_size = measure(payment_table, payments, accounts)
+    for name, size in [("string keys", old_size), ("payment table", new_size)]:
+        print(f"{name:<14} {size / 2 ** 20:>8.1f} MiB  {size / payments:>6.1f} bytes/payment")
+
+    table = system.payment_table
+    queries = [(f"account{i % accounts}", f"payment{i}") for i in range(1, payments + 1, 7)]
+    start = time.perf_counter()
+    for account_id, payment in queries:
+        payment in store[account_id] and store[account_id][payment].refunded
+    old_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for account_id, payment in queries:
+        payment_id = parse_payment(payment)
+        payment_id in table and table.owner[payment_id] == account_id and table.refunded[payment_id]
+    new_seconds = time.perf_counter() - start
+    for name, seconds in [("string keys", old_seconds), ("payment table", new_seconds)]:
+        print(f"{name:<14} {1e9 * seconds / len(queries):>8.0f} ns per status lookup")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Measures the latency of the call that finds many cashback refunds due,
+with inline refunds and with background settlement.
+
+Every account pays at the same millisecond, so all refunds become due at
+once a day later. The first call after that pays for all of them inline,
+with deferral it takes them out of the timer wheel, hands the list to the
+worker and settles its own account. Also reports how long the worker
+takes to settle the rest.
+
+    python benchmarks/bench_settlement.py [accounts]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banking_storage import ArrayStorage, DictStorage
+from banking_storage_sqlite import SQLiteStorage
+from banking_system_impl import BankingSystemImpl
+
+DAY = 86400000
+
+
+def build(accounts: int, deferred: bool, storage, events: bool) -> BankingSystemImpl:
+    system = BankingSystemImpl(storage=storage)
+    if events:
+        received = []
+        system.enable_events().subscribe(received.append)
+    if deferred:
+        system.enable_background_settlement(start=False)
+    for i in range(accounts):
+        system.create_account(1, f"account{i}")
+        system.deposit(2, f"account{i}", 10000)
+    for i in range(accounts):
+        system.pay(3, f"account{i}", 100)
+    return system
+
+
+def main():
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"{accounts} refunds due at the same call")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, events in (("dict", False), ("dict+events", True), ("array", False), ("sqlite", False)):
+            for deferred in (False, True):
+                if name == "sqlite":
+                    storage = SQLiteStorage(os.path.join(directory, f"{deferred}.sqlite"))
+                else:
+                    storage = ArrayStorage() if name == "array" else DictStorage()
+                system = build(accounts, deferred, storage, events)
+                start = time.perf_counter()
+                system.deposit(DAY + 3, "account0", 1)
+                elapsed = time.perf_counter() - start
+                line = f"{name:<12} {'deferred' if deferred else 'inline':<9} {1e3 * elapsed:>8.1f} ms for the call"
+                if deferred:
+                    start = time.perf_counter()
+                    settled = system._settlement.drain()
+                    line += f", {1e3 * (time.perf_counter() - start):.0f} ms to settle {settled} accounts in the background"
+                print(line)
+                if name == "sqlite":
+                    storage.close()
+
+
+if __name__ == "__main__":
+    main()
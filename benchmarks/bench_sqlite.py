@@ -0,0 +1,76 @@
+"""
+Measures SQLiteBankingSystem on a database file.
+
+Compares one transaction per operation with a single batch() transaction
+for the same workload, then times get_balance lookups on the indexed
+history against BankingSystemImpl.
+
+    python benchmarks/bench_sqlite.py [operations] [accounts]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banking_sqlite import SQLiteBankingSystem
+from banking_system_impl import BankingSystemImpl
+
+
+def workload(count: int, accounts: int) -> list[tuple]:
+    rng = random.Random(11)
+    operations = [("create_account", i + 1, f"account{i}") for i in range(accounts)]
+    timestamp = accounts
+    for _ in range(count):
+        timestamp += rng.choice([1, 1000, 4000000])
+        a, b = (f"account{i}" for i in rng.sample(range(accounts), 2))
+        kind = rng.random()
+        if kind < 0.5:
+            operations.append(("deposit", timestamp, a, rng.randint(1, 1000)))
+        elif kind < 0.75:
+            operations.append(("transfer", timestamp, a, b, rng.randint(1, 100)))
+        else:
+            operations.append(("pay", timestamp, a, rng.randint(1, 100)))
+    return operations
+
+
+def apply(system, operations: list[tuple]) -> float:
+    start = time.perf_counter()
+    for name, *args in operations:
+        getattr(system, name)(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    operations = workload(count, accounts)
+    end = operations[-1][1]
+
+    with tempfile.TemporaryDirectory() as directory:
+        single = SQLiteBankingSystem(os.path.join(directory, "single.sqlite"))
+        single_seconds = apply(single, operations)
+        single.close()
+
+        batched = SQLiteBankingSystem(os.path.join(directory, "batched.sqlite"))
+        with batched.batch():
+            batched_seconds = apply(batched, operations)
+        for name, seconds in [("per operation", single_seconds), ("batched", batched_seconds)]:
+            print(f"{name:<14} {seconds:>8.2f} s  {1e6 * seconds / len(operations):>8.1f} us per operation")
+
+        memory = BankingSystemImpl()
+        apply(memory, operations)
+        rng = random.Random(12)
+        queries = [(end + 1, f"account{rng.randrange(accounts)}", rng.randint(accounts, end)) for _ in range(20000)]
+        for name, system in [("sqlite", batched), ("in memory", memory)]:
+            start = time.perf_counter()
+            for query in queries:
+                system.get_balance(*query)
+            seconds = time.perf_counter() - start
+            print(f"{name:<14} {1e6 * seconds / len(queries):>8.1f} us per get_balance")
+        batched.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Guards cold start: import time budgets and construction from a snapshot.
+
+Every measurement runs in a fresh interpreter. Import times are the
+cumulative times reported by `python -X importtime` (median of `runs`,
+after one warm-up run that fills the bytecode cache). Exits with status 1
+if a budget is exceeded.
+
+    python benchmarks/bench_startup.py [runs] [operations]
+"""
+import os
+import pickle
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from banking_system_impl import BankingSystemImpl
+
+
+# Cumulative import time budgets in ms
+IMPORT_BUDGET_MS = {
+    "banking_system": 5,
+    "banking_system_impl": 15,
+}
+
+
+def _environment() -> dict:
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # measure with the bytecode cache, like an installed package
+    return env
+
+
+def import_ms(module: str) -> float:
+    """Cumulative import time of `module` in a fresh interpreter"""
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO, env=_environment(), capture_output=True, text=True, check=True)
+    for line in output.stderr.splitlines():
+        if line.startswith("import time:") and line.rsplit("|", 1)[1].strip() == module:
+            return int(line.split("|")[1]) / 1000
+    raise RuntimeError(f"{module} not in -X importtime output")
+
+
+def run_ms(script: str) -> float:
+    """Wall time of a fresh interpreter running `script`"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", script], cwd=REPO, env=_environment(), check=True)
+    return 1000 * (time.perf_counter() - start)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    failed = False
+
+    for module, budget in IMPORT_BUDGET_MS.items():
+        import_ms(module)
+        ms = statistics.median(import_ms(module) for _ in range(runs))
+        status = "ok" if ms <= budget else "OVER BUDGET"
+        failed |= ms > budget
+        print(f"import {module:<20} {ms:>7.2f} ms  (budget {budget} ms)  {status}")
+
+    # A system with history, started by replaying it or from a snapshot
+    system = BankingSystemImpl()
+    history = []
+    for i in range(operations):
+        account_id = f"account{i % 1000}"
+        if i < 1000:
+            history.append(("create_account", i + 1, account_id))
+        elif i % 2:
+            history.append(("deposit", i + 1, account_id, 100))
+        else:
+            history.append(("pay", i + 1, account_id, 10))
+    for op in history:
+        getattr(system, op[0])(*op[1:])
+
+    with tempfile.TemporaryDirectory() as directory:
+        log = os.path.join(directory, "history.pkl")
+        with open(log, "wb") as f:
+            pickle.dump(history, f)
+        snapshot = os.path.join(directory, "system.snapshot")
+        system.save_snapshot(snapshot)
+
+        replay_script = ("import pickle\nfrom banking_system_impl import BankingSystemImpl\nsystem = BankingSystemImpl()\n"
+                         f"for op in pickle.load(open({log!r}, 'rb')):\n    getattr(system, op[0])(*op[1:])\n")
+        snapshot_script = f"from banking_system_impl import BankingSystemImpl\nBankingSystemImpl.from_snapshot({snapshot!r})\n"
+        for name, script in [("replay history", replay_script), ("from_snapshot", snapshot_script)]:
+            ms = statistics.median(run_ms(script) for _ in range(runs))
+            print(f"start by {name:<18} {ms:>7.1f} ms  ({operations} operations)")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
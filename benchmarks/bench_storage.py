@@ -0,0 +1,82 @@
+"""
+Runs the same workload on every storage backend of BankingSystemImpl.
+
+Reports the run time, and in a second run the Python memory still
+allocated afterwards. The SQLite backend keeps its state in a database
+file, so its memory is mostly the page cache and the file size is shown too.
+
+    python benchmarks/bench_storage.py [operations] [accounts]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banking_storage import ArrayStorage, DictStorage
+from banking_storage_sqlite import SQLiteStorage
+from banking_system_impl import BankingSystemImpl
+
+
+def workload(count: int, accounts: int) -> list[tuple]:
+    """Deposits, transfers, payments and balance queries on `accounts` accounts"""
+    rng = random.Random(7)
+    operations = [("create_account", i + 1, f"account{i}") for i in range(accounts)]
+    timestamp = accounts
+    for _ in range(count):
+        timestamp += rng.choice([1, 1000, 4000000])
+        a, b = (f"account{i}" for i in rng.sample(range(accounts), 2))
+        kind = rng.random()
+        if kind < 0.4:
+            operations.append(("deposit", timestamp, a, rng.randint(1, 1000)))
+        elif kind < 0.6:
+            operations.append(("transfer", timestamp, a, b, rng.randint(1, 100)))
+        elif kind < 0.8:
+            operations.append(("pay", timestamp, a, rng.randint(1, 100)))
+        else:
+            operations.append(("get_balance", timestamp, a, rng.randint(1, timestamp)))
+    return operations
+
+
+def run(storage, operations: list[tuple]) -> tuple[BankingSystemImpl, list]:
+    system = BankingSystemImpl(storage=storage)
+    results = [getattr(system, name)(*args) for name, *args in operations]
+    if isinstance(storage, SQLiteStorage):
+        storage.commit()
+    return system, results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    operations = workload(count, accounts)
+
+    with tempfile.TemporaryDirectory() as directory:
+        expected = None
+        for backend in (DictStorage, ArrayStorage, SQLiteStorage):
+            path = os.path.join(directory, f"{backend.name}.sqlite")
+            storage = backend(path) if backend is SQLiteStorage else backend()
+            start = time.perf_counter()
+            _, results = run(storage, operations)
+            seconds = time.perf_counter() - start
+            expected = expected if expected is not None else results
+            assert results == expected, backend.name
+
+            tracemalloc.start()
+            storage = backend(path + ".2") if backend is SQLiteStorage else backend()
+            system, _ = run(storage, operations)
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del system
+
+            line = f"{backend.name:<7} {seconds:>8.2f} s  {size / 2 ** 20:>8.1f} MiB in memory"
+            if backend is SQLiteStorage:
+                storage.close()
+                line += f"  {os.path.getsize(path + '.2') / 2 ** 20:>8.1f} MiB on disk"
+            print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Measures memory per tenant for many small ledgers in one process.
+
+Compares one plain BankingSystemImpl per tenant with a TenantManager
+that keeps every tenant live (forks of one empty template) and one that
+keeps 100 live and the rest in its compact store. Then times get() for a
+live tenant and for an evicted one.
+
+    python benchmarks/bench_tenants.py [tenants] [accounts per tenant]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banking_system_impl import BankingSystemImpl
+from banking_tenants import TenantManager
+
+
+def populate(system: BankingSystemImpl, accounts: int):
+    for i in range(accounts):
+        system.create_account(i + 1, f"account{i}")
+        system.deposit(accounts + i + 1, f"account{i}", 1000)
+
+
+def traced(build) -> tuple[float, object]:
+    """Bytes allocated by build() and still held by its result"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+
+def plain(tenants: int, accounts: int) -> list[BankingSystemImpl]:
+    systems = [BankingSystemImpl() for _ in range(tenants)]
+    for system in systems:
+        populate(system, accounts)
+    return systems
+
+
+def managed(directory: str, tenants: int, accounts: int, max_resident: int) -> TenantManager:
+    manager = TenantManager(directory, max_resident=max_resident)
+    for tenant in range(tenants):
+        populate(manager.get(f"tenant{tenant}"), accounts)
+    return manager
+
+
+def timed_gets(manager: TenantManager, tenants: range) -> float:
+    """Seconds per get()"""
+    start = time.perf_counter()
+    for tenant in tenants:
+        manager.get(f"tenant{tenant}")
+    return (time.perf_counter() - start) / len(tenants)
+
+
+def main():
+    tenants = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f"{tenants} tenants with {accounts} accounts each")
+
+    plain_bytes, systems = traced(lambda: plain(tenants, accounts))
+    del systems
+    print(f"{'plain systems':<22} {plain_bytes / tenants:>7.0f} bytes per tenant")
+
+    for max_resident in (tenants, 100):
+        with tempfile.TemporaryDirectory() as directory:
+            managed_bytes, manager = traced(lambda: managed(directory, tenants, accounts, max_resident))
+            print(f"{f'manager, {max_resident} live':<22} {managed_bytes / tenants:>7.0f} bytes per tenant, "
+                  f"{sum(manager.memory_report().values()) / tenants:.0f} by memory_report()")
+            line = f"{'':<22} get() {1e6 * timed_gets(manager, range(tenants - 100, tenants)):.1f} us live"
+            if max_resident < tenants:
+                # Loads an evicted tenant and evicts the least recently used one
+                line += f", {1e6 * timed_gets(manager, range(min(1000, tenants - 100))):.0f} us evicted"
+            print(line)
+            del manager
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Measures top_spenders(n) across account counts.
+
+Compares heap selection of the top n with the former bubble sort over all
+accounts. Bubble sort is quadratic, so it is skipped above
+BUBBLE_SORT_LIMIT accounts.
+Then a dashboard pattern, many top_spenders calls between payments, without
+cache and with the cache in both invalidation modes.
+
+    python benchmarks/bench_top_spenders.py [n] [account counts...]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banking_system_impl import BankingSystemImpl
+
+
+BUBBLE_SORT_LIMIT = 5000
+
+
+class BubbleSortSystem(BankingSystemImpl):
+    """top_spenders as it was: bubble sort of every account"""
+
+    def top_spenders(self, timestamp: int, n: int) -> list[str]:
+        account_outgoing_list = [(account_id, self.outgoing.get(account_id, 0)) for account_id in self.accounts_dict.keys()]
+        for i in range(len(account_outgoing_list)):
+            for j in range(len(account_outgoing_list) - 1):
+                if account_outgoing_list[j][1] < account_outgoing_list[j + 1][1]:
+                    account_outgoing_list[j], account_outgoing_list[j + 1] = account_outgoing_list[j + 1], account_outgoing_list[j]
+                elif account_outgoing_list[j][1] == account_outgoing_list[j + 1][1]:
+                    if account_outgoing_list[j][0] > account_outgoing_list[j + 1][0]:
+                        account_outgoing_list[j], account_outgoing_list[j + 1] = account_outgoing_list[j + 1], account_outgoing_list[j]
+        return [f"{account_id}({amount})" for account_id, amount in account_outgoing_list[:n]]
+
+
+def populate(system: BankingSystemImpl, accounts: int) -> BankingSystemImpl:
+    """Accounts with random outgoing totals, some of them tied"""
+    rng = random.Random(accounts)
+    for i in range(accounts):
+        system.create_account(i + 1, f"account{i}")
+        system.deposit(accounts + i + 1, f"account{i}", 10 ** 6)
+    timestamp = 3 * accounts
+    for i in range(accounts):
+        timestamp += 1
+        system.pay(timestamp, f"account{i}", rng.randint(0, 1000) * 10)
+    return system
+
+
+def timed(system: BankingSystemImpl, n: int, repeat: int) -> tuple[float, list[str]]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = system.top_spenders(10 ** 9, n)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def dashboard(accounts: int, n: int, mode: str | None, rounds: int = 200, reads: int = 20) -> float:
+    """Seconds per top_spenders call, `reads` calls after every payment"""
+    system = populate(BankingSystemImpl(), accounts)
+    if mode is not None:
+        system.enable_top_spenders_cache(mode)
+    rng = random.Random(1)
+    timestamp = 10 ** 9
+    start = time.perf_counter()
+    for _ in range(rounds):
+        timestamp += 1
+        system.pay(timestamp, f"account{rng.randrange(accounts)}", rng.randint(1, 100))
+        for _ in range(reads):
+            system.top_spenders(timestamp, n)
+    return (time.perf_counter() - start) / (rounds * reads)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    counts = [int(count) for count in sys.argv[2:]] or [100, 1000, 5000, 100000, 1000000]
+
+    print(f"{'accounts':>10} {'heap':>12} {'bubble sort':>14}")
+    for accounts in counts:
+        heap_seconds, expected = timed(populate(BankingSystemImpl(), accounts), n, 5)
+        line = f"{accounts:>10} {1e3 * heap_seconds:>9.2f} ms"
+        if accounts <= BUBBLE_SORT_LIMIT:
+            bubble_seconds, result = timed(populate(BubbleSortSystem(), accounts), n, 1)
+            assert result == expected
+            line += f" {1e3 * bubble_seconds:>11.1f} ms  ({bubble_seconds / heap_seconds:.0f}x)"
+        print(line)
+
+    accounts = min(counts[-1], 100000)
+    print(f"\ndashboard, {accounts} accounts, 20 top_spenders calls per payment")
+    for mode in (None, "version", "boundary"):
+        print(f"{mode or 'no cache':<10} {1e6 * dashboard(accounts, n, mode):>9.1f} us per call")
+
+if __name__ == "__main__":
+    main()
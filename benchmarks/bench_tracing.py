@@ -0,0 +1,60 @@
+"""
+Measures the per-call overhead of the latency tracer and shows what it
+reports on a generated workload: per-operation percentiles and the
+slowest calls with their phases.
+
+The overhead is timed on deposits, the cheapest operation, without
+tracer and with sample rates 0.01 and 1, best of five runs each.
+
+    python benchmarks/bench_tracing.py [operations]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banking_replay import replay
+from banking_system_impl import BankingSystemImpl
+from banking_workload import WorkloadConfig, generate
+
+
+def deposits(sample_rate: float | None, count: int) -> float:
+    """Seconds per deposit, best of five"""
+    best = float("inf")
+    for _ in range(5):
+        system = BankingSystemImpl()
+        if sample_rate:
+            system.enable_tracing(sample_rate)
+        system.create_account(1, "account0")
+        deposit = system.deposit
+        start = time.perf_counter()
+        for timestamp in range(2, count + 2):
+            deposit(timestamp, "account0", 1)
+        best = min(best, (time.perf_counter() - start) / count)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    baseline = deposits(None, count)
+    print(f"{'no tracer':<17} {1e6 * baseline:.2f} us per deposit")
+    for sample_rate in (0.01, 1.0):
+        seconds = deposits(sample_rate, count)
+        print(f"{f'sample rate {sample_rate}':<17} {1e6 * seconds:.2f} us per deposit, "
+              f"+{1e6 * (seconds - baseline):.2f} us")
+
+    operations = generate(WorkloadConfig(operations=count, accounts=500, merge_storms=0.2))
+    system = BankingSystemImpl()
+    tracer = system.enable_tracing(threshold=0.001)
+    replay(system, operations)
+    print(f"\n{len(operations)} generated operations, p50 / p99 (upper bounds)")
+    for name, stats in tracer.summary().items():
+        print(f"  {name:<19} {1e6 * stats['p50']:>7.0f} us  {1e6 * stats['p99']:>7.0f} us")
+    print("\nslowest calls")
+    print(tracer.dump(5))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measures a risk check that applies a batch of transfers and merges and then
+discards it, with copy.deepcopy against begin() / rollback().
+
+    python benchmarks/bench_transaction.py [accounts] [batch]
+"""
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import banking_transaction  # imported up front so the timing excludes the import
+from banking_system_impl import BankingSystemImpl
+
+
+def build(accounts: int) -> tuple[BankingSystemImpl, int]:
+    """System with some history and pending cashback per account, returns (system, last timestamp)"""
+    system = BankingSystemImpl()
+    timestamp = 0
+    for i in range(accounts):
+        timestamp += 1
+        system.create_account(timestamp, f"account{i}")
+    for _ in range(5):
+        for i in range(accounts):
+            timestamp += 1
+            system.deposit(timestamp, f"account{i}", 1000)
+            system.pay(timestamp, f"account{i}", 100)
+    return system, timestamp
+
+
+def check(system: BankingSystemImpl, timestamp: int, batch: int):
+    """The proposed batch: transfers, with every tenth entry a merge"""
+    for i in range(batch):
+        if i % 10 == 9:
+            system.merge_accounts(timestamp + i + 1, f"account{2 * i}", f"account{2 * i + 1}")
+        else:
+            system.transfer(timestamp + i + 1, f"account{2 * i}", f"account{2 * i + 1}", 10)
+
+
+def main():
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    system, timestamp = build(accounts)
+
+    start = time.perf_counter()
+    check(copy.deepcopy(system), timestamp, batch)
+    copy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    system.begin()
+    check(system, timestamp, batch)
+    system.rollback()
+    rollback_seconds = time.perf_counter() - start
+
+    for name, seconds in [("deepcopy + batch", copy_seconds), ("begin + batch + rollback", rollback_seconds)]:
+        print(f"{name:<26} {1000 * seconds:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Compares the binary frames of banking_wire with JSON requests.
+
+A JSON frame is an array of {"op", "timestamp", <named arguments>} objects,
+the server parses it and calls the engine method by name. Times encoding,
+decoding and dispatch to an engine that does nothing (the protocol cost
+alone), and to BankingSystemImpl, on one generated workload sent in
+frames of 1000 operations. Also shows the bytes per operation.
+
+    python benchmarks/bench_wire.py [operations]
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banking_replay import OPERATIONS
+from banking_system_impl import BankingSystemImpl
+from banking_wire import FrameDecoder, FrameEncoder
+from banking_workload import WorkloadConfig, generate
+
+FRAME = 1000
+
+# Argument names of the JSON requests
+PARAMETERS = {"create_account": ("account_id",), "deposit": ("account_id", "amount"),
+              "transfer": ("source_account_id", "target_account_id", "amount"), "top_spenders": ("n",),
+              "pay": ("account_id", "amount"), "get_payment_status": ("account_id", "payment"),
+              "merge_accounts": ("account_id_1", "account_id_2"), "get_balance": ("account_id", "time_at")}
+
+
+class NullEngine:
+    """Accepts every operation and does nothing"""
+
+    def __getattr__(self, name):
+        if name not in OPERATIONS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+
+def json_encode(operations: list[tuple]) -> bytes:
+    requests = []
+    for name, timestamp, *args in operations:
+        request = {"op": name, "timestamp": timestamp}
+        request.update(zip(PARAMETERS[name], args))
+        requests.append(request)
+    return json.dumps(requests, separators=(",", ":")).encode()
+
+
+def json_dispatch(system, frame: bytes) -> list:
+    results = []
+    for request in json.loads(frame):
+        name = request.pop("op")
+        results.append(getattr(system, name)(**request))
+    return results
+
+
+def timed(function, frames) -> tuple[float, list]:
+    start = time.perf_counter()
+    output = [function(frame) for frame in frames]
+    return time.perf_counter() - start, output
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    operations = generate(WorkloadConfig(operations=count, accounts=2000))
+    batches = [operations[i:i + FRAME] for i in range(0, len(operations), FRAME)]
+    print(f"{len(operations)} operations in frames of {FRAME}")
+
+    encoder = FrameEncoder()
+    codecs = {
+        "json": (json_encode, lambda: json_dispatch),
+        "binary": (encoder.encode, lambda: FrameDecoder().dispatch),
+    }
+    expected = None
+    for name, (encode, dispatcher) in codecs.items():
+        encode_seconds, frames = timed(encode, batches)
+        size = sum(len(frame) for frame in frames)
+        dispatch = dispatcher()
+        null = NullEngine()
+        decode_seconds, _ = timed(lambda frame: dispatch(null, frame), frames)
+        dispatch = dispatcher()
+        system = BankingSystemImpl()
+        run_seconds, results = timed(lambda frame: dispatch(system, frame), frames)
+        expected = expected if expected is not None else results
+        assert results == expected, name
+
+        rate = len(operations) / 1e6
+        print(f"{name:<7} {size / len(operations):>5.1f} bytes/op  encode {rate / encode_seconds:>5.2f} M ops/s  "
+              f"decode {rate / decode_seconds:>5.2f} M ops/s  with engine {rate / run_seconds:>5.2f} M ops/s")
+
+
+if __name__ == "__main__":
+    main()
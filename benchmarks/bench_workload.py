@@ -0,0 +1,50 @@
+"""
+Replays one recorded workload on every engine and checks the results.
+
+Generates a seeded workload (Zipfian accounts, cashback phases, merge
+storms), records the BankingSystemImpl results to a replay file, then
+times each engine on it and verifies every result against the recording.
+
+    python benchmarks/bench_workload.py [operations] [accounts] [seed]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import banking_workload
+from banking_sqlite import SQLiteBankingSystem
+from banking_storage import ArrayStorage
+from banking_system_impl import BankingSystemImpl
+from banking_workload import WorkloadConfig
+
+
+ENGINES = {
+    "dict": BankingSystemImpl,
+    "array": lambda: BankingSystemImpl(storage=ArrayStorage()),
+    "sqlite system": SQLiteBankingSystem,
+}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    config = WorkloadConfig(seed=seed, operations=count, accounts=accounts)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "workload.replay")
+        operations = banking_workload.record(path, config)
+        print(f"{len(operations)} operations, {os.path.getsize(path) / len(operations):.1f} bytes per operation in the replay file")
+
+        for name, engine in ENGINES.items():
+            start = time.perf_counter()
+            mismatch = banking_workload.verify(path, engine())
+            seconds = time.perf_counter() - start
+            status = "ok" if mismatch is None else f"MISMATCH at {mismatch[0]}: {mismatch[1:]}"
+            print(f"{name:<14} {seconds:>8.2f} s  {status}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import unittest
+
+import banking_replay
+from banking_system_impl import BankingSystemImpl
+
+
+class BulkTests(unittest.TestCase):
+    """
+    Tests for deposit_many and pay_many.
+    Every bulk call is compared against the scalar methods on a second system.
+    """
+
+    failureException = Exception
+
+
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl()
+        cls.scalar = BankingSystemImpl()
+
+    def _both(self, method: str, *args):
+        self.assertEqual(getattr(self.system, method)(*args), getattr(self.scalar, method)(*args))
+
+    def _assert_same_state(self):
+        self.assertEqual(self.system.accounts_dict, self.scalar.accounts_dict)
+        self.assertEqual(self.system.record, self.scalar.record)
+        self.assertEqual(self.system.outgoing, self.scalar.outgoing)
+        self.assertEqual(self.system.payments, self.scalar.payments)
+        self.assertEqual(self.system.payment_table, self.scalar.payment_table)
+        self.assertEqual(self.system.payment_counter, self.scalar.payment_counter)
+
+    def _bulk_vs_scalar(self, timestamp: int, bulk: str, scalar: str, account_ids: list[str], amounts: list[int]):
+        results = getattr(self.system, bulk)(timestamp, account_ids, amounts)
+        expected = [getattr(self.scalar, scalar)(timestamp, a, x) for a, x in zip(account_ids, amounts)]
+        self.assertEqual(results, expected)
+        return results
+
+    def _setup_accounts(self, count: int):
+        for i in range(count):
+            self._both("create_account", 1 + i, f"account{i}")
+
+    def test_bulk_deposit_matches_scalar(self):
+        self._setup_accounts(4)
+        ids = ["account0", "account1", "missing", "account0", "account3", "account0"]
+        results = self._bulk_vs_scalar(10, "deposit_many", "deposit", ids, [100, 200, 50, 25, 0, 5])
+        self.assertEqual(results, [100, 200, None, 125, 0, 130])
+        self._assert_same_state()
+
+    def test_bulk_pay_rejects_insufficient_funds_in_order(self):
+        self._setup_accounts(3)
+        self._bulk_vs_scalar(10, "deposit_many", "deposit", ["account0", "account1", "account2"], [300, 100, 1000])
+        ids = ["account0", "account1", "account0", "account0", "account2", "account1", "missing"]
+        results = self._bulk_vs_scalar(20, "pay_many", "pay", ids, [200, 150, 150, 100, 10, 100, 5])
+        self.assertEqual(results, ["payment1", None, None, "payment2", "payment3", "payment4", None])
+        self._assert_same_state()
+
+    def test_bulk_pay_cashback_is_refunded(self):
+        self._setup_accounts(2)
+        self._bulk_vs_scalar(10, "deposit_many", "deposit", ["account0", "account1"], [1000, 1000])
+        self._bulk_vs_scalar(20, "pay_many", "pay", ["account0", "account1"], [500, 250])
+        self._both("get_payment_status", 30, "account0", "payment1")
+        self.assertEqual(self.system.deposit(20 + 86400000, "account0", 0), 510)
+        self.assertEqual(self.scalar.deposit(20 + 86400000, "account0", 0), 510)
+        self._both("get_payment_status", 20 + 86400001, "account1", "payment2")
+        self._assert_same_state()
+
+    def test_bulk_skips_merged_accounts(self):
+        self._setup_accounts(3)
+        self._bulk_vs_scalar(10, "deposit_many", "deposit", ["account0", "account1", "account2"], [100, 100, 100])
+        self._both("merge_accounts", 11, "account0", "account1")
+        self._bulk_vs_scalar(12, "deposit_many", "deposit", ["account1", "account0", "account2"], [10, 20, 30])
+        self._bulk_vs_scalar(13, "pay_many", "pay", ["account0", "account1", "account0"], [150, 10, 100])
+        self._both("top_spenders", 14, 3)
+        self._both("get_balance", 15, "account0", 12)
+        self._assert_same_state()
+
+    def test_bulk_empty_and_length_mismatch(self):
+        self.assertEqual(self.system.deposit_many(1, [], []), [])
+        self.assertEqual(self.system.pay_many(2, ["account0"], [10]), [None])
+
+        # An empty batch doesn't refund the cashback that is due
+        self.system.create_account(3, "account0")
+        self.system.deposit(4, "account0", 1000)
+        self.system.pay(5, "account0", 100)
+        state = banking_replay.state_bytes(self.system)
+        self.assertEqual(self.system.deposit_many(5 + 86400000, [], []), [])
+        self.assertEqual(self.system.pay_many(5 + 86400000, [], []), [])
+        self.assertEqual(banking_replay.state_bytes(self.system), state)
+        self.assertEqual(self.system.get_balance(6 + 86400000, "account0", 5 + 86400000), 902)
+        with self.assertRaises(ValueError):
+            self.system.deposit_many(3, ["account0"], [])
+
+    def test_bulk_values_beyond_int64(self):
+        self._setup_accounts(2)
+        # Balances and cashback past the int64 range of the arrays take the scalar path
+        self._bulk_vs_scalar(3, "deposit_many", "deposit", ["account0", "account0"], [2 ** 62, 2 ** 62])
+        self.assertEqual(self.system.accounts_dict["account0"]["account balance"], 2 ** 63)
+        self._bulk_vs_scalar(4, "deposit_many", "deposit", ["account1"], [10 ** 17])
+        self._bulk_vs_scalar(5, "pay_many", "pay", ["account1", "account0"], [5 * 10 ** 16, 1])
+        self.assertEqual(self.system.payment_table.row(1)[1], 10 ** 15)
+        self._assert_same_state()
@@ -0,0 +1,165 @@
+import random
+import unittest
+
+from banking_cashback import CashbackPolicy, TimerWheel
+from banking_system_impl import BankingSystemImpl
+
+
+class TimerWheelTests(unittest.TestCase):
+    """
+    Tests for the hierarchical timer wheel against a sorted list.
+    """
+
+    failureException = Exception
+
+    def test_matches_sorted_list(self):
+        for seed in range(50):
+            rng = random.Random(seed)
+            wheel = TimerWheel()
+            naive = []
+            now = 0
+            for item in range(300):
+                if rng.random() < 0.5:
+                    due = now + rng.choice([0, 1, 63, 64, 4096, 86400000, 2 ** 37, rng.randint(-100, 10 ** 10)])
+                    wheel.add(due, item)
+                    naive.append((due, item))
+                else:
+                    to = now + rng.choice([0, 1, 64, 65, 4096, 86400000, 2 ** 38, rng.randint(0, 10 ** 9)])
+                    expected = sorted(entry for entry in naive if entry[0] <= to)
+                    naive = [entry for entry in naive if entry[0] > to]
+                    self.assertEqual(wheel.advance(to), [item for _, item in expected])
+                    now = to
+                self.assertEqual(len(wheel), len(naive))
+
+    def test_large_jump_expires_everything_at_once(self):
+        wheel = TimerWheel()
+        for item in range(10000):
+            wheel.add(86400000 + item * 997, item)
+        self.assertEqual(wheel.advance(86400000 - 1), [])
+        self.assertEqual(wheel.advance(10 ** 12), list(range(10000)))
+        self.assertEqual(len(wheel), 0)
+
+    def test_advance_backwards_only_returns_ready_entries(self):
+        wheel = TimerWheel(now=1000)
+        wheel.add(500, 'late')
+        wheel.add(900, 'later')
+        self.assertEqual(wheel.advance(600), ['late'])
+        self.assertEqual(wheel.now, 1000)
+        self.assertEqual(wheel.advance(1000), ['later'])
+
+
+class CashbackPolicyTests(unittest.TestCase):
+    """
+    Tests for cashback policies per account class.
+    """
+
+    failureException = Exception
+
+
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl()
+        cls.system.register_cashback_policy('premium', CashbackPolicy(rate_bps=500, delay=3600000))
+
+    def test_policy_per_account_class(self):
+        self.assertTrue(self.system.create_account(1, 'account1'))
+        self.assertTrue(self.system.create_account(2, 'account2'))
+        self.assertTrue(self.system.set_account_class('account2', 'premium'))
+        self.system.deposit(3, 'account1', 1000)
+        self.system.deposit(4, 'account2', 1000)
+        self.assertEqual(self.system.pay(5, 'account1', 1000), 'payment1')
+        self.assertEqual(self.system.pay(6, 'account2', 1000), 'payment2')
+        self.assertEqual(self.system.get_payment_status(3600006, 'account2', 'payment2'), 'CASHBACK_RECEIVED')
+        self.assertEqual(self.system.get_payment_status(3600007, 'account1', 'payment1'), 'IN_PROGRESS')
+        self.assertEqual(self.system.deposit(3600008, 'account2', 0), 50)
+        self.assertEqual(self.system.deposit(86400005, 'account1', 0), 20)
+
+    def test_merge_keeps_scheduled_cashback(self):
+        self.system.create_account(1, 'account1')
+        self.system.create_account(2, 'account2')
+        self.system.set_account_class('account2', 'premium')
+        self.system.deposit(3, 'account1', 1000)
+        self.system.deposit(4, 'account2', 1000)
+        self.assertEqual(self.system.pay(5, 'account2', 1000), 'payment1')
+        self.assertTrue(self.system.merge_accounts(6, 'account1', 'account2'))
+        self.assertEqual(self.system.pay(7, 'account1', 1000), 'payment2')
+        # payment1 keeps the premium rate and delay, payment2 uses account1's default class
+        self.assertEqual(self.system.deposit(3600005, 'account1', 0), 50)
+        self.assertEqual(self.system.deposit(86400007, 'account1', 0), 70)
+
+    def test_bulk_pay_uses_account_policy(self):
+        scalar = BankingSystemImpl()
+        scalar.register_cashback_policy('premium', CashbackPolicy(rate_bps=500, delay=3600000))
+        for system in (self.system, scalar):
+            system.create_account(1, 'account1')
+            system.create_account(2, 'account2')
+            system.set_account_class('account1', 'premium')
+            system.deposit(3, 'account1', 1000)
+            system.deposit(4, 'account2', 1000)
+        self.system.pay_many(5, ['account1', 'account2', 'account1'], [300, 400, 500])
+        for account_id, amount in [('account1', 300), ('account2', 400), ('account1', 500)]:
+            scalar.pay(5, account_id, amount)
+        self.assertEqual(self.system.payments, scalar.payments)
+        self.assertEqual(self.system.payment_table, scalar.payment_table)
+        self.assertEqual(self.system.get_balance(10, 'account1', 3600005), scalar.get_balance(10, 'account1', 3600005))
+
+    def test_clock_jump_settles_all_pending_cashback(self):
+        self.system.create_account(1, 'account1')
+        self.system.deposit(2, 'account1', 10 ** 9)
+        for i in range(2000):
+            self.system.pay(10 + i, 'account1', 100)
+        self.assertEqual(len(self.system._cashback_wheel), 2000)
+        self.assertEqual(self.system.get_balance(3000, 'account1', 10 ** 9), 10 ** 9 - 2000 * 98)
+        self.assertEqual(len(self.system._cashback_wheel), 0)
+
+    def test_catch_up_aggregates_refunds_per_account(self):
+        self.system.create_account(1, 'account1')
+        self.system.create_account(2, 'account2')
+        self.system.deposit(2, 'account1', 10 ** 6)
+        self.system.deposit(3, 'account2', 10 ** 6)
+        for i in range(100):
+            self.system.pay(10 + i, 'account1', 100)
+            self.system.pay(10 + i, 'account2', 1000)
+        history = {account_id: len(self.system.record[account_id]) for account_id in ('account1', 'account2')}
+
+        self.assertEqual(self.system.get_payment_status(10 ** 9, 'account2', 'payment200'), 'CASHBACK_RECEIVED')
+        # One history entry per account, stamped with the catch-up time
+        for account_id in ('account1', 'account2'):
+            self.assertEqual(len(self.system.record[account_id]), history[account_id] + 1)
+            self.assertEqual(self.system.record[account_id][-1][0], 10 ** 9)
+        self.assertEqual(self.system.get_balance(10 ** 9 + 1, 'account1', 10 ** 9), 10 ** 6 - 100 * 98)
+        self.assertEqual(self.system.get_balance(10 ** 9 + 1, 'account2', 10 ** 9), 10 ** 6 - 100 * 980)
+        self.assertEqual(self.system.get_balance(10 ** 9 + 1, 'account2', 10 ** 9 - 1), 10 ** 6 - 100 * 1000)
+        self.assertTrue(all(row[3] for _, row in self.system.payment_table.items()))
+
+    def test_payment_ids_parsed_at_api_boundary(self):
+        self.system.create_account(1, 'account1')
+        self.system.create_account(2, 'account2')
+        self.system.deposit(3, 'account1', 1000)
+        self.assertEqual(self.system.pay(4, 'account1', 100), 'payment1')
+        self.assertEqual(list(self.system.payments['account1']), [1])
+        for payment in ('payment01', 'payment', 'payment1 ', 'payment-1', 'payment0', 'Payment1', 'payment\u0661', 'payment2'):
+            self.assertIsNone(self.system.get_payment_status(5, 'account1', payment))
+        self.assertIsNone(self.system.get_payment_status(6, 'account2', 'payment1'))
+        self.assertEqual(self.system.get_payment_status(7, 'account1', 'payment1'), 'IN_PROGRESS')
+
+    def test_cashback_and_due_beyond_int64(self):
+        self.system.create_account(1, 'account1')
+        self.system.deposit(2, 'account1', 10 ** 21)
+        self.assertEqual(self.system.pay(3, 'account1', 10 ** 21), 'payment1')
+        self.assertEqual(self.system.payment_table.row(1), ('account1', 2 * 10 ** 19, 3 + 86400000, False))
+        self.assertEqual(self.system.pay(2 ** 63 - 1, 'account1', 0), 'payment2')
+        self.assertEqual(self.system.payment_table.row(2)[2], 2 ** 63 - 1 + 86400000)
+        self.assertEqual(self.system.deposit(2 ** 63 - 1, 'account1', 0), 2 * 10 ** 19)
+        self.assertEqual(self.system.get_payment_status(2 ** 63, 'account1', 'payment1'), 'CASHBACK_RECEIVED')
+        self.assertEqual(self.system.get_payment_status(2 ** 63, 'account1', 'payment2'), 'IN_PROGRESS')
+
+    def test_invalid_classes_and_policies(self):
+        self.system.create_account(1, 'account1')
+        self.assertFalse(self.system.set_account_class('missing', 'premium'))
+        with self.assertRaises(ValueError):
+            self.system.set_account_class('account1', 'gold')
+        with self.assertRaises(ValueError):
+            CashbackPolicy(delay=0)
+        with self.assertRaises(ValueError):
+            CashbackPolicy(rate_bps=-1)
@@ -0,0 +1,98 @@
+import os
+from array import array
+import tempfile
+import unittest
+
+import banking_checkpoint
+import banking_replay
+from banking_cashback import CashbackPolicy
+from banking_system_impl import BankingSystemImpl
+from replay_tests import random_operations
+
+
+class CheckpointTests(unittest.TestCase):
+    """
+    Tests for dirty tracking, incremental checkpoints and compaction.
+    A system loaded from a checkpoint directory must match the live system.
+    """
+
+    failureException = Exception
+
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+        self.system = BankingSystemImpl()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _assert_loaded_matches(self):
+        loaded = banking_checkpoint.load_system(self.directory)
+        self.assertEqual(banking_replay.state_bytes(loaded), banking_replay.state_bytes(self.system))
+
+    def test_checkpoint_writes_only_dirty_accounts(self):
+        for i in range(100):
+            self.system.create_account(i + 1, f"account{i}")
+        checkpointer = banking_checkpoint.Checkpointer(self.system, self.directory)
+        self.assertEqual(checkpointer.checkpoint(), 0)
+
+        self.system.deposit(200, "account1", 500)
+        self.system.pay(201, "account1", 100)
+        checkpointer.checkpoint()
+        delta = banking_checkpoint._read(os.path.join(self.directory, "delta-00000001.pkl"))
+        self.assertEqual(set(delta["accounts"]), {"account1"})
+        self.assertEqual(delta["records"]["account1"][0], 1)
+        self.assertEqual(delta["payments"]["account1"], (0, array('q', [1])))
+        self.assertEqual(delta["payment_rows"], {1: ('account1', 2, 201 + 86400000, False)})
+        self._assert_loaded_matches()
+
+    def test_incremental_checkpoints_and_compaction(self):
+        operations = random_operations(3, 400)
+        checkpointer = banking_checkpoint.Checkpointer(self.system, self.directory)
+        for i in range(0, len(operations), 50):
+            banking_replay.replay(self.system, operations[i:i + 50])
+            checkpointer.checkpoint()
+            self._assert_loaded_matches()
+
+        self.assertGreater(banking_checkpoint.compact(self.directory), 0)
+        self.assertEqual(banking_checkpoint._delta_files(self.directory), [])
+        self._assert_loaded_matches()
+
+    def test_resume_from_loaded_system(self):
+        operations = random_operations(4, 200)
+        checkpointer = banking_checkpoint.Checkpointer(self.system, self.directory)
+        banking_replay.replay(self.system, operations[:100])
+        checkpointer.close()
+
+        self.system = banking_checkpoint.load_system(self.directory)
+        checkpointer = banking_checkpoint.Checkpointer(self.system, self.directory)
+        banking_replay.replay(self.system, operations[100:])
+        checkpointer.checkpoint()
+        self._assert_loaded_matches()
+
+    def test_background_compactor(self):
+        checkpointer = banking_checkpoint.Checkpointer(self.system, self.directory)
+        compactor = banking_checkpoint.Compactor(self.directory, interval=0.01)
+        compactor.start()
+        banking_replay.replay(self.system, random_operations(5, 200))
+        checkpointer.checkpoint()
+        compactor.stop()
+        self.assertEqual(banking_checkpoint._delta_files(self.directory), [])
+        self._assert_loaded_matches()
+
+    def test_account_classes_and_pending_cashback(self):
+        checkpointer = banking_checkpoint.Checkpointer(self.system, self.directory)
+        self.system.register_cashback_policy('premium', CashbackPolicy(rate_bps=500, delay=1000))
+        self.system.create_account(1, 'account1')
+        self.system.set_account_class('account1', 'premium')
+        self.system.deposit(2, 'account1', 1000)
+        self.system.pay(3, 'account1', 1000)
+        checkpointer.checkpoint()
+        self._assert_loaded_matches()
+
+        # The restored system still refunds the pending cashback
+        loaded = banking_checkpoint.load_system(self.directory)
+        self.assertEqual(loaded.deposit(1003, 'account1', 0), 50)
+        self.assertEqual(loaded.pay(1004, 'account1', 20), 'payment2')
+        self.assertEqual(loaded.payment_table.row(2), ('account1', 1, 1004 + 1000, False))
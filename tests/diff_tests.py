@@ -0,0 +1,77 @@
+import unittest
+
+import banking_diff
+from banking_cashback import CashbackPolicy
+from banking_sqlite import SQLiteBankingSystem
+from banking_storage import ArrayStorage
+from banking_system_impl import BankingSystemImpl
+
+
+class IgnoresMergedAccounts(BankingSystemImpl):
+    """Deposits to a merged account go to the account it was merged into"""
+
+    def _is_merged_account(self, account_id):
+        return False
+
+
+class LatestHistoryOnly(BankingSystemImpl):
+    """get_balance that ignores merge times and pre-merge histories"""
+
+    def get_balance(self, timestamp, account_id, time_at):
+        self._process_cashback(time_at)
+        account_id = self._resolve(account_id)
+        if account_id not in self.accounts_dict or time_at < self.accounts_dict[account_id]["time"]:
+            return None
+        return self._binary_search_record(self.record[account_id], time_at)
+
+
+class RoundedPolicy(CashbackPolicy):
+    def cashback(self, amount):
+        return round(amount * self.rate_bps / 10000)
+
+
+class RoundedCashback(BankingSystemImpl):
+    """Cashback rounded to the nearest unit instead of down"""
+
+    def _cashback_policy(self, account_id):
+        return RoundedPolicy()
+
+
+class DiffTests(unittest.TestCase):
+    """
+    Tests for the differential harness: equivalent engines pass, subtly
+    broken ones are found and shrunk to a short reproduction.
+    """
+
+    failureException = Exception
+
+
+    def test_equivalent_engines_pass(self):
+        self.assertIsNone(banking_diff.fuzz(SQLiteBankingSystem, seeds=range(10)))
+        self.assertIsNone(banking_diff.fuzz(lambda: BankingSystemImpl(storage=ArrayStorage()), seeds=range(10)))
+
+    def test_broken_engines_are_shrunk(self):
+        for engine in (IgnoresMergedAccounts, LatestHistoryOnly, RoundedCashback):
+            trace = banking_diff.fuzz(engine)
+            self.assertIsNotNone(trace, engine.__name__)
+            self.assertLessEqual(len(trace), 6, engine.__name__)
+            divergence = banking_diff.compare(trace, engine)
+            self.assertEqual(divergence.index, len(trace) - 1)
+            # Every remaining operation is needed
+            for i in range(len(trace)):
+                self.assertIsNone(banking_diff.compare(trace[:i] + trace[i + 1:], engine), engine.__name__)
+
+    def test_exceptions_are_divergences(self):
+        class Crashes(BankingSystemImpl):
+            def top_spenders(self, timestamp, n):
+                raise KeyError(n)
+
+        divergence = banking_diff.compare([("create_account", 1, "account1"), ("top_spenders", 2, 1)], Crashes)
+        self.assertEqual(divergence.index, 1)
+        self.assertIsInstance(divergence.actual, KeyError)
+
+    def test_format_trace(self):
+        trace = [("create_account", 1, "account1"), ("create_account", 2, "account2"),
+                 ("merge_accounts", 3, "account1", "account2"), ("deposit", 4, "account2", 10)]
+        self.assertEqual(banking_diff.format_trace(trace, IgnoresMergedAccounts).splitlines()[-1],
+                         "system.deposit(4, 'account2', 10)  # expected None, got 10")
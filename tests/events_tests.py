@@ -0,0 +1,134 @@
+import threading
+import unittest
+
+import banking_events
+from banking_events import AccountCreated, AccountsMerged, BalanceChanged, CashbackRefunded, PaymentMade
+from banking_system_impl import BankingSystemImpl
+
+
+class EventsTests(unittest.TestCase):
+    """
+    Tests for the change-event stream of BankingSystemImpl.
+    """
+
+    failureException = Exception
+
+
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl()
+        cls.events = []
+        cls.system.enable_events().subscribe(cls.events.append)
+
+    def test_events_follow_operations(self):
+        self.system.create_account(1, 'account1')
+        self.system.create_account(2, 'account2')
+        self.system.deposit(3, 'account1', 1000)
+        self.system.transfer(4, 'account1', 'account2', 100)
+        self.system.pay(5, 'account1', 500)
+        self.system.merge_accounts(6, 'account1', 'account2')
+        self.system.deposit(5 + 86400000, 'account1', 0)
+        expected = [
+            AccountCreated(1, 'account1'),
+            AccountCreated(2, 'account2'),
+            BalanceChanged(3, 'account1', 1000),
+            BalanceChanged(4, 'account1', 900),
+            BalanceChanged(4, 'account2', 100),
+            BalanceChanged(5, 'account1', 400),
+            PaymentMade(5, 'account1', 'payment1', 500, 10, 5 + 86400000),
+            AccountsMerged(6, 'account1', 'account2'),
+            BalanceChanged(6, 'account1', 500),
+            CashbackRefunded(5 + 86400000, 'account1', 'payment1', 10),
+            BalanceChanged(5 + 86400000, 'account1', 510),
+            BalanceChanged(5 + 86400000, 'account1', 510),
+        ]
+        self.assertEqual(self.events, expected)
+
+    def test_failed_operations_publish_nothing(self):
+        self.system.create_account(1, 'account1')
+        self.assertFalse(self.system.create_account(2, 'account1'))
+        self.assertIsNone(self.system.pay(3, 'account1', 10))
+        self.assertIsNone(self.system.deposit(4, 'missing', 10))
+        self.assertEqual(self.events, [AccountCreated(1, 'account1')])
+
+    def test_bulk_events_match_scalar(self):
+        scalar = BankingSystemImpl()
+        scalar_events = []
+        scalar.enable_events().subscribe(scalar_events.append)
+        ids = ['account1', 'account2', 'account1', 'account2']
+        for system in (self.system, scalar):
+            system.create_account(1, 'account1')
+            system.create_account(2, 'account2')
+        self.system.deposit_many(3, ids, [100, 200, 300, 400])
+        self.system.pay_many(4, ids, [300, 700, 200, 10])
+        for account_id, amount in zip(ids, [100, 200, 300, 400]):
+            scalar.deposit(3, account_id, amount)
+        for account_id, amount in zip(ids, [300, 700, 200, 10]):
+            scalar.pay(4, account_id, amount)
+        self.assertEqual(self.events, scalar_events)
+
+    def test_ring_buffer_drop_oldest(self):
+        buffer = self.system._events.ring_buffer(capacity=2)
+        for i in range(4):
+            self.system.create_account(i + 1, f'account{i}')
+        self.assertEqual(buffer.dropped, 2)
+        self.assertEqual(buffer.poll(), [AccountCreated(3, 'account2'), AccountCreated(4, 'account3')])
+        self.assertEqual(buffer.poll(), [])
+
+    def test_ring_buffer_drop_newest_and_error(self):
+        newest = self.system._events.ring_buffer(capacity=1, backpressure=banking_events.DROP_NEWEST)
+        self.system.create_account(1, 'account1')
+        self.system.create_account(2, 'account2')
+        self.assertEqual(newest.poll(), [AccountCreated(1, 'account1')])
+        newest.close()
+
+        self.system._events.ring_buffer(capacity=1, backpressure=banking_events.ERROR)
+        self.system.create_account(3, 'account3')
+        with self.assertRaises(banking_events.BufferFullError):
+            self.system.create_account(4, 'account4')
+        self.assertFalse(self.system.create_account(5, 'account4'))
+
+    def test_raising_subscriber_leaves_operation_applied(self):
+        self.system.create_account(1, 'account1')
+        self.system.create_account(2, 'account2')
+        self.system.deposit(3, 'account1', 1000)
+        self.system._events.ring_buffer(capacity=1, backpressure=banking_events.ERROR)
+        with self.assertRaises(banking_events.BufferFullError):
+            self.system.transfer(4, 'account1', 'account2', 10)
+        # Both balances, both histories and the outgoing total, every subscriber got every event
+        self.assertEqual(self.system.get_balance(5, 'account1', 4), 990)
+        self.assertEqual(self.system.get_balance(5, 'account2', 4), 10)
+        self.assertEqual(self.system.top_spenders(5, 1), ['account1(10)'])
+        self.assertEqual(self.events[-2:], [BalanceChanged(4, 'account1', 990), BalanceChanged(4, 'account2', 10)])
+
+        def fail(event):
+            raise RuntimeError("subscriber failed")
+
+        self.system._events.subscribe(fail)
+        with self.assertRaises(RuntimeError):
+            self.system.pay(6, 'account1', 100)
+        self.assertEqual(self.system.get_payment_status(7, 'account1', 'payment1'), "IN_PROGRESS")
+        self.assertEqual(self.system.top_spenders(7, 1), ['account1(110)'])
+        self.assertEqual(self.events[-2:], [BalanceChanged(6, 'account1', 890),
+                                            PaymentMade(6, 'account1', 'payment1', 100, 2, 6 + 86400000)])
+
+    def test_ring_buffer_block_waits_for_consumer(self):
+        buffer = self.system._events.ring_buffer(capacity=1, backpressure=banking_events.BLOCK, timeout=5)
+        received = []
+
+        def consume():
+            for _ in range(3):
+                received.append(buffer.get(timeout=5))
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        for i in range(3):
+            self.system.create_account(i + 1, f'account{i}')
+        consumer.join()
+        self.assertEqual([event.account_id for event in received], ['account0', 'account1', 'account2'])
+
+    def test_invalid_ring_buffer(self):
+        with self.assertRaises(ValueError):
+            self.system._events.ring_buffer(capacity=0)
+        with self.assertRaises(ValueError):
+            self.system._events.ring_buffer(backpressure='wait')
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import banking_export
+from banking_replay import replay
+from banking_storage import ArrayStorage
+from banking_storage_sqlite import SQLiteStorage
+from banking_system_impl import BankingSystemImpl
+from banking_workload import WorkloadConfig, generate
+
+
+class ExportTests(unittest.TestCase):
+    """
+    Tests for the streaming columnar export: exported rows equal the state,
+    chunks stay within their size and interrupted exports resume.
+    """
+
+    failureException = Exception
+
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+        self.operations = generate(WorkloadConfig(operations=3000, accounts=100, merge_storms=0.2))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _system(self, storage=None) -> BankingSystemImpl:
+        system = BankingSystemImpl(storage=storage)
+        replay(system, self.operations)
+        return system
+
+    def _expected(self, system: BankingSystemImpl) -> dict[str, list[tuple]]:
+        return {
+            'history': [(account_id, *entry) for account_id, entries in system.record.items() for entry in entries],
+            'merged_history': [(account_id, *entry) for account_id, entries in system.merged_history.items()
+                               for entry in entries],
+            'payments': [(account_id, payment_id, *system.payment_table.row(payment_id)[1:3],
+                          int(system.payment_table.row(payment_id)[3]))
+                         for account_id, payment_ids in system.payments.items() for payment_id in payment_ids],
+            'merges': [(account_id, *entry) for account_id, log in system.merge_log.items() for entry in log],
+        }
+
+    def _exported(self, directory: str) -> dict[str, list[tuple]]:
+        return {table: list(banking_export.read_rows(directory, table)) for table in banking_export.TABLES}
+
+    def test_export_equals_state(self):
+        for name, storage in (('dict', None), ('array', ArrayStorage()), ('sqlite', SQLiteStorage(':memory:'))):
+            system = self._system(storage)
+            directory = os.path.join(self.directory, name)
+            counts = banking_export.export(system, directory, chunk_rows=500, file_format='native')
+            expected = self._expected(system)
+            self.assertEqual(self._exported(directory), expected)
+            self.assertEqual(counts, {table: len(rows) for table, rows in expected.items()})
+            self.assertTrue(all(counts.values()))
+            # Recreated accounts have no merge target
+            self.assertIn(None, [row[2] for row in expected['merges']])
+
+    def test_chunks_are_bounded(self):
+        system = self._system()
+        counts = banking_export.export(system, self.directory, chunk_rows=256, file_format='native')
+        manifest = banking_export.load_manifest(self.directory)
+        for table, count in counts.items():
+            chunks = list(banking_export.read_chunks(self.directory, table))
+            self.assertEqual(len(chunks), manifest['tables'][table]['chunks'])
+            self.assertEqual(len(chunks), -(-count // 256))
+            self.assertTrue(all(len(chunk['account_id']) <= 256 for chunk in chunks))
+
+        # Exporting a finished directory again writes nothing
+        self.assertEqual(banking_export.export(system, self.directory), counts)
+
+    def test_resume_after_interruption(self):
+        system = self._system()
+        full = os.path.join(self.directory, 'full')
+        banking_export.export(system, full, chunk_rows=200, file_format='native')
+
+        resumed = os.path.join(self.directory, 'resumed')
+        for failing_call in (2, 5, 6):
+            write = banking_export.write_chunk
+            calls = []
+
+            def interrupted(*args):
+                calls.append(args)
+                if len(calls) == failing_call:
+                    raise OSError('disk full')
+                write(*args)
+
+            with mock.patch.object(banking_export, 'write_chunk', interrupted), self.assertRaises(OSError):
+                banking_export.export(system, resumed, chunk_rows=200, file_format='native')
+        # The chunk size and format of the manifest are kept
+        banking_export.export(system, resumed, chunk_rows=10, file_format='parquet')
+        self.assertEqual(self._exported(resumed), self._exported(full))
+        self.assertEqual(banking_export.load_manifest(resumed), banking_export.load_manifest(full))
+
+    def test_chunk_format(self):
+        path = os.path.join(self.directory, 'chunk.bkex')
+        columns = (('name', banking_export.STRING), ('value', banking_export.INT))
+        banking_export.write_chunk(path, columns, [['kontö', None, '', '口座'], [1, -2, 3, 2 ** 62]])
+        chunk = banking_export.read_chunk(path)
+        self.assertEqual((chunk['name'], list(chunk['value'])), (['kontö', None, '', '口座'], [1, -2, 3, 2 ** 62]))
+
+        with open(path, 'rb') as file:
+            data = file.read()
+        with open(path, 'wb') as file:
+            file.write(data[:-9])
+        with self.assertRaises(ValueError):
+            banking_export.read_chunk(path)
@@ -0,0 +1,91 @@
+import unittest
+
+import banking_replay
+from banking_cashback import CashbackPolicy
+from banking_system_impl import BankingSystemImpl
+from replay_tests import random_operations
+
+
+def continuation(seed: int, count: int, after: int) -> list[tuple]:
+    """random_operations without the account creation, shifted to start after timestamp `after`"""
+    operations = []
+    for op in random_operations(seed, count)[40:]:
+        op = (op[0], op[1] + after) + op[2:]
+        if op[0] == "get_balance":
+            op = op[:3] + (op[3] + after,)
+        operations.append(op)
+    return operations
+
+
+class ForkTests(unittest.TestCase):
+    """
+    Tests for fork(): parent and fork share state until they write,
+    and then behave like two independent systems.
+    """
+
+    failureException = Exception
+
+
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl()
+
+    def _assert_same_as_replay(self, system: BankingSystemImpl, operations: list[tuple]):
+        expected = BankingSystemImpl()
+        banking_replay.replay(expected, operations)
+        self.assertEqual(banking_replay.state_bytes(system), banking_replay.state_bytes(expected))
+
+    def test_fork_shares_state_until_written(self):
+        self.system.create_account(1, 'account1')
+        self.system.create_account(2, 'account2')
+        self.system.deposit(3, 'account1', 100)
+        child = self.system.fork()
+        self.assertIs(child.record, self.system.record)
+        self.assertIs(child.payment_table, self.system.payment_table)
+
+        self.assertEqual(child.deposit(4, 'account1', 50), 150)
+        self.assertEqual(self.system.get_balance(5, 'account1', 4), 100)
+        self.assertEqual(child.get_balance(5, 'account1', 4), 150)
+        # Untouched accounts are still shared
+        self.assertIs(child.record['account2'], self.system.record['account2'])
+        self.assertIsNot(child.record['account1'], self.system.record['account1'])
+
+    def test_diverging_forks_match_independent_replays(self):
+        operations = random_operations(21, 300)
+        banking_replay.replay(self.system, operations)
+        end = operations[-1][1]
+        child = self.system.fork()
+        grandchild = child.fork()
+
+        ops_parent = continuation(22, 200, end)
+        ops_child = continuation(23, 200, end)
+        ops_grandchild = continuation(24, 200, end)
+        banking_replay.replay(child, ops_child)
+        banking_replay.replay(self.system, ops_parent)
+        banking_replay.replay(grandchild, ops_grandchild)
+
+        self._assert_same_as_replay(self.system, operations + ops_parent)
+        self._assert_same_as_replay(child, operations + ops_child)
+        self._assert_same_as_replay(grandchild, operations + ops_grandchild)
+
+    def test_what_if_merge_and_pending_cashback(self):
+        self.system.register_cashback_policy('premium', CashbackPolicy(rate_bps=500, delay=1000))
+        for i in range(4):
+            self.system.create_account(i + 1, f'account{i}')
+            self.system.deposit(10 + i, f'account{i}', 1000)
+        self.system.set_account_class('account0', 'premium')
+        self.system.pay(20, 'account0', 1000)
+        self.system.pay(21, 'account1', 1000)
+
+        child = self.system.fork()
+        self.assertTrue(child.merge_accounts(30, 'account2', 'account0'))
+        child.set_account_class('account2', 'premium')
+        self.assertEqual(child.deposit(1020, 'account2', 0), 1050)
+        self.assertEqual(child.get_payment_status(1021, 'account2', 'payment1'), 'CASHBACK_RECEIVED')
+
+        self.assertEqual(self.system.deposit(1020, 'account0', 0), 50)
+        self.assertEqual(self.system.get_payment_status(1021, 'account0', 'payment1'), 'CASHBACK_RECEIVED')
+        self.assertIsNone(self.system.get_payment_status(1022, 'account2', 'payment1'))
+        self.assertEqual(self.system.account_classes, {'account0': 'premium'})
+        self.assertEqual(self.system.top_spenders(1023, 2), ['account0(1000)', 'account1(1000)'])
+        self.assertEqual(child.top_spenders(1023, 2), ['account1(1000)', 'account2(1000)'])
@@ -0,0 +1,81 @@
+import unittest
+
+import banking_diff
+import banking_replay
+from banking_system_impl import BankingSystemImpl
+from replay_tests import random_operations
+
+
+class ScanningMergeTimes(BankingSystemImpl):
+    """get_balance as it was: checks every merged account for one that resolves to account_id"""
+
+    def _latest_merge_into(self, account_id):
+        return max((mt for merged_id, mt in self.merge_times.items() if self._resolve(merged_id) == account_id), default=None)
+
+
+class LineageTests(unittest.TestCase):
+    """
+    Tests for the merge forest: lineage(), absorbed_into() and merge checks in get_balance.
+    """
+
+    failureException = Exception
+
+
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl()
+        for i, account_id in enumerate(('a', 'b', 'c', 'd'), start=1):
+            cls.system.create_account(i, account_id)
+        cls.system.merge_accounts(10, 'b', 'c')
+        cls.system.merge_accounts(20, 'a', 'b')
+
+    def test_lineage(self):
+        self.assertEqual(self.system.lineage('a'), [('b', 'a', 20), ('c', 'b', 10)])
+        self.assertEqual(self.system.lineage('d'), [])
+        self.assertIsNone(self.system.lineage('b'))
+        self.assertIsNone(self.system.lineage('unknown'))
+
+        # A recreated account starts a new lineage, the old incarnation stays in a's
+        self.system.create_account(30, 'b')
+        self.assertEqual(self.system.lineage('b'), [])
+        self.system.merge_accounts(40, 'd', 'a')
+        self.system.merge_accounts(50, 'd', 'b')
+        self.assertEqual(self.system.lineage('d'), [('a', 'd', 40), ('b', 'a', 20), ('c', 'b', 10), ('b', 'd', 50)])
+
+    def test_absorbed_into(self):
+        self.assertIsNone(self.system.absorbed_into('c', 9))
+        self.assertEqual(self.system.absorbed_into('c', 10), 'b')
+        self.assertEqual(self.system.absorbed_into('c', 19), 'b')
+        self.assertEqual(self.system.absorbed_into('c', 20), 'a')
+        self.assertIsNone(self.system.absorbed_into('b', 19))
+        self.assertEqual(self.system.absorbed_into('b', 20), 'a')
+        self.assertIsNone(self.system.absorbed_into('a', 20))
+        self.assertIsNone(self.system.absorbed_into('unknown', 20))
+
+        # Recreating b doesn't pull c back, the old b's funds stay in a
+        self.system.create_account(30, 'b')
+        self.system.merge_accounts(40, 'd', 'a')
+        self.assertIsNone(self.system.absorbed_into('b', 30))
+        self.assertEqual(self.system.absorbed_into('b', 29), 'a')
+        self.assertEqual(self.system.absorbed_into('c', 39), 'a')
+        self.assertEqual(self.system.absorbed_into('c', 40), 'd')
+        self.assertTrue(self.system.create_account(45, 'c'))
+        self.assertTrue(self.system.merge_accounts(50, 'c', 'b'))
+        self.assertEqual(self.system.absorbed_into('b', 50), 'c')
+        self.assertEqual(self.system.absorbed_into('c', 44), 'd')
+        self.assertIsNone(self.system.absorbed_into('c', 45))
+
+    def test_get_balance_matches_scan(self):
+        self.assertIsNone(banking_diff.fuzz(ScanningMergeTimes, seeds=range(30)))
+        for seed in (1, 2, 3):
+            operations = banking_diff.with_probes(random_operations(seed, 800, accounts=10, cluster=5))
+            self.assertIsNone(banking_diff.compare(operations, ScanningMergeTimes))
+
+    def test_rollback_restores_lineage(self):
+        before = banking_replay.state_bytes(self.system)
+        self.system.begin()
+        self.system.create_account(30, 'b')
+        self.system.merge_accounts(40, 'd', 'a')
+        self.system.rollback()
+        self.assertEqual(banking_replay.state_bytes(self.system), before)
+        self.assertEqual(self.system.lineage('a'), [('b', 'a', 20), ('c', 'b', 10)])
@@ -0,0 +1,122 @@
+import csv
+import gc
+import os
+import tempfile
+import unittest
+
+import banking_loader
+from banking_replay import state_bytes
+from banking_storage import ArrayStorage
+from banking_system_impl import BankingSystemImpl
+
+
+class LoaderTests(unittest.TestCase):
+    """
+    Tests for bulk account provisioning: the state equals create_account and
+    deposit per row, from lists, CSV and columnar files.
+    """
+
+    failureException = Exception
+
+    DAY = 86400000
+
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+        self.account_ids = [f'account{i}' for i in range(500)]
+        self.timestamps = [10 + i // 7 for i in range(500)]
+        self.balances = [(i * 37) % 5 * 100 for i in range(500)]
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _per_call(self, system: BankingSystemImpl, account_ids, timestamps, balances) -> BankingSystemImpl:
+        for account_id, timestamp, balance in zip(account_ids, timestamps, balances):
+            system.create_account(timestamp, account_id)
+            if balance:
+                system.deposit(timestamp, account_id, balance)
+        return system
+
+    def _assert_same(self, make, account_ids, timestamps, balances):
+        expected = self._per_call(make(), account_ids, timestamps, balances)
+        system = make()
+        created = system.load_accounts(account_ids, timestamps, balances)
+        self.assertEqual(created, len(expected.accounts_dict) - len(make().accounts_dict))
+        self.assertEqual(state_bytes(system), state_bytes(expected))
+
+    def test_same_state_as_per_call(self):
+        for storage in (None, ArrayStorage()):
+            self._assert_same(lambda: BankingSystemImpl(storage=storage), self.account_ids, self.timestamps, self.balances)
+        self.assertTrue(gc.isenabled())
+
+    def test_existing_merged_and_repeated_ids(self):
+        def make():
+            system = BankingSystemImpl()
+            for i in range(3):
+                system.create_account(1, f'account{i}')
+                system.deposit(2, f'account{i}', 100)
+            system.merge_accounts(3, 'account0', 'account1')
+            return system
+
+        # account0 exists, account1 was merged, account5 comes twice
+        account_ids = ['account0', 'account1', 'account5', 'account5', 'account6']
+        self._assert_same(make, account_ids, [5, 6, 7, 8, 9], [10, 20, 30, 40, 0])
+
+    def test_pending_cashback_and_hooks(self):
+        def make():
+            system = BankingSystemImpl()
+            system.create_account(1, 'payer')
+            system.deposit(2, 'payer', 10000)
+            system.pay(3, 'payer', 1000)
+            system.pay(4 + self.DAY // 2, 'payer', 1000)
+            return system
+
+        # The refunds become due in the middle of the rows
+        timestamps = [self.DAY - 10 + i * (self.DAY // 100) for i in range(100)]
+        self._assert_same(make, self.account_ids[:100], timestamps, self.balances[:100])
+
+        events = []
+        system = make()
+        system.enable_events().subscribe(events.append)
+        system.load_accounts(self.account_ids[:100], timestamps, self.balances[:100])
+        expected = []
+        other = make()
+        other.enable_events().subscribe(expected.append)
+        self._per_call(other, self.account_ids[:100], timestamps, self.balances[:100])
+        self.assertEqual(events, expected)
+
+        with self.assertRaises(ValueError):
+            system.load_accounts(['a', 'b'], [1], [1, 2])
+
+    def test_csv(self):
+        expected = state_bytes(self._per_call(BankingSystemImpl(), self.account_ids, self.timestamps, self.balances))
+        for header in (True, False):
+            path = os.path.join(self.directory, f'{header}.csv')
+            with open(path, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                if header:
+                    writer.writerow(banking_loader.CSV_HEADER)
+                writer.writerows(zip(self.account_ids, self.timestamps, self.balances))
+            system = BankingSystemImpl()
+            self.assertEqual(banking_loader.load_csv(system, path), 500)
+            self.assertEqual(state_bytes(system), expected)
+
+    def test_columnar(self):
+        path = os.path.join(self.directory, 'accounts.columnar')
+        banking_loader.write_columnar(path, self.account_ids, self.timestamps, self.balances)
+        system = BankingSystemImpl()
+        self.assertEqual(banking_loader.load_columnar(system, path), 500)
+        self.assertEqual(state_bytes(system), state_bytes(self._per_call(BankingSystemImpl(), self.account_ids, self.timestamps, self.balances)))
+
+        account_ids = ['kontö', 'a', '', '口座']
+        banking_loader.write_columnar(path, account_ids, [1, 2, 3, 4], [5, 6, 7, -8])
+        ids, timestamps, balances = banking_loader.read_columnar(path)
+        self.assertEqual((ids, list(timestamps), list(balances)), (account_ids, [1, 2, 3, 4], [5, 6, 7, -8]))
+
+        with open(path, 'rb') as file:
+            data = file.read()
+        with open(path, 'wb') as file:
+            file.write(data[:-1])
+        with self.assertRaises(ValueError):
+            banking_loader.read_columnar(path)
@@ -0,0 +1,102 @@
+import contextlib
+import io
+import unittest
+
+import banking_memory
+from banking_replay import replay
+from banking_storage import ArrayStorage
+from banking_storage_sqlite import SQLiteStorage
+from banking_system_impl import BankingSystemImpl
+from banking_workload import WorkloadConfig, generate
+
+
+class MemoryTests(unittest.TestCase):
+    """
+    Tests for the memory profiler: per-structure footprints, measured costs,
+    growth projection and the capacity planner.
+    """
+
+    failureException = Exception
+
+
+    @classmethod
+    def setUp(cls):
+        cls.config = WorkloadConfig(operations=8000, accounts=200, merge_storms=0.2)
+        cls.operations = generate(cls.config)
+
+    def test_footprint(self):
+        for storage in (None, ArrayStorage()):
+            system = BankingSystemImpl(storage=storage)
+            replay(system, self.operations)
+            sizes = banking_memory.footprint(system)
+            self.assertEqual(tuple(sizes), banking_memory.STRUCTURES)
+            self.assertEqual(sum(size.bytes for size in sizes.values()),
+                             banking_memory.deep_size([getattr(system, name) for name in sizes], set())
+                             - banking_memory.deep_size([None] * len(sizes), set()))
+            self.assertEqual(sizes['accounts_dict'].keys, len(system.accounts_dict))
+            self.assertEqual(sizes['record'].entries, sum(map(len, system.record.values())))
+            self.assertEqual(sizes['aliases'].keys, len(system.aliases))
+            self.assertGreater(sizes['aliases'].keys, 0)
+
+        with self.assertRaises(ValueError):
+            banking_memory.footprint(BankingSystemImpl(storage=SQLiteStorage(':memory:')))
+
+    def test_projection_predicts_growth(self):
+        costs = banking_memory.measure_costs(config=WorkloadConfig(operations=4000, accounts=200))
+        self.assertGreater(costs['record'].per_entry, 0)
+        # Merge storms make the growth uneven, the default share of them is steady enough to project
+        config = WorkloadConfig(operations=8000, accounts=200)
+        operations = generate(config)
+        setup = 2 * config.accounts
+        middle = (setup + len(operations)) // 2
+
+        system = BankingSystemImpl()
+        replay(system, operations[:setup])
+        before = banking_memory.footprint(system)
+        replay(system, operations[setup:middle])
+        now = banking_memory.footprint(system)
+        replay(system, operations[middle:])
+        after = banking_memory.footprint(system)
+
+        rates = banking_memory.observed_rates(before, now, middle - setup)
+        projected = banking_memory.project(now, rates, len(operations) - middle, costs)
+        actual = sum(size.bytes for size in after.values())
+        self.assertLess(abs(sum(projected.values()) - actual), 0.1 * actual)
+        self.assertEqual(banking_memory.project(now, rates, 0, costs), {name: size.bytes for name, size in now.items()})
+
+    def test_plan_predicts_larger_workload(self):
+        costs = banking_memory.measure_costs(config=WorkloadConfig(operations=4000, accounts=200))
+        # Twice the accounts and four times the operations of the sample
+        config = WorkloadConfig(operations=16000, accounts=400)
+        operations = generate(config)
+        system = BankingSystemImpl()
+        replay(system, operations)
+        actual = banking_memory.footprint(system)
+        days = (operations[-1][1] - operations[0][1]) / banking_memory.DAY
+
+        start, rates, (projected,) = banking_memory.plan(
+            WorkloadConfig(operations=4000, accounts=200), config.accounts,
+            [len(operations) - 2 * config.accounts], len(operations) / days, costs)
+        self.assertEqual(start['accounts_dict'].keys, config.accounts)
+        total = sum(size.bytes for size in actual.values())
+        self.assertLess(abs(sum(projected.values()) - total), 0.15 * total)
+
+        # Years ahead, account-keyed structures stop at the accounts and the
+        # wheel at the payments of one cashback delay
+        start, rates, (years,) = banking_memory.plan(
+            WorkloadConfig(operations=4000, accounts=200), config.accounts, [10 ** 9], 10 ** 6, costs)
+        limits = banking_memory.key_limits(config.accounts, rates, 10 ** 6)
+        self.assertLessEqual(years['outgoing'], start['outgoing'].bytes + costs['outgoing'].per_key * config.accounts + 1)
+        self.assertLessEqual(years['_cashback_wheel'],
+                             start['_cashback_wheel'].bytes + costs['_cashback_wheel'].per_key * limits['_cashback_wheel'] + 1)
+        self.assertAlmostEqual(limits['_cashback_wheel'], rates['payment_table'][0] * 10 ** 6, delta=1e-6)
+        self.assertGreater(years['record'], 100 * total)
+
+    def test_capacity_cli(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            banking_memory.main(['--accounts', '10000', '--operations-per-day', '100000', '--days', '1', '10',
+                                 '--memory-gib', '1'])
+        text = output.getvalue()
+        for name in ('accounts_dict', 'record', 'payments', 'merged_history', 'aliases', 'total', 'GiB lasts'):
+            self.assertIn(name, text)
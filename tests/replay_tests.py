@@ -0,0 +1,84 @@
+import random
+import unittest
+
+import banking_replay
+from banking_system_impl import BankingSystemImpl
+
+
+def random_operations(seed: int, count: int, accounts: int = 40, cluster: int = 5) -> list[tuple]:
+    """
+    Random operation batch with strictly increasing timestamps.
+    Transfers and merges stay inside clusters of `cluster` accounts, so the
+    batch splits into several conflict groups.
+    """
+    rng = random.Random(seed)
+    ids = [f"account{i}" for i in range(accounts)]
+    operations = [("create_account", i + 1, account_id) for i, account_id in enumerate(ids)]
+    timestamp = len(operations)
+    payments = 0
+    for _ in range(count):
+        timestamp += rng.choice([1, 1, 1000, 40000000])
+        kind = rng.random()
+        first = rng.randrange(0, accounts, cluster)
+        a, b = rng.sample(ids[first:first + cluster], 2)
+        if kind < 0.35:
+            operations.append(("deposit", timestamp, a, rng.randint(1, 1000)))
+        elif kind < 0.5:
+            operations.append(("transfer", timestamp, a, b, rng.randint(1, 500)))
+        elif kind < 0.7:
+            operations.append(("pay", timestamp, a, rng.randint(1, 500)))
+            payments += 1
+        elif kind < 0.78:
+            operations.append(("get_payment_status", timestamp, a, f"payment{rng.randint(1, payments + 1)}"))
+        elif kind < 0.84:
+            operations.append(("top_spenders", timestamp, rng.randint(1, 5)))
+        elif kind < 0.87:
+            operations.append(("merge_accounts", timestamp, a, b))
+        elif kind < 0.9:
+            operations.append(("create_account", timestamp, a))
+        else:
+            operations.append(("get_balance", timestamp, a, rng.randint(1, timestamp)))
+    return operations
+
+
+class ReplayTests(unittest.TestCase):
+    """
+    Tests for the conflict-graph replay scheduler.
+    Parallel replay must give the same results and state as serial replay.
+    """
+
+    failureException = Exception
+
+    def _assert_same_as_serial(self, operations: list[tuple], workers: int):
+        serial = BankingSystemImpl()
+        expected = banking_replay.replay(serial, operations)
+        results, system = banking_replay.replay_parallel(operations, workers=workers)
+        self.assertEqual(results, expected)
+        self.assertEqual(banking_replay.state_bytes(system), banking_replay.state_bytes(serial))
+
+    def test_conflict_groups_follow_account_footprint(self):
+        operations = [
+            ("create_account", 1, "a"),
+            ("create_account", 2, "b"),
+            ("create_account", 3, "c"),
+            ("transfer", 4, "a", "b", 10),
+            ("top_spenders", 5, 2),
+            ("deposit", 6, "c", 5),
+        ]
+        groups = sorted(banking_replay.conflict_groups(operations))
+        self.assertEqual(groups, [[0, 1, 3], [2, 5]])
+
+    def test_parallel_replay_inline(self):
+        self._assert_same_as_serial(random_operations(1, 300), workers=1)
+
+    def test_parallel_replay_process_pool(self):
+        for seed in range(3):
+            self._assert_same_as_serial(random_operations(seed, 300), workers=3)
+
+    def test_parallel_replay_without_status_queries(self):
+        operations = [op for op in random_operations(7, 300) if op[0] != "get_payment_status"]
+        self._assert_same_as_serial(operations, workers=2)
+
+    def test_unknown_operation(self):
+        with self.assertRaises(ValueError):
+            banking_replay.replay_parallel([("withdraw", 1, "a", 5)])
@@ -0,0 +1,104 @@
+import unittest
+
+import banking_diff
+import banking_replay
+import level_3_tests
+import level_4_tests
+from banking_system_impl import BankingSystemImpl
+from replay_tests import random_operations
+
+
+def deferred(start: bool):
+    def engine():
+        system = BankingSystemImpl()
+        system.enable_background_settlement(start)
+        return system
+    return engine
+
+
+# Level 3 and 4 with refunds only settled when a call touches the account
+
+class DeferredLevel3Tests(level_3_tests.Level3Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = deferred(False)()
+
+
+class DeferredLevel4Tests(level_4_tests.Level4Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = deferred(False)()
+
+
+class SettlementTests(unittest.TestCase):
+    """
+    Tests for background cashback settlement: deferred refunds give the
+    same results and state as inline processing, whoever applies them.
+    """
+
+    failureException = Exception
+
+    DAY = 86400000
+
+
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl()
+        cls.worker = cls.system.enable_background_settlement(start=False)
+        for i in range(3):
+            cls.system.create_account(i + 1, f'account{i}')
+            cls.system.deposit(10 + i, f'account{i}', 10000)
+        for i in range(3):
+            cls.system.pay(20 + i, f'account{i}', 1000)
+
+    def test_results_match_inline(self):
+        for start in (False, True):
+            self.assertIsNone(banking_diff.fuzz(deferred(start), seeds=range(20)), start)
+            for seed in (1, 2):
+                operations = banking_diff.with_probes(random_operations(seed, 600, accounts=10))
+                self.assertIsNone(banking_diff.compare(operations, deferred(start)), start)
+
+    def test_touched_accounts_settle_on_the_request_path(self):
+        # All three refunds became due at this call, only account0 is touched
+        self.assertEqual(self.system.deposit(self.DAY + 30, 'account0', 5), 9025)
+        # The due list is handed over as is, the worker groups it
+        self.assertEqual([len(entry[1]) for entry in self.worker._incoming], [3])
+        self.assertEqual(self.system.record['account1'][-1], (20 + 1, 9000))
+        self.assertEqual(self.system.deposit(self.DAY + 30, 'account0', 0), 9025)
+        self.assertEqual((self.worker.deferred, self.worker.settled_inline, self.worker.pending), (3, 1, 2))
+        self.assertEqual(self.system.top_spenders(self.DAY + 31, 1), ['account0(1000)'])
+        self.assertEqual(self.worker.pending, 2)
+
+        # The rest is applied with the timestamp of the call that found it due
+        self.assertEqual(self.worker.drain(), 2)
+        self.assertEqual(self.worker.settled_background, 2)
+        self.assertEqual(self.system.record['account1'][-1], (self.DAY + 30, 9020))
+        self.assertEqual(self.system.get_payment_status(self.DAY + 32, 'account2', 'payment3'), 'CASHBACK_RECEIVED')
+
+    def test_state_matches_inline(self):
+        operations = random_operations(3, 800, accounts=10)
+        inline, system = BankingSystemImpl(), deferred(False)()
+        banking_replay.replay(inline, operations)
+        banking_replay.replay(system, operations)
+        self.assertGreater(system._settlement.pending, 0)
+        self.assertEqual(banking_replay.state_bytes(system), banking_replay.state_bytes(inline))
+
+    def test_worker_thread(self):
+        worker = self.system.enable_background_settlement()
+        self.system.deposit(self.DAY + 30, 'account0', 5)
+        worker.stop()
+        self.assertEqual(worker.pending, 0)
+        self.assertEqual(worker.settled_inline + worker.settled_background, 3)
+        self.assertEqual([self.system.record[f'account{i}'][-1][0] for i in range(3)], [self.DAY + 30] * 3)
+
+    def test_fork_and_transactions_settle_first(self):
+        self.system.deposit(self.DAY + 30, 'account0', 5)
+        child = self.system.fork()
+        self.assertEqual(self.worker.pending, 0)
+        self.assertEqual(child.get_payment_status(self.DAY + 31, 'account1', 'payment2'), 'CASHBACK_RECEIVED')
+
+        # Refunds are inline while the system is forked or in a transaction
+        self.system.pay(self.DAY + 40, 'account1', 100)
+        self.system.deposit(2 * self.DAY + 50, 'account0', 1)
+        self.assertEqual(self.worker.pending, 0)
+        self.assertEqual(self.system.get_balance(2 * self.DAY + 51, 'account1', 2 * self.DAY + 50), 8922)
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+
+import banking_replay
+import banking_sqlite
+import level_1_tests
+import level_2_tests
+import level_3_tests
+import level_4_tests
+from banking_sqlite import SQLiteBankingSystem
+from banking_system_impl import BankingSystemImpl
+from replay_tests import random_operations
+
+
+# The level 1-4 suites once more on SQLiteBankingSystem
+
+class SQLiteSystemLevel1Tests(level_1_tests.Level1Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = SQLiteBankingSystem()
+
+
+class SQLiteSystemLevel2Tests(level_2_tests.Level2Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = SQLiteBankingSystem()
+
+
+class SQLiteSystemLevel3Tests(level_3_tests.Level3Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = SQLiteBankingSystem()
+
+
+class SQLiteSystemLevel4Tests(level_4_tests.Level4Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = SQLiteBankingSystem()
+
+
+class SQLiteSystemTests(unittest.TestCase):
+    """
+    Tests for SQLiteBankingSystem.
+    Results must match BankingSystemImpl, with or without batching.
+    """
+
+    failureException = Exception
+
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "bank.sqlite")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_matches_in_memory_system(self):
+        operations = random_operations(81, 1500)
+        expected = banking_replay.replay(BankingSystemImpl(), operations)
+        self.assertEqual(banking_replay.replay(SQLiteBankingSystem(), operations), expected)
+
+        system = SQLiteBankingSystem()
+        with system.batch():
+            self.assertEqual(banking_replay.replay(system, operations), expected)
+
+    def test_state_survives_reopen(self):
+        operations = random_operations(82, 400)
+        system = SQLiteBankingSystem(self.path)
+        with system.batch():
+            banking_replay.replay(system, operations[:200])
+        system.close()
+
+        reopened = SQLiteBankingSystem(self.path)
+        expected = banking_replay.replay(BankingSystemImpl(), operations)[200:]
+        self.assertEqual(banking_replay.replay(reopened, operations[200:]), expected)
+
+    def test_failed_batch_rolls_back(self):
+        system = SQLiteBankingSystem()
+        system.create_account(1, 'account1')
+        with self.assertRaises(ZeroDivisionError):
+            with system.batch():
+                system.deposit(2, 'account1', 100)
+                1 / 0
+        self.assertEqual(system.deposit(3, 'account1', 0), 0)
+
+    def test_merge_chains_match_in_memory_system(self):
+        operations = []
+        for i in range(6):
+            operations += [('create_account', 1 + i, f'account{i}'), ('deposit', 10 + i, f'account{i}', 100 * (i + 1))]
+        # account5 <- account4 <- ... <- account0, histories interleave at equal timestamps
+        for i in range(5):
+            operations += [('deposit', 20 + i, f'account{i}', 7), ('deposit', 20 + i, f'account{i + 1}', 3),
+                           ('merge_accounts', 30 + i, f'account{i + 1}', f'account{i}')]
+        operations += [('get_balance', 40, account_id, time_at)
+                       for account_id in ('account0', 'account2', 'account5') for time_at in range(1, 36)]
+        self.assertEqual(banking_replay.replay(SQLiteBankingSystem(), operations),
+                         banking_replay.replay(BankingSystemImpl(), operations))
+
+    def test_queries_use_indexes(self):
+        system = SQLiteBankingSystem()
+        plans = {
+            "get_balance": (banking_sqlite.BALANCE_AT, ("account1", 5)),
+            "pending cashback": (banking_sqlite.PENDING_CASHBACK, (5,)),
+            "top_spenders": (banking_sqlite.TOP_SPENDERS, (3,)),
+            "merged into after": (banking_sqlite.MERGED_INTO_AFTER, ("account1", 5)),
+        }
+        for name, (sql, parameters) in plans.items():
+            plan = " ".join(row[-1] for row in system.connection.execute("EXPLAIN QUERY PLAN " + sql, parameters))
+            self.assertIn("USING", plan, name)
+            self.assertNotIn("TEMP B-TREE", plan, name)
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import banking_replay
+from banking_system_impl import BankingSystemImpl
+from replay_tests import random_operations
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use only, a plain BankingSystemImpl must not import them
+LAZY_MODULES = ("numpy", "banking_bulk", "banking_checkpoint", "banking_events", "banking_replay", "banking_fork",
+                "banking_transaction", "dataclasses", "pickle", "threading", "concurrent")
+
+
+class StartupTests(unittest.TestCase):
+    """
+    Tests for cold start: lazy loading of optional subsystems and
+    construction from a prebuilt snapshot.
+    """
+
+    failureException = Exception
+
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "system.snapshot")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_plain_use_imports_no_optional_subsystem(self):
+        script = (
+            "import sys\n"
+            "from banking_system_impl import BankingSystemImpl\n"
+            "system = BankingSystemImpl()\n"
+            "system.create_account(1, 'account1')\n"
+            "system.deposit(2, 'account1', 100)\n"
+            "system.get_payment_status(3, 'account1', system.pay(3, 'account1', 10))\n"
+            "system.get_balance(4, 'account1', 3)\n"
+            f"print(sorted(m for m in sys.modules if m.split('.')[0] in {LAZY_MODULES!r}))\n"
+        )
+        output = subprocess.run([sys.executable, "-c", script], cwd=REPO, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "[]")
+
+    def test_from_snapshot_matches_and_continues(self):
+        operations = random_operations(51, 400)
+        system = BankingSystemImpl()
+        banking_replay.replay(system, operations[:200])
+        system.save_snapshot(self.path)
+
+        loaded = BankingSystemImpl.from_snapshot(self.path)
+        self.assertEqual(banking_replay.state_bytes(loaded), banking_replay.state_bytes(system))
+        # Pending cashback comes from the stored timer wheel
+        self.assertEqual(len(loaded._cashback_wheel), len(system._cashback_wheel))
+        self.assertEqual(banking_replay.replay(loaded, operations[200:]), banking_replay.replay(system, operations[200:]))
+        self.assertEqual(banking_replay.state_bytes(loaded), banking_replay.state_bytes(system))
+
+    def test_from_snapshot_keeps_subclass(self):
+        class MinuteBuckets(BankingSystemImpl):
+            OUTGOING_BUCKET_MS = 60000
+
+        BankingSystemImpl().save_snapshot(self.path)
+        self.assertIsInstance(MinuteBuckets.from_snapshot(self.path), MinuteBuckets)
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+
+import banking_replay
+import level_1_tests
+import level_2_tests
+import level_3_tests
+import level_4_tests
+from banking_storage import ArrayHistory, ArrayStorage
+from banking_storage_sqlite import SQLiteStorage
+from banking_system_impl import BankingSystemImpl
+from replay_tests import random_operations
+
+
+# The level 1-4 suites once more on each non-default backend
+
+class ArrayLevel1Tests(level_1_tests.Level1Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl(storage=ArrayStorage())
+
+
+class ArrayLevel2Tests(level_2_tests.Level2Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl(storage=ArrayStorage())
+
+
+class ArrayLevel3Tests(level_3_tests.Level3Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl(storage=ArrayStorage())
+
+
+class ArrayLevel4Tests(level_4_tests.Level4Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl(storage=ArrayStorage())
+
+
+class SQLiteLevel1Tests(level_1_tests.Level1Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl(storage=SQLiteStorage())
+
+
+class SQLiteLevel2Tests(level_2_tests.Level2Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl(storage=SQLiteStorage())
+
+
+class SQLiteLevel3Tests(level_3_tests.Level3Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl(storage=SQLiteStorage())
+
+
+class SQLiteLevel4Tests(level_4_tests.Level4Tests):
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl(storage=SQLiteStorage())
+
+
+class StorageTests(unittest.TestCase):
+    """
+    Tests for the storage backends of BankingSystemImpl.
+    Every backend must give the same results as the default dict backend.
+    """
+
+    failureException = Exception
+
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "bank.sqlite")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_backends_match_dict_backend(self):
+        operations = random_operations(71, 600)
+        expected = banking_replay.replay(BankingSystemImpl(), operations)
+        for storage in (ArrayStorage(), SQLiteStorage()):
+            self.assertEqual(banking_replay.replay(BankingSystemImpl(storage=storage), operations), expected, storage.name)
+
+    def test_sqlite_state_survives_reopen(self):
+        storage = SQLiteStorage(self.path)
+        system = BankingSystemImpl(storage=storage)
+        system.create_account(1, 'account1')
+        system.deposit(2, 'account1', 500)
+        self.assertEqual(system.pay(3, 'account1', 100), 'payment1')
+        storage.close()
+
+        reopened = BankingSystemImpl(storage=SQLiteStorage(self.path))
+        self.assertEqual(reopened.deposit(4, 'account1', 0), 400)
+        self.assertEqual(reopened.get_balance(5, 'account1', 2), 500)
+        self.assertEqual(reopened.top_spenders(6, 1), ['account1(100)'])
+        self.assertEqual(reopened.payment_table.row(1), ('account1', 2, 3 + 86400000, False))
+
+        # Payment ids continue and the cashback pending before the reopen is refunded
+        self.assertEqual(reopened.pay(7, 'account1', 50), 'payment2')
+        self.assertEqual(reopened.payment_table.row(1), ('account1', 2, 3 + 86400000, False))
+        self.assertEqual(reopened.get_payment_status(3 + 86400000, 'account1', 'payment1'), 'CASHBACK_RECEIVED')
+        self.assertEqual(reopened.get_balance(7 + 86400000, 'account1', 7 + 86400000), 400 - 50 + 2 + 1)
+        self.assertEqual(reopened.get_payment_status(8 + 86400000, 'account1', 'payment2'), 'CASHBACK_RECEIVED')
+
+    def test_array_history_behaves_like_list(self):
+        entries = [(3, 30), (1, 10), (2, 20)]
+        history = ArrayHistory(entries)
+        history.sort()
+        entries.sort()
+        self.assertEqual(history, entries)
+        self.assertEqual(history[1:], entries[1:])
+        del history[2:]
+        history.append((5, 50))
+        self.assertEqual(list(history), [(1, 10), (2, 20), (5, 50)])
+
+    def test_sqlite_rejects_in_memory_features(self):
+        system = BankingSystemImpl(storage=SQLiteStorage())
+        with self.assertRaises(ValueError):
+            system.fork()
+        with self.assertRaises(ValueError):
+            system.begin()
@@ -0,0 +1,132 @@
+import os
+import tempfile
+import unittest
+
+import banking_replay
+from banking_system_impl import BankingSystemImpl
+from banking_tenants import COMPACT, ON_DISK, RESIDENT, TenantManager
+from replay_tests import random_operations
+
+
+class TenantsTests(unittest.TestCase):
+    """
+    Tests for the tenant manager: isolation, LRU eviction to the compact
+    store and to disk, transparent reloading and memory accounting.
+    """
+
+    failureException = Exception
+
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _run(self, system: BankingSystemImpl, operations: list[tuple]) -> list:
+        return [getattr(system, op[0])(*op[1:]) for op in operations]
+
+    def test_tenants_are_isolated(self):
+        manager = TenantManager(self.directory)
+        for seed in range(5):
+            operations = random_operations(seed, 300, accounts=10)
+            self.assertEqual(self._run(manager.get(f"tenant{seed}"), operations), self._run(BankingSystemImpl(), operations))
+        self.assertEqual(manager.get("tenant0").get_balance(10 ** 12, "account0", 1), 0)
+        self.assertIsNone(manager.get("empty").get_balance(10 ** 12, "account0", 1))
+
+    def test_lru_eviction_and_reload(self):
+        manager = TenantManager(self.directory, max_resident=2, compact_limit=2000)
+        small = random_operations(1, 30, accounts=5)
+        large = random_operations(2, 300, accounts=20)
+        self._run(manager.get("small"), small[:20])
+        self._run(manager.get("large/1"), large[:200])
+        before = banking_replay.state_bytes(manager.get("large/1"))
+        manager.get("empty")
+        reader = manager.get("c")
+        self.assertIsNone(reader.get_balance(5, "account0", 1))
+        self.assertEqual(reader.top_spenders(6, 3), [])
+        self.assertIsNone(reader.get_payment_status(7, "account0", "payment1"))
+        self.assertEqual(manager.location("small"), COMPACT)
+        self.assertEqual(manager.location("large/1"), ON_DISK)
+        self.assertEqual(manager.tenant_ids(), ["c", "empty", "large/1", "small"])
+        self.assertEqual(manager.evictions, 2)
+
+        # Both reload transparently and continue where they stopped
+        system = manager.get("large/1")
+        self.assertEqual(banking_replay.state_bytes(system), before)
+        self.assertEqual(self._run(system, large[200:]), self._run(BankingSystemImpl(), large)[200:])
+        self.assertEqual(self._run(manager.get("small"), small[20:]), self._run(BankingSystemImpl(), small)[20:])
+        self.assertEqual(manager.loads, 2)
+        self.assertEqual(os.listdir(self.directory), [])
+
+        # empty and c never changed (c was only read), they were dropped without a snapshot
+        self.assertIsNone(manager.location("empty"))
+        self.assertIsNone(manager.location("c"))
+        self.assertEqual(manager.tenant_ids(), ["large/1", "small"])
+
+    def test_open_transaction_pins_tenant(self):
+        manager = TenantManager(self.directory, max_resident=1)
+        system = manager.get("a")
+        system.begin()
+        system.create_account(1, "account0")
+        manager.get("b")
+        self.assertEqual(manager.location("a"), RESIDENT)
+        self.assertFalse(manager.evict("a"))
+        system.commit()
+        manager.get("c")
+        self.assertEqual(manager.location("a"), COMPACT)
+        self.assertEqual(manager.get("a").get_balance(2, "account0", 1), 0)
+
+    def test_evicted_system_is_closed(self):
+        manager = TenantManager(self.directory, max_resident=1)
+        system = manager.get("a")
+        system.create_account(1, "account0")
+        system.deposit(2, "account0", 1000)
+        system.pay(3, "account0", 100)
+        worker = system.enable_background_settlement()
+        system.deposit(3 + 86400000, "account0", 0)
+        untouched = manager.get("untouched")
+        manager.get("b")
+
+        # Writes through the old reference raise instead of being lost
+        self.assertIsNone(worker._thread)
+        for stale in (system, untouched):
+            with self.assertRaises(RuntimeError):
+                stale.deposit(4 + 86400000, "account0", 5)
+            with self.assertRaises(RuntimeError):
+                stale.get_balance(5 + 86400000, "account0", 1)
+        reloaded = manager.get("a")
+        self.assertIsNot(reloaded, system)
+        self.assertEqual(reloaded.deposit(4 + 86400000, "account0", 5), 907)
+        self.assertIsNone(manager.get("untouched").get_balance(1, "account0", 1))
+
+    def test_memory_accounting_and_quota(self):
+        manager = TenantManager(self.directory, memory_quota=100000, compact_limit=20000)
+        self.assertEqual(manager.memory("empty"), 0)
+        manager.get("empty")
+        self.assertLess(manager.memory("empty"), 2000)
+
+        self._run(manager.get("small"), random_operations(2, 100, accounts=5))
+        report = manager.memory_report()
+        self.assertGreater(report["small"], report["empty"])
+        self.assertEqual(report, {"empty": manager.memory("empty"), "small": manager.memory("small")})
+        self.assertEqual(manager.memory_bytes, sum(report.values()))
+
+        # Growing past the quota evicts the least recently used tenants first
+        self._run(manager.get("large"), random_operations(3, 3000, accounts=200))
+        manager.get("small")
+        self.assertIsNone(manager.location("empty"))
+        self.assertEqual(manager.location("large"), ON_DISK)
+        self.assertEqual(manager.location("small"), RESIDENT)
+        self.assertEqual(manager.memory("large"), 0)
+        self.assertLessEqual(manager.memory_bytes, 100000)
+
+        # Compact snapshots count against the quota and move to disk when it is exceeded
+        manager.evict("small")
+        compact = manager.memory("small")
+        self.assertEqual(manager.memory_bytes, compact)
+        manager.memory_quota = compact
+        self._run(manager.get("other"), random_operations(4, 10, accounts=2))
+        manager.get("empty")
+        self.assertEqual(manager.location("small"), ON_DISK)
@@ -0,0 +1,119 @@
+import random
+import unittest
+
+import banking_diff
+from banking_system_impl import BankingSystemImpl
+from replay_tests import random_operations
+
+
+class TopSpendersTests(unittest.TestCase):
+    """
+    Tests for top_spenders selection on larger populations.
+    """
+
+    failureException = Exception
+
+
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl()
+
+    def _populate(self, accounts: int, seed: int):
+        rng = random.Random(seed)
+        for i in range(accounts):
+            self.system.create_account(i + 1, f"account{i}")
+            self.system.deposit(accounts + i + 1, f"account{i}", 10000)
+        for i in range(accounts):
+            self.system.pay(2 * accounts + i + 1, f"account{rng.randrange(accounts)}", rng.randint(0, 20) * 50)
+        return 3 * accounts + 1
+
+    def test_matches_full_sort(self):
+        end = self._populate(500, 1)
+        ranking = sorted(self.system.accounts_dict, key=lambda account_id: (-self.system.outgoing.get(account_id, 0), account_id))
+        expected = [f"{account_id}({self.system.outgoing.get(account_id, 0)})" for account_id in ranking]
+        for n in (1, 3, 10, 499, 500, 600):
+            self.assertEqual(self.system.top_spenders(end, n), expected[:n])
+
+    def test_ties_by_account_name(self):
+        for account_id in ('b', 'c', 'a', 'd'):
+            self.system.create_account(1, account_id)
+            self.system.deposit(2, account_id, 100)
+        for timestamp, account_id in enumerate(('c', 'a', 'b'), start=3):
+            self.system.pay(timestamp, account_id, 10)
+        self.assertEqual(self.system.top_spenders(6, 4), ['a(10)', 'b(10)', 'c(10)', 'd(0)'])
+        self.assertEqual(self.system.top_spenders(7, 0), [])
+
+
+def cached(mode: str):
+    def engine():
+        system = BankingSystemImpl()
+        system.enable_top_spenders_cache(mode)
+        return system
+    return engine
+
+
+class TopSpendersCacheTests(unittest.TestCase):
+    """
+    Tests for the cached top_spenders ranking in both invalidation modes.
+    """
+
+    failureException = Exception
+
+
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl()
+        for i in range(6):
+            cls.system.create_account(i + 1, f'account{i}')
+            cls.system.deposit(10 + i, f'account{i}', 10000)
+        for i in range(6):
+            cls.system.pay(20 + i, f'account{i}', 100 * (i + 1))
+
+    def test_results_match_uncached(self):
+        for mode in ("version", "boundary"):
+            self.assertIsNone(banking_diff.fuzz(cached(mode), seeds=range(20)), mode)
+            for seed in (1, 2):
+                self.assertIsNone(banking_diff.compare(random_operations(seed, 600, accounts=12, cluster=4), cached(mode)), mode)
+
+    def test_smaller_n_served_from_larger(self):
+        cache = self.system.enable_top_spenders_cache()
+        self.assertEqual(self.system.top_spenders(30, 4), ['account5(600)', 'account4(500)', 'account3(400)', 'account2(300)'])
+        self.assertEqual(self.system.top_spenders(31, 2), ['account5(600)', 'account4(500)'])
+        self.assertEqual(self.system.top_spenders(32, 4)[3], 'account2(300)')
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.system.top_spenders(33, 5)
+        self.assertEqual(cache.misses, 2)
+
+    def test_version_mode_invalidates_on_every_change(self):
+        cache = self.system.enable_top_spenders_cache("version")
+        self.system.top_spenders(30, 2)
+        self.system.pay(31, 'account0', 1)
+        self.assertEqual(self.system.top_spenders(32, 2), ['account5(600)', 'account4(500)'])
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+    def test_boundary_mode_invalidates_only_on_boundary_changes(self):
+        cache = self.system.enable_top_spenders_cache("boundary")
+        self.system.top_spenders(30, 2)
+        # Below the boundary, then into the ranking
+        self.system.pay(31, 'account0', 1)
+        self.system.transfer(32, 'account1', 'account0', 450)
+        self.assertEqual(self.system.top_spenders(33, 2), ['account1(650)', 'account5(600)'])
+        self.system.create_account(34, 'account6')
+        self.assertTrue(self.system.merge_accounts(35, 'account2', 'account3'))
+        self.assertEqual(self.system.top_spenders(36, 2), ['account2(700)', 'account1(650)'])
+        self.assertEqual(cache.version, 0)
+        self.assertEqual(cache.hits, 2)
+
+        # Merging away a ranked account leaves a gap only a full selection can fill
+        self.assertTrue(self.system.merge_accounts(37, 'account0', 'account2'))
+        self.assertEqual(cache.version, 1)
+        self.assertEqual(self.system.top_spenders(38, 2), ['account0(801)', 'account1(650)'])
+
+    def test_rollback_invalidates(self):
+        cache = self.system.enable_top_spenders_cache("boundary")
+        self.system.begin()
+        self.system.pay(30, 'account0', 5000)
+        self.assertEqual(self.system.top_spenders(31, 1), ['account0(5100)'])
+        self.system.rollback()
+        self.assertEqual(self.system.top_spenders(32, 1), ['account5(600)'])
+        self.assertEqual(cache.hits, 0)
@@ -0,0 +1,86 @@
+import unittest
+
+from banking_replay import replay
+from banking_system_impl import BankingSystemImpl
+from replay_tests import random_operations
+
+
+class TracingTests(unittest.TestCase):
+    """
+    Tests for the latency tracer: unchanged results, phase timings of slow
+    calls, sampling, the slow-call ring buffer and latency percentiles.
+    """
+
+    failureException = Exception
+
+
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl()
+        for i in range(3):
+            cls.system.create_account(i + 1, f'account{i}')
+            cls.system.deposit(10 + i, f'account{i}', 1000)
+        cls.system.merge_accounts(20, 'account0', 'account1')
+
+    def test_results_unchanged(self):
+        operations = random_operations(5, 3000)
+        system = BankingSystemImpl()
+        tracer = system.enable_tracing(sample_rate=0.5, threshold=0)
+        self.assertEqual(replay(system, operations), replay(BankingSystemImpl(), operations))
+        self.assertEqual(tracer.calls, len(operations))
+        self.assertEqual(sum(sum(histogram.values()) for histogram in tracer.histograms.values()), len(operations) // 2)
+
+    def test_slow_calls_keep_arguments_and_phases(self):
+        tracer = self.system.enable_tracing(threshold=0)
+        self.assertIs(self.system.enable_tracing(), tracer)
+        self.system.get_balance(30, 'account1', 15)
+        self.system.get_balance(31, 'account0', 15)
+        self.system.merge_accounts(32, 'account0', 'account2')
+
+        spans = list(tracer.slow)
+        self.assertEqual([(span.operation, span.args) for span in spans],
+                         [('get_balance', (30, 'account1', 15)), ('get_balance', (31, 'account0', 15)),
+                          ('merge_accounts', (32, 'account0', 'account2'))])
+        self.assertEqual(set(spans[0].phases), {'cashback sweep', 'merge-history scan', 'binary search'})
+        self.assertEqual(set(spans[1].phases), {'cashback sweep', 'alias resolution', 'merge-history scan', 'binary search'})
+        self.assertEqual(set(spans[2].phases), {'cashback sweep', 'alias resolution', 'history sort'})
+        self.assertTrue(all(0 <= seconds <= span.duration for span in spans for seconds in span.phases.values()))
+
+        self.assertEqual(tracer.slowest(3), sorted(spans, key=lambda span: -span.duration))
+        self.assertEqual(len(tracer.dump(2).splitlines()), 2)
+        self.assertIn("merge_accounts(32, 'account0', 'account2')", tracer.dump())
+
+    def test_threshold_and_ring_buffer(self):
+        tracer = self.system.enable_tracing(threshold=10.0)
+        self.system.deposit(30, 'account0', 5)
+        self.assertEqual(len(tracer.slow), 0)
+
+        system = BankingSystemImpl()
+        tracer = system.enable_tracing(threshold=0, capacity=4)
+        system.create_account(1, 'account0')
+        for timestamp in range(2, 12):
+            system.deposit(timestamp, 'account0', 1)
+        self.assertEqual([span.args[0] for span in tracer.slow], [8, 9, 10, 11])
+
+    def test_latency_percentiles(self):
+        tracer = self.system.enable_tracing()
+        self.assertIsNone(tracer.percentile('deposit', 50))
+        for timestamp in range(30, 130):
+            self.system.deposit(timestamp, 'account0', 1)
+        p50, p99 = tracer.percentile('deposit', 50), tracer.percentile('deposit', 99)
+        self.assertTrue(0 < p50 <= p99 < 1)
+        self.assertEqual(tracer.within('deposit', 10.0), 1.0)
+        self.assertEqual(tracer.summary()['deposit']['calls'], 100)
+        self.assertEqual(list(tracer.summary()), ['deposit'])
+
+    def test_detach_and_fork(self):
+        tracer = self.system.enable_tracing(threshold=0)
+        child = self.system.fork()
+        child.deposit(30, 'account0', 5)
+        self.assertEqual(tracer.calls, 0)
+
+        tracer.detach(self.system)
+        self.system.deposit(31, 'account0', 5)
+        self.assertEqual(tracer.calls, 0)
+        self.assertEqual(self.system.get_balance(32, 'account0', 31), 2005)
+        self.assertIsNot(self.system.enable_tracing(), tracer)
@@ -0,0 +1,129 @@
+import unittest
+
+import banking_replay
+from banking_events import BalanceChanged
+from banking_system_impl import BankingSystemImpl
+from fork_tests import continuation
+from replay_tests import random_operations
+
+
+class TransactionTests(unittest.TestCase):
+    """
+    Tests for begin() / commit() / rollback().
+    A rolled back transaction must leave no trace in state, results or events.
+    """
+
+    failureException = Exception
+
+
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl()
+
+    def test_rollback_restores_state(self):
+        operations = random_operations(31, 300)
+        banking_replay.replay(self.system, operations)
+        end = operations[-1][1]
+        before = banking_replay.state_bytes(self.system)
+
+        for seed in (32, 33):
+            self.system.begin()
+            banking_replay.replay(self.system, continuation(seed, 300, end))
+            self.system.rollback()
+            self.assertEqual(banking_replay.state_bytes(self.system), before)
+
+        # Cashback refunded inside the transactions is due again afterwards
+        after = continuation(34, 300, end)
+        results = banking_replay.replay(self.system, after)
+        expected = BankingSystemImpl()
+        self.assertEqual(results, banking_replay.replay(expected, operations + after)[len(operations):])
+        self.assertEqual(banking_replay.state_bytes(self.system), banking_replay.state_bytes(expected))
+
+    def test_commit_keeps_changes(self):
+        operations = random_operations(35, 300)
+        banking_replay.replay(self.system, operations[:150])
+        self.system.begin()
+        banking_replay.replay(self.system, operations[150:])
+        self.system.commit()
+        self.assertIsNone(self.system._undo)
+
+        expected = BankingSystemImpl()
+        banking_replay.replay(expected, operations)
+        self.assertEqual(banking_replay.state_bytes(self.system), banking_replay.state_bytes(expected))
+
+    def test_nested_savepoints(self):
+        self.system.create_account(1, 'account1')
+        self.system.create_account(2, 'account2')
+        self.system.begin()
+        self.system.deposit(3, 'account1', 1000)
+        self.system.begin()
+        self.assertEqual(self.system.pay(4, 'account1', 100), 'payment1')
+        self.assertTrue(self.system.merge_accounts(5, 'account2', 'account1'))
+        self.system.rollback()
+        self.assertEqual(self.system.pay(6, 'account1', 300), 'payment1')
+        self.system.commit()
+
+        self.assertEqual(self.system.get_balance(7, 'account1', 6), 700)
+        self.assertEqual(self.system.get_payment_status(8, 'account1', 'payment1'), 'IN_PROGRESS')
+        self.assertEqual(self.system.top_spenders(9, 2), ['account1(300)', 'account2(0)'])
+        self.assertEqual(self.system.deposit(6 + 86400000, 'account1', 0), 706)
+
+    def test_refund_rolled_back_in_savepoint(self):
+        day = 86400000
+        for pay_inside in (True, False):
+            system = BankingSystemImpl()
+            system.create_account(1, 'account1')
+            system.deposit(2, 'account1', 1000)
+            if not pay_inside:
+                system.pay(3, 'account1', 100)
+            system.begin()
+            if pay_inside:
+                system.pay(3, 'account1', 100)
+            system.begin()
+            # The refund is due inside the savepoint
+            self.assertEqual(system.deposit(3 + day, 'account1', 0), 902)
+            system.rollback()
+            self.assertEqual(len(system._cashback_wheel), 1)
+            system.rollback()
+            self.assertEqual(len(system._cashback_wheel), 0 if pay_inside else 1)
+            self.assertEqual(system.deposit(4 + day, 'account1', 0), 1000 if pay_inside else 902)
+
+            expected = BankingSystemImpl()
+            expected.create_account(1, 'account1')
+            expected.deposit(2, 'account1', 1000)
+            if not pay_inside:
+                expected.pay(3, 'account1', 100)
+            expected.deposit(4 + day, 'account1', 0)
+            self.assertEqual(banking_replay.state_bytes(system), banking_replay.state_bytes(expected))
+
+    def test_rollback_cost_follows_changes(self):
+        for i in range(2000):
+            self.system.create_account(i + 1, f'account{i}')
+            self.system.deposit(3000 + i, f'account{i}', 100)
+        self.system.begin()
+        self.system.transfer(6000, 'account1', 'account2', 10)
+        self.assertLess(len(self.system._undo._entries), 10)
+        self.system.rollback()
+        self.assertEqual(self.system.get_balance(6001, 'account1', 6000), 100)
+
+    def test_events_published_on_commit_only(self):
+        events = []
+        self.system.enable_events().subscribe(events.append)
+        self.system.create_account(1, 'account1')
+        self.system.begin()
+        self.system.deposit(2, 'account1', 100)
+        self.system.rollback()
+        self.system.begin()
+        self.system.deposit(3, 'account1', 200)
+        self.assertEqual(len(events), 1)
+        self.system.commit()
+        self.assertEqual(events[1:], [BalanceChanged(3, 'account1', 200)])
+
+    def test_invalid_transaction_calls(self):
+        with self.assertRaises(RuntimeError):
+            self.system.commit()
+        with self.assertRaises(RuntimeError):
+            self.system.rollback()
+        self.system.begin()
+        with self.assertRaises(RuntimeError):
+            self.system.fork()
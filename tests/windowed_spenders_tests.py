@@ -0,0 +1,64 @@
+import unittest
+
+import banking_replay
+from banking_system_impl import BankingSystemImpl
+from replay_tests import random_operations
+
+
+class WindowedSpendersTests(unittest.TestCase):
+    """
+    Tests for top_spenders_between on the time-bucketed outgoing ledger.
+    """
+
+    failureException = Exception
+
+
+    @classmethod
+    def setUp(cls):
+        cls.system = BankingSystemImpl()
+
+    def _setup_accounts(self):
+        for i, account_id in enumerate(['account1', 'account2', 'account3']):
+            self.assertTrue(self.system.create_account(i + 1, account_id))
+            self.system.deposit(10 + i, account_id, 10000)
+
+    def test_window_includes_both_ends(self):
+        self._setup_accounts()
+        self.system.transfer(100, 'account1', 'account2', 300)
+        self.system.pay(200, 'account2', 500)
+        self.system.pay(300, 'account3', 100)
+        self.system.transfer(400, 'account1', 'account3', 50)
+        self.assertEqual(self.system.top_spenders_between(100, 300, 3), ['account2(500)', 'account1(300)', 'account3(100)'])
+        self.assertEqual(self.system.top_spenders_between(200, 400, 2), ['account2(500)', 'account3(100)'])
+        self.assertEqual(self.system.top_spenders_between(301, 1000, 3), ['account1(50)', 'account2(0)', 'account3(0)'])
+        self.assertEqual(self.system.top_spenders_between(500, 600, 1), ['account1(0)'])
+
+    def test_merged_accounts_combine_windows(self):
+        self._setup_accounts()
+        self.system.pay(100, 'account1', 100)
+        self.system.pay(150, 'account2', 200)
+        self.system.pay(200, 'account1', 400)
+        self.system.pay(250, 'account2', 800)
+        self.assertTrue(self.system.merge_accounts(300, 'account1', 'account2'))
+        self.system.pay(350, 'account1', 1000)
+        self.assertEqual(self.system.top_spenders_between(150, 250, 3), ['account1(1400)', 'account3(0)'])
+        self.assertEqual(self.system.top_spenders_between(0, 10**9, 1), ['account1(2500)'])
+
+    def test_full_window_matches_top_spenders(self):
+        operations = random_operations(11, 400)
+        banking_replay.replay(self.system, operations)
+        end = operations[-1][1]
+        self.assertEqual(self.system.top_spenders_between(0, end, 10), self.system.top_spenders(end, 10))
+
+    def test_wider_buckets_round_to_bucket_boundaries(self):
+        class MinuteBuckets(BankingSystemImpl):
+            OUTGOING_BUCKET_MS = 60000
+
+        self.system = MinuteBuckets()
+        self._setup_accounts()
+        self.system.pay(60001, 'account1', 100)
+        self.system.pay(60002, 'account1', 200)
+        self.system.pay(120001, 'account1', 400)
+        self.assertEqual(len(self.system.outgoing_ledger['account1']), 2)
+        self.assertEqual(self.system.top_spenders_between(60500, 60600, 1), ['account1(300)'])
+        self.assertEqual(self.system.top_spenders_between(60000, 180000, 1), ['account1(700)'])
@@ -0,0 +1,98 @@
+import unittest
+
+import banking_workload
+from banking_replay import replay
+from banking_sqlite import SQLiteBankingSystem
+from banking_system_impl import BankingSystemImpl
+from banking_wire import FrameDecoder, FrameEncoder, HEADER, frame_length
+from banking_workload import WorkloadConfig
+from replay_tests import random_operations
+
+
+class WireTests(unittest.TestCase):
+    """
+    Tests for the binary wire frames: round trips, dispatch against the
+    scalar methods, account handles across frames and framing errors.
+    """
+
+    failureException = Exception
+
+
+    @classmethod
+    def setUp(cls):
+        cls.operations = banking_workload.generate(WorkloadConfig(operations=3000, accounts=100))
+        cls.frames = [FrameEncoder().encode(cls.operations)]
+
+    def _session(self, operations: list[tuple], size: int) -> list[bytes]:
+        encoder = FrameEncoder()
+        return [encoder.encode(operations[i:i + size]) for i in range(0, len(operations), size)]
+
+    def test_round_trip(self):
+        for operations in (self.operations, random_operations(1, 2000)):
+            decoder = FrameDecoder()
+            decoded = []
+            for frame in self._session(operations, 300):
+                decoded += decoder.decode(frame)
+            self.assertEqual(decoded, operations)
+
+    def test_dispatch_matches_replay(self):
+        for engine in (BankingSystemImpl, SQLiteBankingSystem):
+            decoder = FrameDecoder()
+            system = engine()
+            results = []
+            for frame in self._session(self.operations, 500):
+                results += decoder.dispatch(system, memoryview(bytearray(frame)))
+            self.assertEqual(results, replay(BankingSystemImpl(), self.operations), engine.__name__)
+
+    def test_account_ids_are_sent_once(self):
+        encoder = FrameEncoder()
+        first = encoder.encode([("create_account", 1, "account1"), ("deposit", 2, "account1", 100)])
+        second = encoder.encode([("deposit", 3, "account1", 50), ("transfer", 4, "account1", "account2", 10)])
+        self.assertEqual(HEADER.unpack_from(first)[3:], (1, 10))
+        self.assertEqual(HEADER.unpack_from(second)[3:], (1, 10))
+        self.assertEqual(encoder.encode([("top_spenders", 5, 3)])[:HEADER.size], HEADER.pack(b"BW", 1, 1, 0, 0))
+
+        decoder = FrameDecoder()
+        system = BankingSystemImpl()
+        self.assertEqual(decoder.dispatch(system, first) + decoder.dispatch(system, second), [True, 100, 150, None])
+        self.assertEqual(decoder.names, ["account1", "account2"])
+
+    def test_payment_strings(self):
+        system = BankingSystemImpl()
+        system.create_account(1, "account1")
+        system.deposit(2, "account1", 100)
+        operations = [("pay", 3, "account1", 10)] + [("get_payment_status", 4, "account1", payment)
+                                                      for payment in ("payment1", "payment01", "payment", "x")]
+        results = FrameDecoder().dispatch(system, FrameEncoder().encode(operations))
+        self.assertEqual(results, ["payment1", "IN_PROGRESS", None, None, None])
+
+    def test_framing_errors(self):
+        stream = b"".join(self._session(self.operations, 700))
+        lengths = []
+        while stream:
+            lengths.append(frame_length(stream))
+            stream = stream[lengths[-1]:]
+        self.assertEqual(len(lengths), 5)
+
+        frame = self.frames[0]
+        with self.assertRaises(ValueError):
+            FrameDecoder().decode(frame[:-1])
+        with self.assertRaises(ValueError):
+            FrameDecoder().decode(b"XX" + frame[2:])
+        with self.assertRaises(ValueError):
+            FrameEncoder().encode([("withdraw", 1, "account1", 5)])
+
+    def test_failed_encode_keeps_session_in_sync(self):
+        encoder = FrameEncoder()
+        decoder = FrameDecoder()
+        system = BankingSystemImpl()
+        self.assertEqual(decoder.dispatch(system, encoder.encode([("create_account", 1, "account1")])), [True])
+        with self.assertRaises(OverflowError):
+            encoder.encode([("create_account", 2, "account2"), ("deposit", 3, "account2", 2 ** 63)])
+        with self.assertRaises(ValueError):
+            encoder.encode([("create_account", 2, "account3"), ("withdraw", 3, "account3", 5)])
+        self.assertEqual(encoder.handles, {"account1": 0})
+
+        frame = encoder.encode([("create_account", 4, "account2"), ("deposit", 5, "account2", 7)])
+        self.assertEqual(decoder.dispatch(system, frame), [True, 7])
+        self.assertEqual(decoder.names, ["account1", "account2"])
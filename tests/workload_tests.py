@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from collections import Counter
+
+import banking_workload
+from banking_sqlite import SQLiteBankingSystem
+from banking_system_impl import BankingSystemImpl
+from banking_workload import WorkloadConfig
+
+
+class WorkloadTests(unittest.TestCase):
+    """
+    Tests for the seeded workload generator and replay files.
+    """
+
+    failureException = Exception
+
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "workload.replay")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_same_seed_same_operations(self):
+        config = WorkloadConfig(seed=3, operations=2000, accounts=100)
+        self.assertEqual(banking_workload.generate(config), banking_workload.generate(config))
+        self.assertNotEqual(banking_workload.generate(config), banking_workload.generate(WorkloadConfig(seed=4, operations=2000, accounts=100)))
+
+    def test_skew_concentrates_traffic(self):
+        def top_share(skew: float) -> float:
+            operations = banking_workload.generate(WorkloadConfig(operations=5000, accounts=200, skew=skew))
+            counts = Counter(op[2] for op in operations[400:] if op[0] == "deposit")
+            return counts.most_common(1)[0][1] / sum(counts.values())
+
+        self.assertGreater(top_share(1.5), 3 * top_share(0.0))
+
+    def test_phases(self):
+        config = WorkloadConfig(operations=4000, accounts=100, phase_length=200, cashback_phases=0.5, merge_storms=0.3)
+        operations = banking_workload.generate(config)
+        names = Counter(op[0] for op in operations)
+        self.assertGreater(names["merge_accounts"], 200)
+        # Idle jumps past the cashback delay after payment bursts
+        gaps = [b[1] - a[1] for a, b in zip(operations, operations[1:])]
+        self.assertTrue(any(gap > 86400000 for gap in gaps))
+        # Timestamps strictly increase
+        self.assertTrue(all(gap > 0 for gap in gaps))
+
+    def test_replay_file_round_trip(self):
+        operations = banking_workload.generate(WorkloadConfig(operations=1500, accounts=50))
+        operations.append(("get_payment_status", operations[-1][1] + 1, "account 1", "payment 1\t"))
+        banking_workload.write_replay(self.path, operations)
+        self.assertEqual(banking_workload.read_replay(self.path), (operations, None))
+
+    def test_record_and_verify(self):
+        banking_workload.record(self.path, WorkloadConfig(operations=2000, accounts=80))
+        self.assertIsNone(banking_workload.verify(self.path, BankingSystemImpl()))
+        self.assertIsNone(banking_workload.verify(self.path, SQLiteBankingSystem()))
+
+        class NoCashback(BankingSystemImpl):
+            def _process_cashback(self, timestamp):
+                pass
+
+        index, operation, expected, actual = banking_workload.verify(self.path, NoCashback())
+        self.assertNotEqual(expected, actual)
+        self.assertEqual(banking_workload.read_replay(self.path)[0][index], operation)